@@ -0,0 +1,206 @@
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockOpenAIServer:
+    BATCH_DELIMITER = "===== IMAGE {index} ====="  # Delimiter of AzureImageTranscriber multi-image responses
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, latency_sigma=0.5, rate_limit_ratio=0.0, retry_after=1, response_tokens=200, seed=None):
+        """
+        Initializes a local stand-in for the Azure OpenAI chat completions endpoint. Point AZURE_OPENAI_ENDPOINT at
+        its url to run the pipelines without a deployment.
+
+        :param host: Interface to listen on.
+        :param port: Port to listen on, or 0 for any free port.
+        :param latency: Median response time in seconds.
+        :param latency_sigma: Spread of the log-normal response time; 0 answers every request after exactly latency seconds.
+        :param rate_limit_ratio: Fraction of requests answered with HTTP 429 instead of a completion.
+        :param retry_after: Retry-After delay in seconds sent with each 429 response.
+        :param response_tokens: Approximate number of tokens in each completion.
+        :param seed: Seed of the latency and rate limit draws, for repeatable runs.
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.response_tokens = response_tokens
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        """
+        The base URL of the running server.
+        """
+        return f"http://{self.host}:{self._server.server_address[1]}"
+
+    def reset_stats(self):
+        """
+        Clears the request statistics, e.g. between benchmark runs.
+        """
+        with self._lock:
+            self._latencies = []
+            self._rate_limited = 0
+            self._in_flight = 0
+            self._max_in_flight = 0
+
+    def stats(self):
+        """
+        Summarizes the requests served since the last reset.
+
+        :return: Dictionary of request counts, peak concurrency and response time percentiles in seconds.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            rate_limited = self._rate_limited
+            max_in_flight = self._max_in_flight
+
+        def percentile(q):
+            """
+            Reads a nearest-rank percentile of the response times.
+
+            :param q: Percentile from 0 to 100.
+            :return: The response time in seconds, or None if no completion was served.
+            """
+            return latencies[min(len(latencies) - 1, math.ceil(len(latencies) * q / 100) - 1)] if latencies else None
+
+        return {
+            "requests": len(latencies) + rate_limited,
+            "completions": len(latencies),
+            "rate_limited": rate_limited,
+            "max_in_flight": max_in_flight,
+            "p50": percentile(50),
+            "p95": percentile(95),
+            "p99": percentile(99),
+        }
+
+    def draw_response(self):
+        """
+        Draws whether the next request is rate limited and how long it takes.
+
+        :return: Tuple of whether to answer with HTTP 429 and the delay in seconds before answering.
+        """
+        with self._lock:
+            if self._random.random() < self.rate_limit_ratio:
+                return True, 0
+            return False, self.latency * math.exp(self._random.gauss(0, self.latency_sigma)) if self.latency_sigma else self.latency
+
+    @staticmethod
+    def count_images(messages):
+        """
+        Counts the images in the messages of a request.
+
+        :param messages: The messages of the chat completion request.
+        :return: The number of image parts.
+        """
+        return sum(1 for message in messages if isinstance(message.get("content"), list)
+                   for part in message["content"] if part.get("type") in ("image", "image_url"))
+
+    def create_content(self, messages):
+        """
+        Creates a completion in the shape each pipeline expects: question and answer pairs for text, a transcript
+        for one image, or a delimited transcript per image for a multi-image request.
+
+        :param messages: The messages of the chat completion request.
+        :return: The completion text.
+        """
+        words = " ".join(["lorem"] * self.response_tokens)
+        image_count = self.count_images(messages)
+        if image_count == 0:
+            return json.dumps([{"question": f"Question {index}?", "answer": words} for index in range(1, 4)])
+        if image_count == 1:
+            return words
+        return "\n".join(f"{self.BATCH_DELIMITER.format(index=index)}\n{words}" for index in range(1, image_count + 1))
+
+    def create_handler(self):
+        """
+        Creates the request handler class bound to this server.
+
+        :return: A BaseHTTPRequestHandler subclass.
+        """
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass  # Thousands of requests would otherwise flood the console
+
+            def send_json(self, status, body, headers=None):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.split('?', 1)[0].endswith("/chat/completions"):
+                    self.send_json(404, {"error": {"code": "404", "message": "Resource not found"}})
+                    return
+
+                rate_limited, delay = mock.draw_response()
+                if rate_limited:
+                    with mock._lock:
+                        mock._rate_limited += 1
+                    self.send_json(429, {"error": {"code": "429", "message": "Rate limit is exceeded. Try again later."}},
+                                   {"Retry-After": str(mock.retry_after), "retry-after-ms": str(int(mock.retry_after * 1000))})
+                    return
+
+                with mock._lock:
+                    mock._in_flight += 1
+                    mock._max_in_flight = max(mock._max_in_flight, mock._in_flight)
+                start_time = time.monotonic()
+                try:
+                    request = json.loads(body or b"{}")
+                    time.sleep(delay)
+                    content = mock.create_content(request.get("messages", []))
+                    prompt_tokens = len(body) // 4
+                    completion_tokens = len(content) // 4
+                    self.send_json(200, {
+                        "id": f"chatcmpl-mock-{time.time_ns()}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request.get("model") or "mock",
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+                    })
+                finally:
+                    with mock._lock:
+                        mock._in_flight -= 1
+                        mock._latencies.append(time.monotonic() - start_time)
+
+        return Handler
+
+    def start(self):
+        """
+        Starts serving requests on a background thread.
+
+        :return: The base URL of the server.
+        """
+        self._server = ThreadingHTTPServer((self.host, self.port), self.create_handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """
+        Stops the server.
+        """
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
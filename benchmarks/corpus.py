@@ -0,0 +1,116 @@
+## Synthetic input corpora for the benchmark harness
+
+import json
+import os
+import random
+import shutil
+import subprocess
+
+FILES_PER_FOLDER = 100  # Files per deck, course or topic folder, so directory walks look like the real corpora
+MANIFEST_NAME = "corpus.json"
+WORDS = ["asset", "bond", "yield", "duration", "equity", "return", "risk", "portfolio", "hedge", "option",
+         "futures", "swap", "credit", "spread", "coupon", "valuation", "ratio", "liquidity", "capital", "market"]
+
+def corpus_paths(kind, corpus_dir, files):
+    """
+    Lists the paths of a synthetic corpus. Images and videos live under a 'presentation' folder, from which the
+    pipelines name their outputs.
+
+    :param kind: 'image', 'video' or 'text'.
+    :param corpus_dir: Directory of the corpus.
+    :param files: Number of files.
+    :return: List of file paths.
+    """
+    folder, name, extension = {"image": ("deck", "slide", "png"), "video": ("course", "lecture", "mp4"), "text": ("topic", "reading", "txt")}[kind]
+    base_dir = os.path.join(corpus_dir, "presentation") if kind != "text" else corpus_dir
+    return [os.path.join(base_dir, f"{folder}_{index // FILES_PER_FOLDER:05d}", f"{name}_{index % FILES_PER_FOLDER:03d}.{extension}") for index in range(files)]
+
+def build_corpus(kind, corpus_dir, files, seed=0, **options):
+    """
+    Generates a synthetic corpus, reusing the one already in corpus_dir if it was built with the same settings.
+
+    :param kind: 'image' (PNG slides), 'video' (MP4 lectures) or 'text' (reading notes).
+    :param corpus_dir: Directory of the corpus.
+    :param files: Number of files.
+    :param seed: Seed of the generated content.
+    :param options: Settings of the kind: width and height for images, seconds for videos, chars for text.
+    :return: The directory to pass to the pipeline as its input directory.
+    """
+    settings = {"kind": kind, "files": files, "seed": seed, **options}
+    manifest_path = os.path.join(corpus_dir, MANIFEST_NAME)
+    base_dir = os.path.join(corpus_dir, "presentation") if kind != "text" else corpus_dir
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == settings:
+                return base_dir
+        shutil.rmtree(corpus_dir)
+
+    paths = corpus_paths(kind, corpus_dir, files)
+    for folder in sorted({os.path.dirname(path) for path in paths}):
+        os.makedirs(folder, exist_ok=True)
+    if kind == "image":
+        write_images(paths, options.get("width", 1280), options.get("height", 720))
+    elif kind == "video":
+        write_videos(paths, corpus_dir, options.get("seconds", 30))
+    else:
+        write_texts(paths, options.get("chars", 20000), seed)
+
+    # Written last, so an interrupted build is regenerated on the next run
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(settings, f)
+    return base_dir
+
+def write_images(paths, width, height):
+    """
+    Writes a distinct slide per path: a white page with bars encoding its index, so neither the exact nor the
+    perceptual slide cache matches two slides.
+
+    :param paths: List of PNG paths.
+    :param width: Width of the slides in pixels.
+    :param height: Height of the slides in pixels.
+    """
+    from PIL import Image, ImageDraw
+
+    bar_width = width // 20
+    for index, path in enumerate(paths):
+        image = Image.new("RGB", (width, height), (255, 255, 255))
+        draw = ImageDraw.Draw(image)
+        for bit in range(16):
+            top = 0 if index >> bit & 1 else height // 2
+            draw.rectangle([bit * bar_width + bar_width // 2, top, (bit + 1) * bar_width, top + height // 2], fill=(20, 40, 120))
+        image.save(path)
+
+def write_videos(paths, corpus_dir, seconds):
+    """
+    Encodes one lecture with a tone and a black picture, and links it under every path to save disk space and time.
+
+    :param paths: List of MP4 paths.
+    :param corpus_dir: Directory of the corpus, where the template lecture is kept.
+    :param seconds: Duration of each lecture.
+    """
+    template_path = os.path.join(corpus_dir, "template.mp4")
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error",
+                    "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+                    "-f", "lavfi", "-i", f"color=c=black:s=320x240:r=5:d={seconds}",
+                    "-shortest", "-c:v", "libx264", "-c:a", "aac", template_path], check=True)
+    for path in paths:
+        try:
+            os.link(template_path, path)
+        except OSError:
+            shutil.copyfile(template_path, path)
+
+def write_texts(paths, chars, seed):
+    """
+    Writes notes of random words of about chars characters to each path.
+
+    :param paths: List of text file paths.
+    :param chars: Number of characters per file.
+    :param seed: Seed of the random words.
+    """
+    rng = random.Random(seed)
+    average_word = sum(len(word) + 1 for word in WORDS) / len(WORDS)
+    for path in paths:
+        words = rng.choices(WORDS, k=int(chars / average_word))
+        sentences = [" ".join(words[start:start + 15]).capitalize() + "." for start in range(0, len(words), 15)]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write("\n".join(sentences))
@@ -0,0 +1,185 @@
+## Stand-in for the subset of azure.cognitiveservices.speech used by models/AzureSpeechTranscriber.py
+
+import importlib
+import math
+import os
+import random
+import sys
+import threading
+import types
+import wave
+
+SPEECH_MODULE = "azure.cognitiveservices.speech"
+SEGMENT_SECONDS = 15  # Seconds of audio per recognized segment
+COMPRESSED_BYTES_PER_SECOND = 4000  # Approximate size of 32 kbps Opus audio
+
+options = {"latency": 0.5, "latency_sigma": 0.5, "real_time_factor": 10.0, "rate_limit_ratio": 0.0, "segment_words": 40}
+_random = random.Random()
+_random_lock = threading.Lock()
+
+def install(seed=None, **overrides):
+    """
+    Replaces the Azure Speech SDK with this module for the rest of the process, including worker processes forked
+    after the call. The real SDK does not need to be installed.
+
+    :param seed: Seed of the latency and rate limit draws, for repeatable runs.
+    :param overrides: Options to change: latency (median seconds per recognition on top of the audio), latency_sigma
+                      (spread of the log-normal latency), real_time_factor (seconds of audio recognized per second),
+                      rate_limit_ratio (fraction of recognitions canceled with a 429 error) and segment_words.
+    """
+    unknown = set(overrides) - set(options)
+    if unknown:
+        raise ValueError(f"Unknown fake speech options: {', '.join(sorted(unknown))}")
+    options.update(overrides)
+    _random.seed(seed)
+
+    module = sys.modules[__name__]
+    for name in ("azure", "azure.cognitiveservices"):
+        if name not in sys.modules:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                sys.modules[name] = types.ModuleType(name)
+    sys.modules[SPEECH_MODULE] = module
+    sys.modules["azure"].cognitiveservices = sys.modules["azure.cognitiveservices"]
+    sys.modules["azure.cognitiveservices"].speech = module
+
+class ResultReason:
+    RecognizedSpeech = 3
+
+class CancellationReason:
+    Error = 1
+    EndOfStream = 2
+
+class AudioStreamContainerFormat:
+    OGG_OPUS = 257
+
+class SpeechConfig:
+    def __init__(self, subscription=None, region=None, **kwargs):
+        self.subscription = subscription
+        self.region = region
+        self.speech_recognition_language = "en-US"
+
+class AudioStreamFormat:
+    def __init__(self, samples_per_second=16000, bits_per_sample=16, channels=1, compressed_stream_format=None):
+        """
+        :param compressed_stream_format: Set for compressed audio, whose duration is estimated from its size.
+        """
+        if compressed_stream_format is not None:
+            self.bytes_per_second = COMPRESSED_BYTES_PER_SECOND
+        else:
+            self.bytes_per_second = samples_per_second * bits_per_sample // 8 * channels
+
+class PullAudioInputStreamCallback:
+    def read(self, buffer):
+        return 0
+
+    def close(self):
+        pass
+
+class PullAudioInputStream:
+    READ_SIZE = 3200  # Bytes asked for per read, 100 ms of 16kHz mono PCM
+
+    def __init__(self, pull_stream_callback, stream_format=None):
+        self.callback = pull_stream_callback
+        self.stream_format = stream_format or AudioStreamFormat()
+
+    def read_all(self):
+        """
+        Pulls the audio until the callback reports the end of the stream, as the service does while recognizing.
+
+        :return: The number of bytes read.
+        """
+        buffer = memoryview(bytearray(self.READ_SIZE))
+        bytes_read = 0
+        try:
+            while True:
+                size = self.callback.read(buffer)
+                if not size:
+                    return bytes_read
+                bytes_read += size
+        finally:
+            self.callback.close()
+
+class AudioConfig:
+    def __init__(self, filename=None, stream=None, **kwargs):
+        self.filename = filename
+        self.stream = stream
+
+    def duration(self):
+        """
+        Measures the audio to recognize, reading a pull stream to its end first.
+
+        :return: The duration of the audio in seconds.
+        """
+        if self.stream is not None:
+            return self.stream.read_all() / self.stream.stream_format.bytes_per_second
+        try:
+            with wave.open(self.filename, 'rb') as wav_file:
+                return wav_file.getnframes() / wav_file.getframerate()
+        except (wave.Error, EOFError):
+            return os.path.getsize(self.filename) / COMPRESSED_BYTES_PER_SECOND
+
+audio = types.SimpleNamespace(AudioConfig=AudioConfig, AudioStreamFormat=AudioStreamFormat,
+                              PullAudioInputStream=PullAudioInputStream, PullAudioInputStreamCallback=PullAudioInputStreamCallback)
+
+class ResultFuture:
+    def get(self):
+        return None
+
+class EventSignal:
+    def __init__(self):
+        self.callbacks = []
+
+    def connect(self, callback):
+        self.callbacks.append(callback)
+
+    def fire(self, evt):
+        for callback in self.callbacks:
+            callback(evt)
+
+class SpeechRecognizer:
+    def __init__(self, speech_config=None, audio_config=None, **kwargs):
+        """
+        Initializes a recognizer that answers after a simulated delay with filler text instead of calling the service.
+
+        :param speech_config: Instance of SpeechConfig.
+        :param audio_config: Instance of AudioConfig.
+        """
+        self.speech_config = speech_config
+        self.audio_config = audio_config
+        self.recognized = EventSignal()
+        self.canceled = EventSignal()
+        self.session_stopped = EventSignal()
+        self._stopped = threading.Event()
+
+    def start_continuous_recognition_async(self):
+        threading.Thread(target=self._recognize, daemon=True).start()
+        return ResultFuture()
+
+    def stop_continuous_recognition_async(self):
+        self._stopped.set()
+        return ResultFuture()
+
+    def _recognize(self):
+        """
+        Waits as long as the service would take for the audio, then fires the recognized segments, or a 429 error for
+        the configured fraction of recognitions.
+        """
+        duration = self.audio_config.duration()
+        with _random_lock:
+            rate_limited = _random.random() < options["rate_limit_ratio"]
+            latency = options["latency"] * math.exp(_random.gauss(0, options["latency_sigma"])) if options["latency_sigma"] else options["latency"]
+
+        if rate_limited:
+            details = types.SimpleNamespace(reason=CancellationReason.Error, error_details="Connection failed (no connection to the remote host). Too many requests (429).")
+            self.canceled.fire(types.SimpleNamespace(cancellation_details=details))
+            return
+
+        self._stopped.wait(latency + duration / options["real_time_factor"])
+        words = " ".join(["lorem"] * options["segment_words"])
+        for _ in range(max(1, math.ceil(duration / SEGMENT_SECONDS))):
+            self.recognized.fire(types.SimpleNamespace(result=types.SimpleNamespace(reason=ResultReason.RecognizedSpeech, text=words)))
+        details = types.SimpleNamespace(reason=CancellationReason.EndOfStream, error_details="")
+        self.canceled.fire(types.SimpleNamespace(cancellation_details=details))
+        self.session_stopped.fire(types.SimpleNamespace())
@@ -0,0 +1,88 @@
+## Runs a pipeline script with overridden module constants and, optionally, the fake Speech SDK.
+## Started by run_benchmark.py from the repository root: python -m benchmarks.launch <script> [options] -- <script args>
+
+import argparse
+import ast
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+
+from benchmarks import fake_speechsdk
+
+LAUNCH_ARGS_ENV = "BENCHMARK_LAUNCH_ARGS"  # Launch arguments handed to spawned worker processes
+
+def parse_value(value):
+    """
+    Parses an override value as a Python literal, falling back to the plain string.
+
+    :param value: The value as given on the command line.
+    :return: The parsed value, e.g. an int, float, bool, None or str.
+    """
+    try:
+        return ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return value
+
+def parse_args(argv):
+    """
+    Parses command line arguments.
+
+    :param argv: Arguments before the '--' separating the script arguments.
+    :return: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Run a pipeline script for a benchmark.")
+    parser.add_argument('script', help='Script module to run', choices=['transcribe_image', 'transcribe_video', 'create_training_data'])
+    parser.add_argument('--set', help='Override a module constant of the script, e.g. MAX_TRANSCRIBE_WORKERS=8 (repeatable)', action='append', default=[])
+    parser.add_argument('--fake_speech', help='JSON options of the fake Speech SDK to install, e.g. {"latency": 0.5}', default=None)
+    parser.add_argument('--seed', help='Seed of the fake Speech SDK', type=int, default=None)
+    return parser.parse_args(argv)
+
+def prepare(argv):
+    """
+    Installs the stand-ins and imports the script with its constants overridden.
+
+    :param argv: Arguments before the '--' separating the script arguments.
+    :return: Tuple of the parsed arguments and the script module.
+    """
+    args = parse_args(argv)
+    if args.fake_speech is not None:
+        fake_speechsdk.install(seed=args.seed, **json.loads(args.fake_speech))
+
+    module = importlib.import_module(args.script)
+    for override in args.set:
+        name, _, value = override.partition("=")
+        if not hasattr(module, name):
+            raise ValueError(f"{args.script} has no constant {name}")
+        setattr(module, name, parse_value(value))
+    return args, module
+
+def main():
+    """
+    Main function to install the stand-ins, override the constants and run the script's main function.
+    """
+    argv = sys.argv[1:]
+    script_args = []
+    if "--" in argv:
+        separator = argv.index("--")
+        argv, script_args = argv[:separator], argv[separator + 1:]
+
+    # Worker processes must get the stand-ins and overrides too. Forked workers inherit them, while spawned workers,
+    # the only kind on Windows, import this module as __mp_main__ and prepare them again from the environment
+    if "fork" in multiprocessing.get_all_start_methods():
+        multiprocessing.set_start_method("fork")
+    else:
+        os.environ[LAUNCH_ARGS_ENV] = json.dumps(argv)
+    args, module = prepare(argv)
+
+    sys.argv = [f"{args.script}.py"] + script_args
+    if args.script == "create_training_data":
+        module.main(module.INPUT_DIR, module.OUTPUT_TXT_DIR, module.MAX_WORKERS, module.MANIFEST_PATH)
+    else:
+        module.main()
+
+if __name__ == '__main__':
+    main()
+elif __name__ == '__mp_main__' and LAUNCH_ARGS_ENV in os.environ:
+    prepare(json.loads(os.environ[LAUNCH_ARGS_ENV]))
@@ -1,4 +1,9 @@
 from models.AzureChat import AzureChat
+from memory.JobManifest import JobManifest
+from memory.ResponseCache import ResponseCache
+from utils.RateLimiter import RateLimiter
+from utils.Metrics import metrics
+from utils.EventLog import events
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from queue import Queue, Empty
 import os
@@ -10,51 +15,84 @@ from datetime import datetime
 INPUT_DIR = "data_cfa"
 OUTPUT_TXT_DIR = "./cfa_jsonl"
 MAX_WORKERS = os.cpu_count() * 2
-RETRY_DELAY = 60
-
-# Initialize logging
-log_dir = './logs'
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, f'create_training_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log')
-
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] - %(message)s",
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
+MAX_CONCURRENT_REQUESTS = 16  # Chunk requests in flight across all workers, so one long file is sent in parallel too
+MANIFEST_PATH = os.path.join(OUTPUT_TXT_DIR, "create_training_data_manifest.db")
+RETRY_DELAY = 60  # Delay in seconds to back off after a rate limit error without Retry-After
+REQUESTS_PER_MINUTE = None  # Request quota per minute shared by all workers, None to only throttle on rate limit headers
+TOKENS_PER_MINUTE = None  # Token quota per minute shared by all workers, None to only throttle on rate limit headers
+RATE_LIMIT_STATE = os.path.join(OUTPUT_TXT_DIR, "create_training_data_rate_limit.db")
+USE_RESPONSE_CACHE = True  # Reuse stored responses for identical requests, set to False to always call the model
+RESPONSE_CACHE_PATH = os.path.join(OUTPUT_TXT_DIR, "create_training_data_response_cache.db")
+RESPONSE_CACHE_MAX_MB = 1024  # Size limit of the cached responses, least recently used entries are evicted beyond it
+METRICS_DIR = None  # Directory the metrics are rewritten to as a Prometheus textfile, None to disable
+METRICS_PORT = None  # Localhost port serving the metrics in the Prometheus format, None to disable
+EVENTS_DIR = "./logs/events"  # Directory of the structured JSONL event log read by report_events.py, None to disable
+LOG_DIR = './logs'  # Directory of the run's log file, created when main starts
+
+run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
 
 # Initialize a queue
 job_queue = Queue()
 
-def process_file(chat, file_path):
+def setup_logging(log_directory):
+    """
+    Sets up logging to the console and to a log file named after the run.
+
+    :param log_directory: Directory where the log file will be saved.
+    """
+    os.makedirs(log_directory, exist_ok=True)
+    log_file = os.path.join(log_directory, f'create_training_data_{run_id}.log')
+
+    logging.basicConfig(
+        level=logging.DEBUG,
+        format="%(asctime)s [%(levelname)s] - %(message)s",
+        handlers=[
+            logging.FileHandler(log_file),
+            logging.StreamHandler()
+        ]
+    )
+
+def process_file(chat, file_path, manifest):
     """
     Processes a single file using AzureChat.
 
     :param chat: Instance of AzureChat.
     :param file_path: Path to the file to be processed.
+    :param manifest: Instance of JobManifest.
     """
+    started_at = time.time()
     try:
         logging.info(f"Processing file: {file_path}")
-        success = chat.send_message(file_path)
+        manifest.mark_started(file_path, "generate")
+        events.emit("started", "generate", path=file_path)
+        with metrics.stage("generate"):
+            success = chat.send_message(file_path)
         if success:
+            manifest.mark_done(file_path, "generate")
+            metrics.inc("jobs_total", stage="generate", status="success")
+            metrics.inc("bytes_processed_total", os.path.getsize(file_path), stage="generate")
+            events.emit("generated", "generate", path=file_path, started_at=started_at)
             logging.info(f"Successfully processed file: {file_path}")
         else:
+            # The shared rate limiter holds back every worker until the Retry-After delay has passed
+            metrics.inc("jobs_total", stage="generate", status="rate_limited")
+            events.emit("retried", "generate", path=file_path, started_at=started_at)
             logging.info(f"Re-added file for retry due to rate limit: {file_path}")
-            time.sleep(RETRY_DELAY)
             job_queue.put(file_path)
     except Exception as e:
+        manifest.mark_failed(file_path, "generate", e)
+        metrics.inc("jobs_total", stage="generate", status="failed")
+        events.emit("failed", "generate", path=file_path, started_at=started_at, error=str(e))
         logging.error(f"Unhandled error processing file {file_path}: {e}")
     finally:
         job_queue.task_done()
 
-def worker(chat):
+def worker(chat, manifest):
     """
     Worker function to process jobs from the queue.
 
     :param chat: Instance of AzureChat.
+    :param manifest: Instance of JobManifest.
     """
     while True:
         try:
@@ -65,36 +103,60 @@ def worker(chat):
         if job is None:
             break
         
-        process_file(chat, job)
+        process_file(chat, job, manifest)
 
-def main(input_dir, output_txt_dir, max_workers=4):
+def main(input_dir, output_txt_dir, max_workers=4, manifest_path=MANIFEST_PATH):
     """
     Main function to initialize processing and manage worker threads.
 
     :param input_dir: Directory containing input text files.
     :param output_txt_dir: Directory to save transcribed text.
     :param max_workers: Maximum number of workers to use.
+    :param manifest_path: Path to the SQLite job manifest used to skip files finished in a previous run.
     """
-    chat = AzureChat(output_txt_dir, transcribe_content_type="create_cfa_data")
+    setup_logging(LOG_DIR)
+    rate_limiter = RateLimiter(RATE_LIMIT_STATE, REQUESTS_PER_MINUTE, TOKENS_PER_MINUTE, default_retry_delay=RETRY_DELAY)
+    response_cache = ResponseCache(RESPONSE_CACHE_PATH, max_bytes=RESPONSE_CACHE_MAX_MB * 1024 * 1024) if USE_RESPONSE_CACHE else None
+    chat = AzureChat(output_txt_dir, transcribe_content_type="create_cfa_data", rate_limiter=rate_limiter, response_cache=response_cache, max_concurrent_requests=MAX_CONCURRENT_REQUESTS)
+    manifest = JobManifest(manifest_path)
+    metrics.configure(pipeline="create_training_data", process="main")
+    metrics.set_callback("queue_depth", job_queue.qsize, queue="files")
+    metrics.start_exporting(METRICS_DIR, METRICS_PORT)
+    events.configure(EVENTS_DIR, pipeline="create_training_data", run_id=run_id, process="main")
     
     for root, _, files in os.walk(input_dir):
         for file in files:
             if file.endswith('.txt'):
                 file_path = os.path.join(root, file)
+                if manifest.is_done(file_path, "generate"):
+                    logging.info(f"Skipping file already processed in a previous run: {file_path}")
+                    continue
+                events.emit("discovered", "discover", path=file_path)
                 job_queue.put(file_path)
     
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         futures = []
         for _ in range(max_workers):
-            futures.append(executor.submit(worker, chat))
+            futures.append(executor.submit(worker, chat, manifest))
         
         job_queue.join()
-    
-    for _ in range(max_workers):
-        job_queue.put(None)
 
-    for future in as_completed(futures):
-        future.result()
+        # Workers only exit on a sentinel, so they must be sent before the pool waits for them on exit
+        for _ in range(max_workers):
+            job_queue.put(None)
+
+        for future in as_completed(futures):
+            future.result()
+
+    chat.close()
+    if response_cache is not None:
+        stats = response_cache.stats()
+        logging.info(f"[RESPONSE CACHE] {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+        response_cache.close()
+    manifest.close()
+    rate_limiter.close()
+    metrics.stop_exporting()
+    events.close()
 
 if __name__ == '__main__':
     main(INPUT_DIR, OUTPUT_TXT_DIR, MAX_WORKERS)
\ No newline at end of file
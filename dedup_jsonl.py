@@ -0,0 +1,50 @@
+import json
+import argparse
+
+from utils.dedup import deduplicate_jsonl_files, summarize, NUM_PERM, BANDS, SHINGLE_SIZE, THRESHOLD
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    :return: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Drop exact and near duplicate question and answer pairs from JSONL training data.")
+    parser.add_argument('inputs', help='JSONL files, directories of JSONL files or glob patterns', nargs='+')
+    parser.add_argument('--output', help='Deduplicated JSONL file', required=True)
+    parser.add_argument('--report', help='Write every dropped line, the reason and the pair it duplicates to this JSONL file', default=None)
+    parser.add_argument('--summary', help='Write the counts of every input file to this JSON file', default=None)
+    parser.add_argument('--index', help='Persistent dedup index, to also drop pairs kept in previous runs (default: temporary)', default=None)
+    parser.add_argument('--threshold', help=f'Estimated Jaccard similarity of the questions above which a pair is a near duplicate (default {THRESHOLD})', type=float, default=THRESHOLD)
+    parser.add_argument('--exact_only', help='Only drop exact duplicates', action='store_true')
+    parser.add_argument('--num_perm', help=f'Number of hash functions in a MinHash signature (default {NUM_PERM})', type=int, default=NUM_PERM)
+    parser.add_argument('--bands', help=f'Number of LSH bands, which must divide --num_perm (default {BANDS})', type=int, default=BANDS)
+    parser.add_argument('--shingle_size', help=f'Characters per shingle (default {SHINGLE_SIZE})', type=int, default=SHINGLE_SIZE)
+    return parser.parse_args()
+
+def main():
+    """
+    Main function to deduplicate the files and print the dropped lines of each file.
+    """
+    args = parse_args()
+    all_stats = deduplicate_jsonl_files(args.inputs, args.output, args.report, args.index,
+                                        threshold=None if args.exact_only else args.threshold,
+                                        num_perm=args.num_perm, bands=args.bands, shingle_size=args.shingle_size)
+    if not all_stats:
+        print("No JSONL files found.")
+        return
+
+    for stats in all_stats:
+        if stats["exact"] or stats["near"] or stats["invalid"]:
+            print(f"{stats['file']}: {stats['kept']} kept, {stats['exact']} exact, {stats['near']} near duplicates, {stats['invalid']} invalid")
+
+    totals = summarize(all_stats)
+    print(f"Kept {totals['kept']} of {totals['lines']} lines from {totals['files']} files in {args.output} "
+          f"({totals['exact']} exact and {totals['near']} near duplicates, {totals['invalid']} invalid, {totals['blank']} blank)")
+
+    if args.summary:
+        with open(args.summary, 'w', encoding='utf-8') as f:
+            json.dump({"totals": totals, "files": all_stats}, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import threading
+
+class DedupIndex:
+    COMMIT_EVERY = 1000  # Number of added records written in one transaction
+    MAX_CANDIDATES = 200  # Records compared per lookup, so crowded buckets cannot stall the scan
+
+    def __init__(self, db_path, cache_mb=64):
+        """
+        Initializes an index of kept training examples for deduplication, backed by a SQLite database so memory use
+        stays bounded however many records are indexed. Reuse the database across runs to deduplicate new outputs
+        against the records kept before.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        :param cache_mb: Size of SQLite's page cache in MB.
+        """
+        self.db_path = db_path
+        self._uncommitted = 0
+        self._reclaimed = set()
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(f"PRAGMA cache_size=-{cache_mb * 1024}")
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS records (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    line INTEGER NOT NULL,
+                    signature BLOB
+                )
+                """
+            )
+            self._connection.execute("CREATE TABLE IF NOT EXISTS exact (digest BLOB PRIMARY KEY, record_id INTEGER NOT NULL)")
+            self._connection.execute("CREATE TABLE IF NOT EXISTS buckets (bucket INTEGER NOT NULL, record_id INTEGER NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS buckets_bucket ON buckets (bucket)")
+            # Records up to this ID were indexed by earlier runs
+            self._last_previous_id = self._connection.execute("SELECT COALESCE(MAX(id), 0) FROM records").fetchone()[0]
+
+    def find_exact(self, digest):
+        """
+        Looks up a kept record with the same content digest.
+
+        :param digest: The digest of the normalized record.
+        :return: Tuple of the record's ID, source file and line number, or None if there is none.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT records.id, records.source, records.line FROM exact JOIN records ON records.id = exact.record_id WHERE exact.digest = ?", (digest,)
+            ).fetchone()
+
+    def reclaim(self, record_id, source):
+        """
+        Checks whether a matching record is the same record read again, i.e. it was indexed by an earlier run over the
+        same file and no other line of this run has matched it yet. Line numbers are not compared, as rewriting the
+        file can shift its lines.
+
+        :param record_id: The ID of the matching record.
+        :param source: The file the record was read from.
+        :return: True if the record counts as already kept, otherwise False.
+        """
+        with self._lock:
+            if record_id > self._last_previous_id or record_id in self._reclaimed:
+                return False
+            if self._connection.execute("SELECT source FROM records WHERE id = ?", (record_id,)).fetchone()[0] != source:
+                return False
+            self._reclaimed.add(record_id)
+            return True
+
+    def find_candidates(self, band_keys):
+        """
+        Looks up kept records sharing at least one LSH bucket.
+
+        :param band_keys: The bucket key of each band of the record's MinHash signature.
+        :return: List of tuples of the candidate's source file, line number and MinHash signature.
+        """
+        with self._lock:
+            return self._connection.execute(
+                "SELECT DISTINCT records.source, records.line, records.signature FROM buckets JOIN records ON records.id = buckets.record_id "
+                f"WHERE buckets.bucket IN ({', '.join('?' * len(band_keys))}) LIMIT ?", (*band_keys, self.MAX_CANDIDATES)
+            ).fetchall()
+
+    def add(self, source, line, digest, band_keys=None, signature=None):
+        """
+        Indexes a kept record.
+
+        :param source: The file the record was read from.
+        :param line: The line number of the record.
+        :param digest: The digest of the normalized record.
+        :param band_keys: The bucket key of each band of the record's MinHash signature, or None to only index the digest.
+        :param signature: The MinHash signature as bytes, or None.
+        """
+        with self._lock:
+            cursor = self._connection.execute("INSERT INTO records (source, line, signature) VALUES (?, ?, ?)", (source, line, signature))
+            record_id = cursor.lastrowid
+            self._connection.execute("INSERT OR IGNORE INTO exact VALUES (?, ?)", (digest, record_id))
+            if band_keys is not None:
+                self._connection.executemany("INSERT INTO buckets VALUES (?, ?)", [(bucket, record_id) for bucket in band_keys])
+
+            self._uncommitted += 1
+            if self._uncommitted >= self.COMMIT_EVERY:
+                self._commit()
+
+    def _commit(self):
+        """
+        Writes the records added since the last commit. Must be called with the lock held.
+        """
+        self._connection.commit()
+        self._uncommitted = 0
+
+    def commit(self):
+        """
+        Writes the records added since the last commit.
+        """
+        with self._lock:
+            self._commit()
+
+    def count(self):
+        """
+        Counts the indexed records.
+
+        :return: The number of records.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def close(self):
+        """
+        Writes the remaining records and closes the underlying database connection.
+        """
+        with self._lock:
+            self._commit()
+            self._connection.close()
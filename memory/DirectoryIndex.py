@@ -0,0 +1,96 @@
+import os
+import json
+import sqlite3
+import threading
+
+class DirectoryIndex:
+    FLUSH_EVERY = 500  # Number of directory listings buffered before they are written in one transaction
+
+    def __init__(self, db_path, rules=""):
+        """
+        Initializes a persistent index of directory listings keyed by directory mtime, backed by a SQLite database.
+        A directory's mtime changes whenever an entry is added, removed or renamed in it, so an unchanged mtime
+        means its listing can be reused without reading the directory again.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        :param rules: Description of the filter the stored listings were made with. Listings made with other rules are ignored.
+        """
+        self.db_path = db_path
+        self.rules = rules
+        self._pending = []
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS directories (
+                    rules TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    files TEXT NOT NULL,
+                    subdirs TEXT NOT NULL,
+                    PRIMARY KEY (rules, path)
+                )
+                """
+            )
+
+    def get(self, path, mtime_ns):
+        """
+        Retrieves the stored listing of a directory if it has not changed since.
+
+        :param path: The path to the directory.
+        :param mtime_ns: The current mtime of the directory in nanoseconds.
+        :return: Tuple of the matching file names and the subdirectory names, or None if the directory changed or is new.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT files, subdirs FROM directories WHERE rules = ? AND path = ? AND mtime_ns = ?", (self.rules, path, mtime_ns)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, path, mtime_ns, files, subdirs):
+        """
+        Stores the listing of a directory. Listings are written in batches, so call flush once the walk is done.
+
+        :param path: The path to the directory.
+        :param mtime_ns: The mtime of the directory in nanoseconds when it was listed.
+        :param files: The names of the matching files in the directory.
+        :param subdirs: The names of the subdirectories.
+        """
+        with self._lock:
+            self._pending.append((self.rules, path, mtime_ns, json.dumps(files, ensure_ascii=False), json.dumps(subdirs, ensure_ascii=False)))
+            if len(self._pending) >= self.FLUSH_EVERY:
+                self._flush()
+
+    def _flush(self):
+        """
+        Writes the buffered listings. Must be called with the lock held.
+        """
+        if self._pending:
+            with self._connection:
+                self._connection.executemany("INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+
+    def flush(self):
+        """
+        Writes the buffered listings.
+        """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """
+        Writes the buffered listings and closes the underlying database connection.
+        """
+        with self._lock:
+            self._flush()
+            self._connection.close()
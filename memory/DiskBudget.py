@@ -0,0 +1,60 @@
+import time
+import multiprocessing
+
+class DiskBudget:
+    def __init__(self, max_bytes):
+        """
+        Initializes a budget of temporary audio bytes on disk, shared between the conversion and transcription processes.
+        Pass the instance to the worker processes when starting them.
+
+        :param max_bytes: Maximum number of bytes of temporary audio on disk at once.
+        """
+        self.max_bytes = max_bytes
+        self._condition = multiprocessing.Condition()
+        self._in_use = multiprocessing.RawValue('q', 0)
+
+    @property
+    def in_use(self):
+        """
+        The number of bytes currently counted against the budget.
+        """
+        with self._condition:
+            return self._in_use.value
+
+    def acquire(self, size, block=True):
+        """
+        Counts bytes against the budget, waiting until they fit. A reservation is always admitted when nothing else
+        is in flight, so a single file larger than the whole budget cannot stall the pipeline.
+
+        :param size: The number of bytes to reserve.
+        :param block: Whether to wait for the bytes to fit. Set to False for files that already exist on disk.
+        :return: The number of seconds spent waiting.
+        """
+        start_time = time.monotonic()
+        with self._condition:
+            if block:
+                self._condition.wait_for(lambda: self._in_use.value == 0 or self._in_use.value + size <= self.max_bytes)
+            self._in_use.value += size
+        return time.monotonic() - start_time
+
+    def release(self, size):
+        """
+        Returns bytes to the budget and wakes any waiting reservations.
+
+        :param size: The number of bytes to release.
+        """
+        with self._condition:
+            self._in_use.value = max(0, self._in_use.value - size)
+            self._condition.notify_all()
+
+    def adjust(self, reserved, actual):
+        """
+        Replaces an estimated reservation with the actual size of the file once it is known.
+
+        :param reserved: The number of bytes reserved with acquire.
+        :param actual: The actual number of bytes on disk.
+        """
+        if actual < reserved:
+            self.release(reserved - actual)
+        elif actual > reserved:
+            self.acquire(actual - reserved, block=False)
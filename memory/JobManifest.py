@@ -0,0 +1,254 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+class JobManifest:
+    def __init__(self, db_path):
+        """
+        Initializes the JobManifest backed by a SQLite database.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        """
+        self.db_path = db_path
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        """
+        Creates the jobs and outputs tables if they do not exist yet.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    source_path TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    content_hash TEXT,
+                    output_path TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    started_at REAL,
+                    finished_at REAL,
+                    PRIMARY KEY (source_path, stage)
+                )
+                """
+            )
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS outputs (
+                    directory TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    PRIMARY KEY (directory, name)
+                )
+                """
+            )
+
+    @staticmethod
+    def _normalise(path):
+        """
+        Normalises a path so the same file always maps to the same manifest key. URLs are kept as they are.
+
+        :param path: The path to normalise.
+        :return: The absolute path with forward slashes.
+        """
+        if "://" in path:
+            return path
+        return os.path.abspath(path).replace('\\', '/')
+
+    @staticmethod
+    def content_hash(file_path, sample_size=1024 * 1024):
+        """
+        Computes a cheap content hash from the file size and its first and last bytes.
+
+        Hashing multi-GB videos in full would cost more than the conversion itself, so only
+        the head and tail of the file are sampled.
+
+        :param file_path: The path to the file to hash.
+        :param sample_size: The number of bytes to read from each end of the file.
+        :return: A hex digest identifying the file content.
+        """
+        size = os.path.getsize(file_path)
+        digest = hashlib.sha1(str(size).encode('utf-8'))
+        with open(file_path, 'rb') as file:
+            digest.update(file.read(sample_size))
+            if size > sample_size:
+                file.seek(max(size - sample_size, sample_size))
+                digest.update(file.read(sample_size))
+        return digest.hexdigest()
+
+    def sync_outputs(self, directory, suffix='.txt'):
+        """
+        Records every existing output file in the directory with a single scan, so later skip
+        checks become indexed lookups instead of repeated directory listings.
+
+        :param directory: The directory holding the output files.
+        :param suffix: Only files ending with this suffix are recorded.
+        :return: The number of output files recorded.
+        """
+        directory = self._normalise(directory)
+        if not os.path.isdir(directory):
+            return 0
+
+        with os.scandir(directory) as entries:
+            names = [(directory, entry.name) for entry in entries if entry.is_file() and entry.name.endswith(suffix)]
+
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO outputs (directory, name) VALUES (?, ?)", names)
+        return len(names)
+
+    def has_output(self, directory, name):
+        """
+        Checks whether an output file with the given name is recorded for the directory.
+
+        :param directory: The directory holding the output files.
+        :param name: The file name of the output.
+        :return: True if the output is recorded, False otherwise.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM outputs WHERE directory = ? AND name = ?", (self._normalise(directory), name)
+            ).fetchone()
+        return row is not None
+
+    def has_transcript(self, source_path, transcript_directory, transcript_name):
+        """
+        Checks whether a source file already has a transcript, either from a completed job or
+        from an output file recorded by sync_outputs.
+
+        :param source_path: The path to the source file.
+        :param transcript_directory: The directory where transcript files are stored.
+        :param transcript_name: The expected file name of the transcript.
+        :return: True if the source file should be skipped, False otherwise.
+        """
+        return self.is_done(source_path, "transcribe") or self.has_output(transcript_directory, transcript_name)
+
+    def get(self, source_path, stage):
+        """
+        Retrieves the manifest entry of a source file for a stage.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage, e.g. 'convert' or 'transcribe'.
+        :return: A dictionary with the entry's columns, or None if there is no entry.
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT * FROM jobs WHERE source_path = ? AND stage = ?", (self._normalise(source_path), stage)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+
+    def is_done(self, source_path, stage):
+        """
+        Checks whether a stage has completed successfully for a source file.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        :return: True if the stage is done, False otherwise.
+        """
+        entry = self.get(source_path, stage)
+        return entry is not None and entry["status"] == "done"
+
+    def mark_started(self, source_path, stage, content_hash=None):
+        """
+        Records that a stage has started for a source file.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        :param content_hash: Optional content hash of the source file.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO jobs (source_path, stage, status, content_hash, attempts, started_at)
+                VALUES (?, ?, 'running', ?, 1, ?)
+                ON CONFLICT (source_path, stage) DO UPDATE SET
+                    status = 'running',
+                    content_hash = COALESCE(excluded.content_hash, jobs.content_hash),
+                    error = NULL,
+                    attempts = jobs.attempts + 1,
+                    started_at = excluded.started_at,
+                    finished_at = NULL
+                """,
+                (self._normalise(source_path), stage, content_hash, time.time())
+            )
+
+    def mark_done(self, source_path, stage, output_path=None):
+        """
+        Records that a stage has completed for a source file.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        :param output_path: Optional path to the file produced by the stage.
+        """
+        if output_path:
+            output_path = self._normalise(output_path)
+        self._finish(source_path, stage, "done", output_path=output_path)
+        if output_path:
+            with self._lock, self._connection:
+                self._connection.execute(
+                    "INSERT OR IGNORE INTO outputs (directory, name) VALUES (?, ?)",
+                    (os.path.dirname(output_path), os.path.basename(output_path))
+                )
+
+    def mark_skipped(self, source_path, stage):
+        """
+        Records that a stage was skipped for a source file, e.g. because it already has a transcript.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        """
+        self._finish(source_path, stage, "skipped")
+
+    def mark_failed(self, source_path, stage, error=None):
+        """
+        Records that a stage has failed for a source file.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        :param error: Optional description of the error.
+        """
+        self._finish(source_path, stage, "failed", error=str(error) if error is not None else None)
+
+    def _finish(self, source_path, stage, status, output_path=None, error=None):
+        """
+        Updates the final status and timing of a stage for a source file.
+
+        :param source_path: The path to the source file.
+        :param stage: The pipeline stage.
+        :param status: The final status, 'done', 'skipped' or 'failed'.
+        :param output_path: Optional path to the file produced by the stage.
+        :param error: Optional description of the error.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                INSERT INTO jobs (source_path, stage, status, output_path, error, attempts, started_at, finished_at)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?)
+                ON CONFLICT (source_path, stage) DO UPDATE SET
+                    status = excluded.status,
+                    output_path = COALESCE(excluded.output_path, jobs.output_path),
+                    error = excluded.error,
+                    finished_at = excluded.finished_at
+                """,
+                (self._normalise(source_path), stage, status, output_path, error, now, now)
+            )
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
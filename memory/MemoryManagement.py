@@ -1,16 +1,32 @@
 import os
 
 class MemoryManager:
-    def __init__(self):
-        pass
+    def __init__(self, disk_budget=None):
+        """
+        :param disk_budget: Instance of DiskBudget that deleted temporary audio is returned to, or None.
+        """
+        self.disk_budget = disk_budget
 
     def del_temp_audio(self, temp_audio_filepath):
         removed = False
         try:
             if os.path.exists(temp_audio_filepath):
+                size = os.path.getsize(temp_audio_filepath)
                 os.remove(temp_audio_filepath)
                 removed = True
+                if self.disk_budget is not None:
+                    self.disk_budget.release(size)
         except OSError as e:
             print(f"Error: {e.strerror}. Could not delete file {temp_audio_filepath}.")
 
-        return removed
\ No newline at end of file
+        return removed
+
+    def forget_temp_audio(self, temp_audio_filepath):
+        """
+        Stops counting a temporary audio file that is kept on disk against the disk budget, e.g. after a failed
+        transcription, so files left for a later run cannot hold up conversions forever.
+
+        :param temp_audio_filepath: Path to the temporary audio file.
+        """
+        if self.disk_budget is not None and os.path.exists(temp_audio_filepath):
+            self.disk_budget.release(os.path.getsize(temp_audio_filepath))
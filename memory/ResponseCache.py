@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+class ResponseCache:
+    TOUCH_BATCH = 256  # Hits whose last_used time is held in memory before being written in one statement
+
+    def __init__(self, db_path, max_bytes=1024 * 1024 * 1024):
+        """
+        Initializes a persistent cache of chat completion responses, backed by a SQLite database.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        :param max_bytes: Maximum total size of the cached responses, least recently used entries are evicted beyond it.
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            # Only this instance writes to the cache, so the total is read once and then kept up to date on every change
+            self._total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        self._touched = {}
+
+    @staticmethod
+    def make_key(model, system_prompt, user_message, max_tokens):
+        """
+        Computes the cache key of a request. Any change to the deployment, prompts or token limit gives a new key.
+
+        :param model: The deployment name.
+        :param system_prompt: The system prompt.
+        :param user_message: The user message.
+        :param max_tokens: The completion token limit.
+        :return: A hex digest identifying the request.
+        """
+        payload = json.dumps([model, system_prompt, user_message, max_tokens], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Looks up a cached response. The time of the hit is recorded in memory and written with the next put, or once
+        TOUCH_BATCH hits have accumulated, so lookups do not each take the write lock of the database.
+
+        :param key: The key from make_key.
+        :return: The cached response content, or None on a miss.
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT content FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self.TOUCH_BATCH:
+                with self._connection:
+                    self._flush_touched()
+            return row[0]
+
+    def put(self, key, content):
+        """
+        Stores a response, evicting the least recently used entries if the cache is full.
+
+        :param key: The key from make_key.
+        :param content: The response content.
+        """
+        size = len(content.encode('utf-8'))
+        with self._lock, self._connection:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, content, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, content, size, time.time())
+            )
+            self._touched.pop(key, None)
+            self._total_size += size - (previous[0] if previous else 0)
+            self._flush_touched()
+            self._evict()
+
+    def _flush_touched(self):
+        """
+        Writes the last_used times of the hits recorded since the last flush. Must be called with the lock held.
+        """
+        if self._touched:
+            self._connection.executemany("UPDATE responses SET last_used = ? WHERE key = ?", [(last_used, key) for key, last_used in self._touched.items()])
+            self._touched.clear()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cached responses fit in max_bytes. Must be called with the lock held.
+        """
+        if self.max_bytes is None or self._total_size <= self.max_bytes:
+            return
+
+        evicted = []
+        for key, size in self._connection.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if self._total_size <= self.max_bytes:
+                break
+            evicted.append((key,))
+            self._total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def stats(self):
+        """
+        Reports the hit and miss counters of this cache instance.
+
+        :return: A dictionary with the hits, misses and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """
+        Writes the pending last_used times and closes the underlying database connection.
+        """
+        with self._lock:
+            with self._connection:
+                self._flush_touched()
+            self._connection.close()
@@ -0,0 +1,49 @@
+import os
+import socket
+import hashlib
+
+class ShardClaims:
+    def __init__(self, claims_dir, node_id=None):
+        """
+        Initializes claims on files of a corpus split across several nodes, kept as one file per claim in a directory
+        shared by all nodes. Claims are taken with exclusive file creation, which is atomic on local and network file systems.
+
+        :param claims_dir: The shared directory holding the claim files. Created if it does not exist.
+        :param node_id: Identifier of this node, defaults to the host name. A node can take back its own claims, so
+                        a restarted node resumes the files it claimed before crashing.
+        """
+        self.claims_dir = claims_dir
+        self.node_id = node_id or socket.gethostname()
+        self.claimed = 0
+        os.makedirs(self.claims_dir, exist_ok=True)
+
+    def claim_path(self, key):
+        """
+        Creates the path of the claim file for a shard key.
+
+        :param key: The shard key of the file.
+        :return: The path to the claim file.
+        """
+        return os.path.join(self.claims_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".claim")
+
+    def claim(self, key):
+        """
+        Claims a file for this node.
+
+        :param key: The shard key of the file.
+        :return: True if this node holds the claim, False if another node claimed the file first.
+        """
+        path = self.claim_path(key)
+        try:
+            descriptor = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    return file.read().split('\n', 1)[0] == self.node_id
+            except OSError:
+                return False
+
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as file:
+            file.write(f"{self.node_id}\n{key}\n")
+        self.claimed += 1
+        return True
@@ -0,0 +1,264 @@
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+class SlideCache:
+    def __init__(self, db_path, max_bytes=512 * 1024 * 1024, use_perceptual_hash=False, max_hash_distance=6):
+        """
+        Initializes a persistent cache of slide transcripts keyed by image content, backed by a SQLite database.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        :param max_bytes: Maximum total size of the cached transcripts, least recently used entries are evicted beyond it.
+        :param use_perceptual_hash: Whether near-identical renders of a slide also count as hits. Requires Pillow.
+        :param max_hash_distance: Maximum number of differing bits between two perceptual hashes for a near-identical match.
+        """
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.use_perceptual_hash = use_perceptual_hash
+        self.max_hash_distance = max_hash_distance
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS slides (
+                    content_hash TEXT PRIMARY KEY,
+                    perceptual_hash TEXT,
+                    transcript TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS slides_last_used ON slides (last_used)")
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS slide_bands (
+                    band INTEGER NOT NULL,
+                    value TEXT NOT NULL,
+                    content_hash TEXT NOT NULL
+                )
+                """
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS slide_bands_value ON slide_bands (band, value)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS slide_bands_content_hash ON slide_bands (content_hash)")
+            self._rebuild_bands()
+            # Only this instance writes to the cache, so the total is read once and then kept up to date on every change
+            self._total_size = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM slides").fetchone()[0]
+
+    @staticmethod
+    def content_hash(image_file_path):
+        """
+        Computes the SHA-256 hash of an image file.
+
+        :param image_file_path: The path to the image file.
+        :return: A hex digest identifying the image content.
+        """
+        digest = hashlib.sha256()
+        with open(image_file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    @staticmethod
+    def perceptual_hash(image_file_path, hash_size=16):
+        """
+        Computes an average hash of an image, which stays the same when a slide is re-rendered or re-compressed.
+        A fine grid is used because slides are mostly blank, and coarse hashes of different slides collide.
+
+        :param image_file_path: The path to the image file.
+        :param hash_size: The hash has hash_size * hash_size bits.
+        :return: The hash as a hex string.
+        """
+        from PIL import Image
+
+        with Image.open(image_file_path) as image:
+            pixels = image.convert('L').resize((hash_size, hash_size), Image.LANCZOS).tobytes()
+
+        mean = sum(pixels) / len(pixels)
+        bits = 0
+        for pixel in pixels:
+            bits = (bits << 1) | (pixel < mean)
+        return f"{bits:0{hash_size * hash_size // 4}x}"
+
+    @staticmethod
+    def hamming_distance(first_hash, second_hash):
+        """
+        Counts the bits that differ between two perceptual hashes.
+
+        :param first_hash: A hex perceptual hash.
+        :param second_hash: Another hex perceptual hash.
+        :return: The number of differing bits.
+        """
+        return bin(int(first_hash, 16) ^ int(second_hash, 16)).count('1')
+
+    def hash_bands(self, perceptual_hash):
+        """
+        Splits a perceptual hash into max_hash_distance + 1 bands of bits. Two hashes differing in at most
+        max_hash_distance bits leave at least one band unchanged, so near-identical slides always share a band.
+
+        :param perceptual_hash: A hex perceptual hash.
+        :return: List of (band, value) pairs, one per band.
+        """
+        bits = len(perceptual_hash) * 4
+        value = int(perceptual_hash, 16)
+        band_count = min(self.max_hash_distance + 1, bits)
+        bands = []
+        end = bits
+        for band in range(band_count):
+            width = bits // band_count + (band < bits % band_count)
+            # Stored as hex, since a band of a hash with few bands can be wider than a SQLite integer
+            bands.append((band, f"{(value >> (end - width)) & ((1 << width) - 1):x}"))
+            end -= width
+        return bands
+
+    def _rebuild_bands(self):
+        """
+        Re-indexes the bands of every stored perceptual hash when the band layout changed since the cache was written,
+        which happens when max_hash_distance changes. Must be called with the lock held.
+        """
+        band_count = self.max_hash_distance + 1
+        if self._connection.execute("PRAGMA user_version").fetchone()[0] == band_count:
+            return
+        self._connection.execute("DELETE FROM slide_bands")
+        rows = self._connection.execute("SELECT content_hash, perceptual_hash FROM slides WHERE perceptual_hash IS NOT NULL").fetchall()
+        self._connection.executemany(
+            "INSERT INTO slide_bands (band, value, content_hash) VALUES (?, ?, ?)",
+            [(band, value, content_hash) for content_hash, perceptual_hash in rows for band, value in self.hash_bands(perceptual_hash)]
+        )
+        self._connection.execute(f"PRAGMA user_version = {int(band_count)}")
+
+    def _find_near_match(self, perceptual_hash):
+        """
+        Finds the cached slide with the closest perceptual hash within max_hash_distance, comparing only the slides
+        that share a band with it. Must be called with the lock held.
+
+        :param perceptual_hash: The hex perceptual hash of the image.
+        :return: Tuple of the content hash and transcript of the closest slide, or None if there is none.
+        """
+        bands = self.hash_bands(perceptual_hash)
+        candidates = self._connection.execute(
+            f"""
+            SELECT DISTINCT slides.content_hash, slides.perceptual_hash, slides.transcript
+            FROM slide_bands JOIN slides ON slides.content_hash = slide_bands.content_hash
+            WHERE {' OR '.join(['(slide_bands.band = ? AND slide_bands.value = ?)'] * len(bands))}
+            """,
+            [item for band in bands for item in band]
+        ).fetchall()
+
+        best = None
+        best_distance = self.max_hash_distance + 1
+        for content_hash, candidate_hash, transcript in candidates:
+            distance = self.hamming_distance(perceptual_hash, candidate_hash)
+            if distance < best_distance:
+                best, best_distance = (content_hash, transcript), distance
+        return best
+
+    def get(self, image_file_path):
+        """
+        Looks up the transcript of an image, first by exact content and then by perceptual hash if enabled.
+
+        :param image_file_path: The path to the image file.
+        :return: The cached transcript, or None on a miss.
+        """
+        content_hash = self.content_hash(image_file_path)
+        perceptual_hash = self.perceptual_hash(image_file_path) if self.use_perceptual_hash else None
+
+        with self._lock, self._connection:
+            row = self._connection.execute("SELECT content_hash, transcript FROM slides WHERE content_hash = ?", (content_hash,)).fetchone()
+            if row is not None:
+                self.hits += 1
+            elif perceptual_hash is not None:
+                row = self._find_near_match(perceptual_hash)
+                if row is not None:
+                    self.near_hits += 1
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._connection.execute("UPDATE slides SET last_used = ? WHERE content_hash = ?", (time.time(), row[0]))
+            return row[1]
+
+    def put(self, image_file_path, transcript):
+        """
+        Stores the transcript of an image, evicting the least recently used entries if the cache is full.
+
+        :param image_file_path: The path to the image file.
+        :param transcript: The transcribed text of the image.
+        """
+        content_hash = self.content_hash(image_file_path)
+        perceptual_hash = self.perceptual_hash(image_file_path) if self.use_perceptual_hash else None
+        size = len(transcript.encode('utf-8'))
+
+        with self._lock, self._connection:
+            previous = self._connection.execute("SELECT size FROM slides WHERE content_hash = ?", (content_hash,)).fetchone()
+            self._connection.execute(
+                """
+                INSERT INTO slides (content_hash, perceptual_hash, transcript, size, last_used) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (content_hash) DO UPDATE SET
+                    perceptual_hash = COALESCE(excluded.perceptual_hash, slides.perceptual_hash),
+                    transcript = excluded.transcript,
+                    size = excluded.size,
+                    last_used = excluded.last_used
+                """,
+                (content_hash, perceptual_hash, transcript, size, time.time())
+            )
+            self._total_size += size - (previous[0] if previous else 0)
+            if perceptual_hash is not None:
+                self._connection.execute("DELETE FROM slide_bands WHERE content_hash = ?", (content_hash,))
+                self._connection.executemany(
+                    "INSERT INTO slide_bands (band, value, content_hash) VALUES (?, ?, ?)",
+                    [(band, value, content_hash) for band, value in self.hash_bands(perceptual_hash)]
+                )
+            self._evict()
+
+    def _evict(self):
+        """
+        Deletes the least recently used entries until the cached transcripts fit in max_bytes. Must be called with the lock held.
+        """
+        if self.max_bytes is None or self._total_size <= self.max_bytes:
+            return
+
+        evicted = []
+        for content_hash, size in self._connection.execute("SELECT content_hash, size FROM slides ORDER BY last_used"):
+            if self._total_size <= self.max_bytes:
+                break
+            evicted.append((content_hash,))
+            self._total_size -= size
+        self._connection.executemany("DELETE FROM slides WHERE content_hash = ?", evicted)
+        self._connection.executemany("DELETE FROM slide_bands WHERE content_hash = ?", evicted)
+
+    def stats(self):
+        """
+        Reports the hit and miss counters of this cache instance.
+
+        :return: A dictionary with the exact hits, near-identical hits, misses and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.near_hits + self.misses
+            return {
+                "hits": self.hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
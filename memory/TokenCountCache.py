@@ -0,0 +1,94 @@
+import os
+import sqlite3
+import threading
+
+class TokenCountCache:
+    LOOKUP_BATCH = 500  # Keys looked up per query, below SQLite's limit on query parameters
+
+    def __init__(self, db_path):
+        """
+        Initializes a persistent cache of the token counts of training examples, backed by a SQLite database.
+        Examples are keyed by a hash of their content, so after editing a dataset only new or changed examples are
+        tokenized again.
+
+        :param db_path: Path to the SQLite database file. Created if it does not exist.
+        """
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.db_path, timeout=60, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        with self._lock, self._connection:
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS token_counts (
+                    scheme TEXT NOT NULL,
+                    digest BLOB NOT NULL,
+                    total INTEGER NOT NULL,
+                    assistant INTEGER NOT NULL,
+                    PRIMARY KEY (scheme, digest)
+                )
+                """
+            )
+
+    def get_many(self, scheme, digests):
+        """
+        Looks up the counts of several examples.
+
+        :param scheme: The encoding and message overheads the counts were made with. Counts made with another scheme are ignored.
+        :param digests: The content digests of the examples.
+        :return: Dictionary mapping each cached digest to a tuple of its total and assistant token counts.
+        """
+        found = {}
+        with self._lock:
+            for start in range(0, len(digests), self.LOOKUP_BATCH):
+                batch = digests[start:start + self.LOOKUP_BATCH]
+                rows = self._connection.execute(
+                    f"SELECT digest, total, assistant FROM token_counts WHERE scheme = ? AND digest IN ({', '.join('?' * len(batch))})",
+                    (scheme, *batch)
+                )
+                found.update((digest, (total, assistant)) for digest, total, assistant in rows)
+            self.hits += len(found)
+            self.misses += len(set(digests)) - len(found)
+        return found
+
+    def put_many(self, scheme, counts):
+        """
+        Stores the counts of several examples.
+
+        :param scheme: The encoding and message overheads the counts were made with.
+        :param counts: Iterable of tuples of an example's digest, total and assistant token counts.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO token_counts VALUES (?, ?, ?, ?)",
+                [(scheme, digest, total, assistant) for digest, total, assistant in counts]
+            )
+
+    def stats(self):
+        """
+        Reports the hit and miss counters of this cache instance.
+
+        :return: A dictionary with the hits, misses and hit rate.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
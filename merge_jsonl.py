@@ -0,0 +1,45 @@
+import os
+import json
+import argparse
+
+from utils.jsonl import merge_jsonl_files, summarize, REJECT_REASONS
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    :return: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Merge JSONL training data files into one, dropping lines that are not valid chat fine-tuning examples.")
+    parser.add_argument('inputs', help='JSONL files, directories of JSONL files or glob patterns', nargs='+')
+    parser.add_argument('--output', help='Merged JSONL file (default: only count the valid and rejected lines)', default=None)
+    parser.add_argument('--workers', help=f'Number of files filtered at once (default {os.cpu_count()})', type=int, default=None)
+    parser.add_argument('--skip_validation', help='Only drop lines that are not valid JSON, without checking the system/user/assistant messages', action='store_true')
+    parser.add_argument('--report', help='Write the counts of every input file to this JSON file', default=None)
+    return parser.parse_args()
+
+def main():
+    """
+    Main function to merge the files and print the rejected lines of each file.
+    """
+    args = parse_args()
+    all_stats = merge_jsonl_files(args.inputs, args.output, args.workers, validate=not args.skip_validation)
+    if not all_stats:
+        print("No JSONL files found.")
+        return
+
+    for stats in all_stats:
+        if stats["rejected"]:
+            reasons = ", ".join(f"{stats[reason]} {reason}" for reason in REJECT_REASONS if stats[reason])
+            print(f"{stats['file']}: {stats['valid']} valid, {stats['rejected']} rejected ({reasons})")
+
+    totals = summarize(all_stats)
+    print(f"Kept {totals['valid']} of {totals['lines']} lines from {totals['files']} files ({totals['rejected']} rejected, {totals['blank']} blank)"
+          + (f" in {args.output}" if args.output else ""))
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"totals": totals, "files": all_stats}, f, indent=2, ensure_ascii=False)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+import os
+import time
+import logging
+import requests
+from urllib.parse import quote, unquote, urlparse, urlunparse
+from models.AzureSpeechTranscriber import AzureSpeechTranscriber
+from utils.RateLimiter import RateLimiter
+from utils.Metrics import metrics
+
+class AzureBatchTranscriptionClient:
+    def __init__(self, endpoint=None, subscription_key=None, region=None, api_version="v3.2", timeout=60):
+        """
+        Initializes a client for the Azure Speech batch transcription REST API. Point the endpoint at a local
+        stand-in server to run without Azure.
+
+        :param endpoint: Base URL of the service, defaults to AZURE_SPEECH_BATCH_ENDPOINT or the regional endpoint.
+        :param subscription_key: Speech subscription key, defaults to AZURE_SPEECH_API_KEY.
+        :param region: Speech region, defaults to AZURE_SPEECH_REGION.
+        :param api_version: Version of the speech-to-text REST API.
+        :param timeout: Timeout in seconds of each HTTP request.
+        """
+        region = region or os.getenv('AZURE_SPEECH_REGION')
+        self.endpoint = (endpoint or os.getenv('AZURE_SPEECH_BATCH_ENDPOINT') or f"https://{region}.api.cognitive.microsoft.com").rstrip('/')
+        self.api_version = api_version
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Ocp-Apim-Subscription-Key": subscription_key or os.getenv('AZURE_SPEECH_API_KEY') or ""})
+
+    def _request(self, method, url, **kwargs):
+        """
+        Sends an HTTP request and raises requests.HTTPError on error responses, so rate limit errors expose
+        the response like the OpenAI client does.
+
+        :param method: The HTTP method.
+        :param url: The URL of the request.
+        :return: The decoded JSON body, or None if the response has no body.
+        """
+        with metrics.track_request("speech_batch"):
+            response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+            response.raise_for_status()
+        return response.json() if response.content else None
+
+    def submit(self, content_urls, locale, display_name):
+        """
+        Submits a batch transcription job.
+
+        :param content_urls: URLs of the audio files to transcribe.
+        :param locale: The language of the audio, e.g. 'en-US'.
+        :param display_name: A name for the job.
+        :return: The URL of the created job.
+        """
+        body = {
+            "contentUrls": list(content_urls),
+            "locale": locale,
+            "displayName": display_name,
+            "properties": {"punctuationMode": "DictatedAndAutomatic", "timeToLive": "PT12H"}
+        }
+        return self._request("POST", f"{self.endpoint}/speechtotext/{self.api_version}/transcriptions", json=body)["self"]
+
+    def get_status(self, job_url):
+        """
+        Retrieves the status of a batch transcription job.
+
+        :param job_url: The URL of the job.
+        :return: One of 'NotStarted', 'Running', 'Succeeded' or 'Failed'.
+        """
+        return self._request("GET", job_url)["status"]
+
+    def get_results(self, job_url):
+        """
+        Retrieves the transcription results of a finished job.
+
+        :param job_url: The URL of the job.
+        :yield: Tuples of the source audio URL and the recognised segments in order.
+        """
+        files_url = f"{job_url}/files"
+        while files_url:
+            page = self._request("GET", files_url)
+            for file in page.get("values", []):
+                if file.get("kind") != "Transcription":
+                    continue
+                result = self._request("GET", file["links"]["contentUrl"])
+                phrases = sorted(result.get("recognizedPhrases", []), key=lambda phrase: phrase.get("offsetInTicks", 0))
+                segments = [phrase["nBest"][0]["display"] for phrase in phrases if phrase.get("nBest")]
+                yield result["source"], segments
+            files_url = page.get("@nextLink")
+
+    def delete(self, job_url):
+        """
+        Deletes a batch transcription job and its results from the service.
+
+        :param job_url: The URL of the job.
+        """
+        self._request("DELETE", job_url)
+
+class AzureBatchTranscriber(AzureSpeechTranscriber):
+    MAX_POLL_BACKOFF = 600  # Longest delay in seconds between status checks after throttled or failed checks
+
+    def __init__(self, language_to_transcribe, output_folder="E:/thai_transcripts", content_base_url=None, client=None, poll_interval=30, max_wait=24 * 3600, strings_to_remove_file="./txt_files/strings_to_remove.txt"):
+        """
+        Initializes the AzureBatchTranscriber, which transcribes many audio files in one batch transcription job
+        and writes the results to the same transcript files as AzureSpeechTranscriber.
+
+        :param language_to_transcribe: The language to transcribe.
+        :param output_folder: The folder where the transcriptions will be saved.
+        :param content_base_url: Base URL under which the local staging directory is served to the service, e.g. a blob
+                                 container URL. Only needed when local paths are transcribed.
+        :param client: Client for the batch transcription API, defaults to AzureBatchTranscriptionClient.
+        :param poll_interval: Delay in seconds between job status checks.
+        :param max_wait: Maximum time in seconds to wait for a job to finish.
+        :param strings_to_remove_file: File containing a list of strings to be removed from the transcriptions.
+        """
+        super().__init__(language_to_transcribe, output_folder=output_folder, strings_to_remove_file=strings_to_remove_file)
+        self.content_base_url = content_base_url
+        self.client = client or AzureBatchTranscriptionClient()
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+
+    @staticmethod
+    def is_url(audio_source):
+        """
+        Checks whether an audio source is a URL rather than a local path.
+
+        :param audio_source: The audio source.
+        :return: True if the source is an http(s) URL, False otherwise.
+        """
+        return urlparse(audio_source).scheme in ("http", "https")
+
+    def create_content_url(self, audio_source):
+        """
+        Creates the URL the service downloads an audio source from.
+
+        :param audio_source: A URL, or a local path inside the staging directory served at content_base_url. A query
+                             string on content_base_url, such as a SAS token, is kept on every file URL.
+        :return: The URL of the audio.
+        :raises ValueError: If a local path is given without a content_base_url.
+        """
+        if self.is_url(audio_source):
+            return audio_source
+        if not self.content_base_url:
+            raise ValueError("A content_base_url is required to batch transcribe local audio files")
+        base_url = urlparse(self.content_base_url)
+        return urlunparse(base_url._replace(path=f"{base_url.path.rstrip('/')}/{quote(os.path.basename(audio_source))}"))
+
+    def create_batch_transcript_filepath(self, audio_source):
+        """
+        Creates the transcript path of an audio source, matching the path real-time transcription would use.
+
+        :param audio_source: A URL or local path of the audio.
+        :return: The output file path for the transcript.
+        """
+        path = unquote(urlparse(audio_source).path) if self.is_url(audio_source) else audio_source
+        # Name the transcript from the full path as if the audio were a WAV file, so every format shares outputs
+        return self.create_transcript_filepath(os.path.splitext(path)[0] + '.wav')
+
+    def poll_retry_delay(self, error, failed_polls):
+        """
+        Decides how long to wait after a status check failed, or that the failure is not worth retrying.
+
+        :param error: The exception raised by the status check.
+        :param failed_polls: The number of consecutive failed status checks, including this one.
+        :return: The delay in seconds before the next check, or None if the error should be raised.
+        """
+        if not isinstance(error, requests.RequestException):
+            return None
+        response = getattr(error, 'response', None)
+        if response is None:
+            # Connection errors and timeouts
+            return min(self.poll_interval * 2 ** failed_polls, self.MAX_POLL_BACKOFF)
+        if response.status_code != 429 and response.status_code < 500:
+            return None
+        retry_after = RateLimiter.parse_duration(response.headers.get("retry-after"))
+        if retry_after is not None:
+            return retry_after
+        return min(self.poll_interval * 2 ** failed_polls, self.MAX_POLL_BACKOFF)
+
+    def wait_for_job(self, job_url):
+        """
+        Polls a batch transcription job until it finishes. Throttled (429) and transient failures of a status check
+        are retried with backoff, honouring Retry-After, as giving up would delete a job that may have run for hours.
+
+        :param job_url: The URL of the job.
+        :raises RuntimeError: If the job fails.
+        :raises TimeoutError: If the job does not finish within max_wait seconds.
+        """
+        deadline = time.time() + self.max_wait
+        failed_polls = 0
+        while True:
+            try:
+                status = self.client.get_status(job_url)
+                failed_polls = 0
+            except Exception as e:
+                failed_polls += 1
+                delay = self.poll_retry_delay(e, failed_polls)
+                if delay is None:
+                    raise
+                if time.time() + delay > deadline:
+                    raise TimeoutError(f"Batch transcription job {job_url} did not finish within {self.max_wait} seconds") from e
+                logging.warning(f"[BATCH POLL RETRY] Status check of {job_url} failed ({e}), checking again in {delay:.0f}s")
+                time.sleep(delay)
+                continue
+
+            if status == "Succeeded":
+                return
+            if status == "Failed":
+                raise RuntimeError(f"Batch transcription job {job_url} failed")
+            if time.time() > deadline:
+                raise TimeoutError(f"Batch transcription job {job_url} did not finish within {self.max_wait} seconds")
+            time.sleep(self.poll_interval)
+
+    def transcribe_batch(self, audio_sources, display_name="transcribe_video batch"):
+        """
+        Transcribes audio sources in a single batch transcription job.
+
+        :param audio_sources: URLs, or local paths inside the staging directory, of the audio to be transcribed.
+        :param display_name: A name for the job.
+        :return: A dictionary mapping each audio source to its transcript path, or to the exception explaining
+                 why it has no transcript.
+        """
+        content_urls = {self.create_content_url(audio_source): audio_source for audio_source in audio_sources}
+        job_url = self.client.submit(list(content_urls), self.language_to_transcribe, display_name)
+        logging.info(f"[BATCH SUBMITTED] Submitted {len(content_urls)} files as {job_url}")
+
+        try:
+            self.wait_for_job(job_url)
+
+            results = {}
+            for source_url, segments in self.client.get_results(job_url):
+                # The service may return the source with a different query string, e.g. a stripped SAS token
+                audio_source = content_urls.get(source_url) or next(
+                    (source for url, source in content_urls.items() if urlparse(url).path == urlparse(source_url).path), None
+                )
+                if audio_source is None:
+                    logging.warning(f"[BATCH RESULT] Ignoring result for unknown source {source_url}")
+                    continue
+                if not segments:
+                    results[audio_source] = RuntimeError("No segments recognized in batch transcription.")
+                    continue
+
+                transcript_file_path = self.create_batch_transcript_filepath(audio_source)
+                with open(transcript_file_path, 'w', encoding='utf-8') as file:
+                    file.write(self.remove_strings('\n'.join(segments) + '\n'))
+                results[audio_source] = transcript_file_path
+        finally:
+            try:
+                self.client.delete(job_url)
+            except Exception as e:
+                logging.warning(f"[BATCH CLEANUP] Failed to delete {job_url}: {e}")
+
+        for audio_source in audio_sources:
+            results.setdefault(audio_source, RuntimeError("No batch transcription result returned for this file."))
+        return results
@@ -1,23 +1,37 @@
 import os
 import json
 import re
+import hashlib
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from openai import AzureOpenAI
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from models.JSONPostprocessor import JSONPostprocessor
+from utils.tokenizer import count_tokens
+from utils.Metrics import metrics
 
 class AzureChat:
-    def __init__(self, output_txt_dir, transcribe_content_type: str = "create_json_file"):
+    TOKENS_PER_MESSAGE = 3  # Tokens the chat format adds around every message
+    TOKENS_PER_REPLY = 3  # Tokens that prime the assistant reply
+
+    def __init__(self, output_txt_dir, transcribe_content_type: str = "create_json_file", rate_limiter=None, response_cache=None, max_concurrent_requests=None):
         """
         Initializes the AzureChat with necessary configurations and system prompt.
 
         :param output_txt_dir: The directory where the transcribed output text files will be saved.
         :param transcribe_content_type: The type of content to be transcribed, default is 'create_json_file'.
+        :param rate_limiter: Optional RateLimiter shared with other workers to throttle requests.
+        :param response_cache: Optional ResponseCache whose stored responses are reused for identical requests.
+        :param max_concurrent_requests: Maximum number of chunk requests in flight across every file sent through
+                                        this instance, or None to send each file's chunks one after another.
         """
         self.output_txt_dir = self._replace_backslashes(output_txt_dir)
         os.makedirs(self.output_txt_dir, exist_ok=True)
 
         self.max_tokens = int(os.getenv("MAX_TOKENS", "2048"))
+        self.context_window = int(os.getenv("CONTEXT_WINDOW", "128000"))
+        self.max_chunk_tokens = int(os.getenv("MAX_CHUNK_TOKENS", "2048"))
         self.model = os.getenv("DEPLOYMENT_NAME")
         try:
             self.system_prompt = self.read_system_prompt(f"./txt_files/system_prompt_{transcribe_content_type}.txt")
@@ -32,6 +46,11 @@ class AzureChat:
             api_version=os.getenv("API_VERSION")
         )
         self.postprocessor = JSONPostprocessor(system_content="You are an expert in CFA finance.")
+        self.rate_limiter = rate_limiter
+        self.response_cache = response_cache
+        # One pool shared by every file caps the requests in flight across all workers
+        self.max_concurrent_requests = max_concurrent_requests
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent_requests) if max_concurrent_requests else None
 
     @staticmethod
     def _replace_backslashes(path: str) -> str:
@@ -76,11 +95,11 @@ class AzureChat:
 
     def split_text(self, text: str, chunk_size: int = 2048, chunk_overlap: int = 100) -> list:
         """
-        Splits the text into smaller chunks for processing.
+        Splits the text into smaller chunks for processing, measuring chunks in tokens.
 
         :param text: The text to be split.
-        :param chunk_size: The size of each chunk.
-        :param chunk_overlap: The overlap between consecutive chunks.
+        :param chunk_size: The maximum number of tokens of each chunk.
+        :param chunk_overlap: The number of tokens overlapping between consecutive chunks.
         :return: A list of text chunks.
         """
         if chunk_size <= chunk_overlap:
@@ -89,17 +108,226 @@ class AzureChat:
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
-            length_function=len,
+            length_function=count_tokens,
             is_separator_regex=False,
         )
         return text_splitter.split_text(text)
 
+    @staticmethod
+    def create_progress_path(output_jsonl_path: str) -> str:
+        """
+        Creates the path of the chunk progress file kept next to the output file.
+
+        :param output_jsonl_path: Path to the output JSONL file.
+        :return: Path to the progress file.
+        """
+        return output_jsonl_path + ".progress"
+
+    @staticmethod
+    def fingerprint_chunks(data_chunks: list) -> str:
+        """
+        Computes a fingerprint of the chunks so progress is only reused for identical chunking.
+
+        :param data_chunks: The list of text chunks.
+        :return: A hex digest of the chunks.
+        """
+        digest = hashlib.sha1()
+        for chunk in data_chunks:
+            digest.update(chunk.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def load_progress(progress_path: str) -> dict:
+        """
+        Loads the chunk progress recorded for an output file.
+
+        :param progress_path: Path to the progress file.
+        :return: The recorded progress, or None if there is no valid progress file.
+        """
+        try:
+            with open(progress_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def save_progress(progress_path: str, progress: dict):
+        """
+        Atomically writes the chunk progress for an output file.
+
+        :param progress_path: Path to the progress file.
+        :param progress: The progress to record.
+        """
+        temp_path = progress_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(progress, file)
+        os.replace(temp_path, progress_path)
+
+    def resume_chunk_index(self, data_file_path: str, output_jsonl_path: str, fingerprint: str) -> int:
+        """
+        Determines the first unfinished chunk of a file from its recorded progress. Lines written
+        by a chunk that was interrupted midway are truncated so they are not duplicated.
+
+        :param data_file_path: Path to the file containing data to be sent.
+        :param output_jsonl_path: Path to the output JSONL file.
+        :param fingerprint: Fingerprint of the current chunks.
+        :return: The index of the first chunk to send.
+        """
+        progress = self.load_progress(self.create_progress_path(output_jsonl_path))
+        if not progress or progress.get("source") != data_file_path or progress.get("fingerprint") != fingerprint:
+            return 0
+
+        output_offset = progress["output_offset"]
+        if os.path.exists(output_jsonl_path) and os.path.getsize(output_jsonl_path) > output_offset:
+            with open(output_jsonl_path, "r+b") as file:
+                file.truncate(output_offset)
+
+        return progress["chunks_completed"]
+
+    def count_prompt_tokens(self, messages: list) -> int:
+        """
+        Counts the prompt tokens of the messages, including the tokens the chat format adds.
+
+        :param messages: The messages to be sent.
+        :return: The number of prompt tokens.
+        """
+        return sum(self.TOKENS_PER_MESSAGE + count_tokens(message["content"]) for message in messages) + self.TOKENS_PER_REPLY
+
+    def chunk_token_budget(self) -> int:
+        """
+        Computes how many tokens of curriculum fit in one request, after the system prompt, the message
+        template and the completion tokens are reserved from the context window.
+
+        :return: The maximum number of tokens of a chunk.
+        """
+        available = self.context_window - self.count_prompt_tokens(self.build_messages("")) - self.max_tokens
+        if available <= 0:
+            raise ValueError(f"The system prompt and MAX_TOKENS={self.max_tokens} leave no room for data in CONTEXT_WINDOW={self.context_window}")
+        return min(self.max_chunk_tokens, available)
+
+    def build_messages(self, chunk: str) -> list:
+        """
+        Builds the chat messages asking for questions and answers about a chunk of curriculum.
+
+        :param chunk: The chunk of curriculum.
+        :return: The list of messages to send to the model.
+        """
+        return [
+            {
+                "role": "system",
+                "content": self.system_prompt
+            },
+            {
+                "role": "user",
+                "content": f"""
+Curriculum Context: {chunk}
+-----------------------------------------------------------
+Generate possible questions and answers from this segment of curriculum.
+"""
+            }
+        ]
+
+    def estimate_tokens(self, messages: list) -> int:
+        """
+        Estimates the tokens a request counts against the quota.
+
+        :param messages: The messages to be sent.
+        :return: The number of prompt tokens plus the completion token limit.
+        """
+        return self.count_prompt_tokens(messages) + self.max_tokens
+
+    def create_completion(self, messages: list):
+        """
+        Sends the messages to the model, throttled by the shared rate limiter if one is set.
+
+        :param messages: The messages to be sent.
+        :return: The chat completion response.
+        """
+        if self.rate_limiter is None:
+            with metrics.track_request("openai_chat"):
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    max_tokens=self.max_tokens
+                )
+
+        self.rate_limiter.acquire(self.estimate_tokens(messages))
+        with metrics.track_request("openai_chat"):
+            raw_response = self.client.chat.completions.with_raw_response.create(
+                model=self.model,
+                messages=messages,
+                max_tokens=self.max_tokens
+            )
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        return raw_response.parse()
+
+    def get_response_content(self, messages: list) -> str:
+        """
+        Gets the response content for the messages, from the response cache if an identical request was sent before.
+
+        :param messages: The system and user messages to be sent.
+        :return: The response content, or None if the response has no content.
+        """
+        if self.response_cache is None:
+            return self.create_completion(messages).choices[0].message.content
+
+        key = self.response_cache.make_key(self.model, messages[0]["content"], messages[1]["content"], self.max_tokens)
+        content = self.response_cache.get(key)
+        if content is not None:
+            return content
+
+        content = self.create_completion(messages).choices[0].message.content
+        if content is not None:
+            self.response_cache.put(key, content)
+        return content
+
+    def dispatch_chunks(self, data_chunks: list, start_chunk: int = 0):
+        """
+        Gets the responses for the chunks, sending up to max_concurrent_requests at once through the shared pool
+        but yielding them strictly in chunk order, so output and progress are written as if sent one by one.
+
+        :param data_chunks: The list of text chunks.
+        :param start_chunk: The index of the first chunk to send.
+        :yield: Tuples of the chunk index and its response content.
+        """
+        if self.executor is None:
+            for i in range(start_chunk, len(data_chunks)):
+                logging.debug(f"Sending message for chunk {i+1}: {data_chunks[i][:100]}...")
+                yield i, self.get_response_content(self.build_messages(data_chunks[i]))
+            return
+
+        # Keep a bounded window of chunks in flight so responses finishing ahead of the next chunk to write stay few
+        window = 2 * self.max_concurrent_requests
+        in_flight = deque()
+        next_chunk = start_chunk
+        try:
+            while in_flight or next_chunk < len(data_chunks):
+                while next_chunk < len(data_chunks) and len(in_flight) < window:
+                    logging.debug(f"Sending message for chunk {next_chunk+1}: {data_chunks[next_chunk][:100]}...")
+                    in_flight.append((next_chunk, self.executor.submit(self.get_response_content, self.build_messages(data_chunks[next_chunk]))))
+                    next_chunk += 1
+                i, future = in_flight.popleft()
+                yield i, future.result()
+        finally:
+            # Drop queued chunks after an error; requests already running finish and fill the response cache
+            for _, future in in_flight:
+                future.cancel()
+
+    def close(self):
+        """
+        Shuts down the pool used to send chunks concurrently.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
     def send_message(self, data_file_path: str):
         """
         Sends the data in the file as messages to the Azure OpenAI model and writes the responses to an output file.
 
         :param data_file_path: Path to the file containing data to be sent.
-        :return: A boolean indicating whether the process was successful.
+        :return: True if every chunk was processed, False if the file was rate limited and should be re-added to the queue.
+        :raises Exception: If the file could not be processed, so the caller can record it as failed.
         """
         data_file_path = self._replace_backslashes(data_file_path)
         try:
@@ -107,9 +335,8 @@ class AzureChat:
             data_to_convert = self.read_data_to_convert(data_file_path)
             logging.info(f"Data read and cleaned from file: {data_file_path}")
 
-            total_max_length = self.max_tokens - len(self.system_prompt)
-            chunk_size = max(total_max_length - 200, 200)
-            chunk_overlap = 100
+            chunk_size = self.chunk_token_budget()
+            chunk_overlap = min(100, chunk_size // 10)
             
             data_chunks = self.split_text(data_to_convert, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
 
@@ -119,32 +346,19 @@ class AzureChat:
             
             logging.info(f"Output JSONL path: {output_jsonl_path}")
 
-            with open(output_jsonl_path, "a", encoding="utf-8") as file:
-                for i, chunk in enumerate(data_chunks):
-                    messages = [
-                        {
-                            "role": "system",
-                            "content": self.system_prompt
-                        },
-                        {
-                            "role": "user",
-                            "content": f"""
-Curriculum Context: {chunk}
------------------------------------------------------------
-Generate possible questions and answers from this segment of curriculum.
-"""
-                        }
-                    ]
-                    logging.debug(f"Sending message for chunk {i+1}: {chunk[:100]}...")
-
-                    response = self.client.chat.completions.create(
-                        model=self.model,
-                        messages=messages,
-                        max_tokens=self.max_tokens
-                    )
+            progress_path = self.create_progress_path(output_jsonl_path)
+            fingerprint = self.fingerprint_chunks(data_chunks)
+            start_chunk = self.resume_chunk_index(data_file_path, output_jsonl_path, fingerprint)
+            if start_chunk >= len(data_chunks):
+                logging.info(f"All {len(data_chunks)} chunks of {data_file_path} were already processed")
+                return True
+            if start_chunk > 0:
+                logging.info(f"Resuming {data_file_path} from chunk {start_chunk + 1}/{len(data_chunks)}")
 
+            with open(output_jsonl_path, "a", encoding="utf-8") as file:
+                for i, response_content in self.dispatch_chunks(data_chunks, start_chunk):
                     try:
-                        response_content = response.choices[0].message.content.strip()
+                        response_content = response_content.strip()
                         logging.debug(f"Response content for chunk {i+1}: {response_content[:500]}...")
                         
                         processed_responses = self.postprocessor.convert_response(response_content)
@@ -155,19 +369,27 @@ Generate possible questions and answers from this segment of curriculum.
 
                     except (AttributeError, KeyError) as e:
                         logging.error(f"Error extracting response content for file {data_file_path} chunk {i+1}: {e}")
-                        continue
 
+                    file.flush()
+                    self.save_progress(progress_path, {
+                        "source": data_file_path,
+                        "fingerprint": fingerprint,
+                        "chunks_completed": i + 1,
+                        "output_offset": os.path.getsize(output_jsonl_path)
+                    })
                     logging.info(f"Finished chunk {i + 1}/{len(data_chunks)}")
 
             return True
 
         except Exception as e:
-            if hasattr(e, 'response') and e.response.status_code == 429:
+            response = getattr(e, 'response', None)
+            if response is not None and response.status_code == 429:
+                if self.rate_limiter is not None:
+                    self.rate_limiter.penalize(e)
                 logging.error(f"[RATE LIMIT EXCEEDED] for {data_file_path}. Re-adding to queue after delay.")
                 return False
-            elif hasattr(e, 'response') and e.response.status_code == 400:
-                logging.error(f"[CONTENT FILTERING] Error for {data_file_path}. Skipping this file.")
+            elif response is not None and response.status_code == 400:
+                logging.error(f"[CONTENT FILTERING] Error for {data_file_path}. Marking this file as failed.")
             else:
                 logging.error(f"Error processing file {data_file_path}: {e}")
-
-        return True  # Return True to indicate the task should not be re-added to the queue
\ No newline at end of file
+            raise  # Not re-added to the queue, but recorded as failed rather than done
\ No newline at end of file
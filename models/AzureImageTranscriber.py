@@ -1,18 +1,27 @@
 import os
+import re
 import base64
+import asyncio
 import logging
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI
 from dotenv import load_dotenv
+from utils.Metrics import metrics
 
 load_dotenv()
 
 class AzureImageTranscriber:
-    def __init__(self, output_txt_dir, transcribe_content_type: str = "default"):
+    ESTIMATED_IMAGE_TOKENS = 1105  # Prompt tokens of a high detail 1024x768 image, used for rate limiting
+    BATCH_DELIMITER = "===== IMAGE {index} ====="  # Line the model starts each transcript with in a multi-image request
+    BATCH_DELIMITER_PATTERN = re.compile(r'^[ \t]*=+[ \t]*IMAGE[ \t]+(\d+)[ \t]*=+[ \t]*$', re.MULTILINE | re.IGNORECASE)
+
+    def __init__(self, output_txt_dir, transcribe_content_type: str = "default", rate_limiter=None, slide_cache=None):
         """
         Initializes the AzureImageTranscriber with necessary configurations and system prompt.
 
         :param output_txt_dir: The directory where the transcribed output text files will be saved.
         :param transcribe_content_type: The type of content to be transcribed, default is 'default'.
+        :param rate_limiter: Optional RateLimiter shared with other workers to throttle requests.
+        :param slide_cache: Optional SlideCache whose stored transcripts are reused for duplicate slides.
         """
         self.output_txt_dir = output_txt_dir
         self.max_tokens = os.getenv("MAX_TOKENS")
@@ -29,6 +38,9 @@ class AzureImageTranscriber:
             api_key=os.getenv("AZURE_OPENAI_API_KEY"), 
             api_version=os.getenv("API_VERSION")
         )
+        self._async_client = None
+        self.rate_limiter = rate_limiter
+        self.slide_cache = slide_cache
 
     @staticmethod
     def read_system_prompt(file_path: str) -> str:
@@ -40,20 +52,35 @@ class AzureImageTranscriber:
         """
         with open(file_path, "r", encoding="utf-8") as file:
             return file.read().strip()
+
+    def create_output_txt_path(self, image_file_path: str) -> str:
+        """
+        Creates the path of the output .txt file for an image file.
+
+        :param image_file_path: The path to the image file.
+        :return: The path where the transcribed text is saved.
+        """
+        return os.path.join(self.output_txt_dir, os.path.splitext(os.path.basename(image_file_path))[0] + ".txt")
         
-    def transcribe_image(self, image_file_path: str, job_id):
+    @staticmethod
+    def encode_image(image_file_path: str) -> str:
         """
-        Transcribes the content of an image file into text using Azure's OpenAI service.
+        Reads an image file and encodes it as a base64 string.
 
-        :param image_file_path: The path to the image file to be transcribed.
-        :param job_id: An identifier for the job, useful for logging and debugging purposes.
-        :return: The transcribed text content.
+        :param image_file_path: The path to the image file.
+        :return: The base64 encoded image.
         """
-        # Convert image to base64
         with open(image_file_path, "rb") as image_file:
-            image_base64_string = base64.b64encode(image_file.read()).decode('utf-8')
-        
-        messages = [
+            return base64.b64encode(image_file.read()).decode('utf-8')
+
+    def build_messages(self, image_base64_string: str) -> list:
+        """
+        Builds the chat messages for transcribing a single image.
+
+        :param image_base64_string: The base64 encoded image.
+        :return: The list of messages to send to the model.
+        """
+        return [
             {
                 "role": "system",
                 "content": [
@@ -74,20 +101,366 @@ class AzureImageTranscriber:
             }
         ]
 
+    def build_batch_messages(self, image_base64_strings: list) -> list:
+        """
+        Builds the chat messages for transcribing several images in one request, asking for each transcript to
+        start with a numbered delimiter line so the response can be split per image.
+
+        :param image_base64_strings: The base64 encoded images, in order.
+        :return: The list of messages to send to the model.
+        """
+        count = len(image_base64_strings)
+        instruction = (
+            f"You will receive {count} images. Transcribe each image separately, following the instructions above. "
+            f"Start the transcript of image n with a line containing only {self.BATCH_DELIMITER.format(index='n')}, "
+            f"numbering the images 1 to {count} in the order they are given."
+        )
+        return [
+            {
+                "role": "system",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"{self.system_prompt}\n\n{instruction}"
+                    }
+                ]
+            },
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "image": image_base64_string,
+                    }
+                    for image_base64_string in image_base64_strings
+                ]
+            }
+        ]
+
+    def split_batch_response(self, content: str, count: int) -> dict:
+        """
+        Splits the response to a multi-image request into the transcript of each image.
+
+        :param content: The response content.
+        :param count: The number of images in the request.
+        :return: A dictionary mapping the 1-based image number to its transcript. Images whose transcript is
+                 missing, empty or delimited more than once are left out.
+        """
+        matches = list(self.BATCH_DELIMITER_PATTERN.finditer(content or ""))
+        transcripts = {}
+        duplicates = set()
+        for match, next_match in zip(matches, matches[1:] + [None]):
+            index = int(match.group(1))
+            text = content[match.end():next_match.start() if next_match else len(content)].strip()
+            if index in transcripts:
+                duplicates.add(index)
+            transcripts[index] = text
+        return {index: text for index, text in transcripts.items() if 1 <= index <= count and text and index not in duplicates}
+
+    def write_transcript(self, image_file_path: str, content: str) -> str:
+        """
+        Writes the transcribed text of an image to its output .txt file.
+
+        :param image_file_path: The path to the transcribed image file.
+        :param content: The transcribed text content.
+        :return: The path to the output .txt file.
+        """
+        os.makedirs(self.output_txt_dir, exist_ok=True)
+        output_txt_path = self.create_output_txt_path(image_file_path)
+        with open(output_txt_path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return output_txt_path
+
+    def estimate_tokens(self, image_count: int = 1) -> int:
+        """
+        Estimates the tokens an image request counts against the quota.
+
+        :param image_count: The number of images in the request.
+        :return: The estimated number of prompt and completion tokens.
+        """
+        return len(self.system_prompt) // 4 + image_count * self.ESTIMATED_IMAGE_TOKENS + int(self.max_tokens or 0)
+
+    @staticmethod
+    def is_rate_limit_error(error: Exception) -> bool:
+        """
+        Checks whether a request failed on the rate limit. Errors raised before a response arrived, such as
+        connection errors, have no response and are not rate limit errors.
+
+        :param error: The exception raised by the request.
+        :return: True if the service answered with a 429 status.
+        """
+        response = getattr(error, 'response', None)
+        return response is not None and response.status_code == 429
+
+    def create_completion(self, messages: list, image_count: int = 1):
+        """
+        Sends the messages to the model, throttled by the shared rate limiter if one is set.
+
+        :param messages: The messages to be sent.
+        :param image_count: The number of images in the messages, used to estimate the tokens of the request.
+        :return: The chat completion response.
+        """
+        if self.rate_limiter is None:
+            with metrics.track_request("openai_image"):
+                return self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages
+                )
+
+        self.rate_limiter.acquire(self.estimate_tokens(image_count))
+        try:
+            with metrics.track_request("openai_image"):
+                raw_response = self.client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=messages
+                )
+        except Exception as e:
+            if self.is_rate_limit_error(e):
+                self.rate_limiter.penalize(e)
+            raise
+        self.rate_limiter.update_from_headers(raw_response.headers)
+        return raw_response.parse()
+
+    async def create_completion_async(self, messages: list, image_count: int = 1):
+        """
+        Asynchronously sends the messages to the model, throttled by the shared rate limiter if one is set.
+
+        :param messages: The messages to be sent.
+        :param image_count: The number of images in the messages, used to estimate the tokens of the request.
+        :return: The chat completion response.
+        """
+        if self.rate_limiter is None:
+            with metrics.track_request("openai_image"):
+                return await self.async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages
+                )
+
+        await self.rate_limiter.acquire_async(self.estimate_tokens(image_count))
+        try:
+            with metrics.track_request("openai_image"):
+                raw_response = await self.async_client.chat.completions.with_raw_response.create(
+                    model=self.model,
+                    messages=messages
+                )
+        except Exception as e:
+            if self.is_rate_limit_error(e):
+                await self.rate_limiter.penalize_async(e)
+            raise
+        await self.rate_limiter.update_from_headers_async(raw_response.headers)
+        return raw_response.parse()
+
+    def read_cached_transcript(self, image_file_path: str, job_id):
+        """
+        Writes the cached transcript of a duplicate slide to its output .txt file if the slide cache has one.
+
+        :param image_file_path: The path to the image file.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: The cached transcript, or None if the image has to be transcribed.
+        """
+        if self.slide_cache is None:
+            return None
+        content = self.slide_cache.get(image_file_path)
+        if content is not None:
+            logging.info(f"Job {job_id}: Reused the cached transcript of a duplicate slide for {image_file_path}")
+            self.write_transcript(image_file_path, content)
+        return content
+
+    def save_transcript(self, image_file_path: str, content: str):
+        """
+        Writes a new transcript to its output .txt file and stores it in the slide cache if one is set.
+
+        :param image_file_path: The path to the transcribed image file.
+        :param content: The transcribed text content.
+        """
+        self.write_transcript(image_file_path, content)
+        if self.slide_cache is not None:
+            self.slide_cache.put(image_file_path, content)
+
+    def transcribe_image(self, image_file_path: str, job_id):
+        """
+        Transcribes the content of an image file into text using Azure's OpenAI service.
+
+        :param image_file_path: The path to the image file to be transcribed.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: The transcribed text content.
+        """
+        content = self.read_cached_transcript(image_file_path, job_id)
+        if content is not None:
+            return content
+        return self.request_transcript(image_file_path, job_id)
+
+    def request_transcript(self, image_file_path: str, job_id):
+        """
+        Transcribes an image in a single-image request, without checking the slide cache.
+
+        :param image_file_path: The path to the image file to be transcribed.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: The transcribed text content.
+        """
+        # Convert image to base64
+        messages = self.build_messages(self.encode_image(image_file_path))
+
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages
+            response = self.create_completion(messages)
+            content = response.choices[0].message.content
+            self.save_transcript(image_file_path, content)
+            return content
+
+        except Exception as e:
+            logging.error(f"Job {job_id}: Failed to make the request. Error: {e}")
+            raise
+
+    def transcribe_images(self, image_file_paths: list, job_id) -> dict:
+        """
+        Transcribes several images in one multi-image request, falling back to single-image requests for every
+        image whose transcript cannot be found in the response.
+
+        :param image_file_paths: The paths to the image files, ideally slides of the same deck.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: A dictionary mapping each image path to its transcript, or to the exception that stopped its fallback request.
+        :raises Exception: If the multi-image request or a fallback request hits the rate limit, so the batch can be retried.
+                 Any other failure of the multi-image request falls back to single-image requests.
+        """
+        results = {}
+        pending = []
+        for image_file_path in image_file_paths:
+            content = self.read_cached_transcript(image_file_path, job_id)
+            if content is not None:
+                results[image_file_path] = content
+            else:
+                pending.append(image_file_path)
+
+        transcripts = {}
+        if len(pending) > 1:
+            messages = self.build_batch_messages([self.encode_image(image_file_path) for image_file_path in pending])
+            try:
+                response = self.create_completion(messages, image_count=len(pending))
+                transcripts = self.split_batch_response(response.choices[0].message.content, len(pending))
+            except Exception as e:
+                if self.is_rate_limit_error(e):
+                    logging.error(f"Job {job_id}: Failed to make the multi-image request. Error: {e}")
+                    raise
+                # A content filter or payload size error may only concern one of the images, so each is sent on its own
+                logging.warning(f"Job {job_id}: The multi-image request failed, falling back to single-image requests. Error: {e}")
+                transcripts = {}
+            for index, image_file_path in enumerate(pending, start=1):
+                if index in transcripts:
+                    self.save_transcript(image_file_path, transcripts[index])
+                    results[image_file_path] = transcripts[index]
+
+        for image_file_path in pending:
+            if image_file_path in results:
+                continue
+            if transcripts:
+                logging.warning(f"Job {job_id}: No transcript for {image_file_path} in the multi-image response, falling back to a single-image request")
+            try:
+                results[image_file_path] = self.request_transcript(image_file_path, job_id)
+            except Exception as e:
+                if self.is_rate_limit_error(e):
+                    raise
+                results[image_file_path] = e
+        return results
+
+    @property
+    def async_client(self):
+        """
+        Lazily creates the asynchronous client so the threaded mode never opens an event loop.
+
+        :return: An instance of AsyncAzureOpenAI.
+        """
+        if self._async_client is None:
+            self._async_client = AsyncAzureOpenAI(
+                azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"), 
+                api_key=os.getenv("AZURE_OPENAI_API_KEY"), 
+                api_version=os.getenv("API_VERSION")
             )
+        return self._async_client
+
+    async def transcribe_image_async(self, image_file_path: str, job_id):
+        """
+        Asynchronously transcribes the content of an image file into text using Azure's OpenAI service.
+
+        :param image_file_path: The path to the image file to be transcribed.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: The transcribed text content.
+        """
+        loop = asyncio.get_running_loop()
+        content = await loop.run_in_executor(None, self.read_cached_transcript, image_file_path, job_id)
+        if content is not None:
+            return content
+        return await self.request_transcript_async(image_file_path, job_id)
+
+    async def request_transcript_async(self, image_file_path: str, job_id):
+        """
+        Asynchronously transcribes an image in a single-image request, without checking the slide cache.
+
+        :param image_file_path: The path to the image file to be transcribed.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: The transcribed text content.
+        """
+        loop = asyncio.get_running_loop()
+        image_base64_string = await loop.run_in_executor(None, self.encode_image, image_file_path)
+        messages = self.build_messages(image_base64_string)
+
+        try:
+            response = await self.create_completion_async(messages)
             content = response.choices[0].message.content
-            
-            # Generate output .txt file path from image file path
-            os.makedirs(self.output_txt_dir, exist_ok=True)
-            output_txt_path = os.path.join(self.output_txt_dir, os.path.splitext(os.path.basename(image_file_path))[0] + ".txt")
-            with open(output_txt_path, "w", encoding="utf-8") as file:
-                file.write(content)
+            await loop.run_in_executor(None, self.save_transcript, image_file_path, content)
             return content
 
         except Exception as e:
             logging.error(f"Job {job_id}: Failed to make the request. Error: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    async def transcribe_images_async(self, image_file_paths: list, job_id) -> dict:
+        """
+        Asynchronously transcribes several images in one multi-image request, falling back to single-image
+        requests for every image whose transcript cannot be found in the response.
+
+        :param image_file_paths: The paths to the image files, ideally slides of the same deck.
+        :param job_id: An identifier for the job, useful for logging and debugging purposes.
+        :return: A dictionary mapping each image path to its transcript, or to the exception that stopped its fallback request.
+        :raises Exception: If the multi-image request or a fallback request hits the rate limit, so the batch can be retried.
+                 Any other failure of the multi-image request falls back to single-image requests.
+        """
+        loop = asyncio.get_running_loop()
+        results = {}
+        pending = []
+        for image_file_path in image_file_paths:
+            content = await loop.run_in_executor(None, self.read_cached_transcript, image_file_path, job_id)
+            if content is not None:
+                results[image_file_path] = content
+            else:
+                pending.append(image_file_path)
+
+        transcripts = {}
+        if len(pending) > 1:
+            image_base64_strings = [await loop.run_in_executor(None, self.encode_image, image_file_path) for image_file_path in pending]
+            try:
+                response = await self.create_completion_async(self.build_batch_messages(image_base64_strings), image_count=len(pending))
+                transcripts = self.split_batch_response(response.choices[0].message.content, len(pending))
+            except Exception as e:
+                if self.is_rate_limit_error(e):
+                    logging.error(f"Job {job_id}: Failed to make the multi-image request. Error: {e}")
+                    raise
+                # A content filter or payload size error may only concern one of the images, so each is sent on its own
+                logging.warning(f"Job {job_id}: The multi-image request failed, falling back to single-image requests. Error: {e}")
+                transcripts = {}
+            for index, image_file_path in enumerate(pending, start=1):
+                if index in transcripts:
+                    await loop.run_in_executor(None, self.save_transcript, image_file_path, transcripts[index])
+                    results[image_file_path] = transcripts[index]
+
+        for image_file_path in pending:
+            if image_file_path in results:
+                continue
+            if transcripts:
+                logging.warning(f"Job {job_id}: No transcript for {image_file_path} in the multi-image response, falling back to a single-image request")
+            try:
+                results[image_file_path] = await self.request_transcript_async(image_file_path, job_id)
+            except Exception as e:
+                if self.is_rate_limit_error(e):
+                    raise
+                results[image_file_path] = e
+        return results
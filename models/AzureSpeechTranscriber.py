@@ -1,13 +1,16 @@
 import azure.cognitiveservices.speech as speechsdk
 import os
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from utils.Metrics import metrics
 
 # Load environment variables from .env file
 load_dotenv()
 
 class AzureSpeechTranscriber:
-    def __init__(self, language_to_transcribe, output_folder="E:/thai_transcripts", max_retries=3, strings_to_remove_file="./txt_files/strings_to_remove.txt"):
+    def __init__(self, language_to_transcribe, output_folder="E:/thai_transcripts", max_retries=3, strings_to_remove_file="./txt_files/strings_to_remove.txt", max_sessions=None):
         """
         Initializes the AzureSpeechTranscriber with the necessary configurations.
 
@@ -15,6 +18,8 @@ class AzureSpeechTranscriber:
         :param output_folder: The folder where the transcriptions will be saved.
         :param max_retries: The maximum number of retries for the transcription process.
         :param strings_to_remove_file: File containing a list of strings to be removed from the transcriptions.
+        :param max_sessions: The maximum number of recognition sessions open at once across all threads using this
+                             instance, or None for no limit.
         """
         self.subscription_key = os.getenv('AZURE_SPEECH_API_KEY')
         self.region = os.getenv('AZURE_SPEECH_REGION')
@@ -22,9 +27,15 @@ class AzureSpeechTranscriber:
         print(f"Azure Speech Service Initialised to transcribe {self.language_to_transcribe} language")
         self.output_folder = output_folder
         self.max_retries = max_retries
+        # Segmented files open several sessions per worker, so the total is capped here rather than per file
+        self.session_limit = threading.BoundedSemaphore(max_sessions) if max_sessions else None
 
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
+
+        # The speech config is shared by every recognizer instead of being rebuilt per file
+        self.speech_config = speechsdk.SpeechConfig(subscription=self.subscription_key, region=self.region)
+        self.speech_config.speech_recognition_language = self.language_to_transcribe
         
         # Initialize strings to remove by reading from the provided file
         self.strings_to_remove = self.read_strings_to_remove(strings_to_remove_file)
@@ -72,75 +83,205 @@ class AzureSpeechTranscriber:
 
     def transcribe(self, wav_file_path):
         """
-        Transcribes the content of a WAV file into text using Azure's speech service.
+        Transcribes the content of a WAV file into text using Azure's speech service. OGG/Opus files are
+        pushed to the service as a compressed stream.
 
-        :param wav_file_path: The path to the WAV file to be transcribed.
+        :param wav_file_path: The path to the WAV or OGG file to be transcribed.
         :return: The path to the file where the transcription is saved.
         """
-        speech_config = speechsdk.SpeechConfig(subscription=self.subscription_key, region=self.region)
-        speech_config.speech_recognition_language = self.language_to_transcribe
-        audio_config = speechsdk.audio.AudioConfig(filename=wav_file_path)
-        recognizer = speechsdk.SpeechRecognizer(speech_config=speech_config, audio_config=audio_config)
+        if wav_file_path.lower().endswith('.ogg'):
+            # Name the transcript as if the audio were a WAV file, so both formats share outputs
+            transcript_file_path = self.create_transcript_filepath(os.path.splitext(wav_file_path)[0] + '.wav')
+            with open(wav_file_path, 'rb') as ogg_file:
+                return self.transcribe_compressed_stream(ogg_file, transcript_file_path)
 
+        audio_config = speechsdk.audio.AudioConfig(filename=wav_file_path)
         transcript_file_path = self.create_transcript_filepath(wav_file_path)
-        print(f"Transcribing to: {transcript_file_path}")
+        return self.recognize(audio_config, transcript_file_path)
 
-        recognized_segments = 0
-        eos_reached = False
+    def transcribe_compressed_stream(self, ogg_stream, transcript_file_path):
+        """
+        Transcribes OGG/Opus audio read from a stream. Decoding compressed audio requires GStreamer to be installed.
 
-        def recognized(evt):
-            """
-            Callback function for handling recognized speech segments.
-            
-            :param evt: Event containing the recognized speech result.
-            """
-            nonlocal recognized_segments
-            if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
-                text = evt.result.text
-                # print(f"Recognized: {text}")
-                with open(transcript_file_path, 'a', encoding='utf-8') as file:
-                    file.write(text + '\n')
-                recognized_segments += 1
-                # print(f"Segments recognized: {recognized_segments}")
-            # elif evt.result.reason == speechsdk.ResultReason.NoMatch:
-            #     print("No speech could be recognized")
-
-        def canceled(evt):
+        :param ogg_stream: A binary file-like object yielding OGG/Opus audio.
+        :param transcript_file_path: The path to the file where the transcription is saved.
+        :return: The path to the file where the transcription is saved.
+        """
+        stream_format = speechsdk.audio.AudioStreamFormat(compressed_stream_format=speechsdk.AudioStreamContainerFormat.OGG_OPUS)
+        return self.pull_and_recognize(ogg_stream, stream_format, transcript_file_path)
+
+    def transcribe_stream(self, pcm_stream, transcript_file_path, sample_rate=16000, channels=1):
+        """
+        Transcribes raw 16-bit PCM audio read from a stream by the speech service, without temporary files.
+
+        :param pcm_stream: A binary file-like object yielding raw little-endian 16-bit PCM audio, e.g. an ffmpeg pipe.
+        :param transcript_file_path: The path to the file where the transcription is saved.
+        :param sample_rate: The sample rate of the PCM audio.
+        :param channels: The number of channels of the PCM audio.
+        :return: The path to the file where the transcription is saved.
+        """
+        stream_format = speechsdk.audio.AudioStreamFormat(samples_per_second=sample_rate, bits_per_sample=16, channels=channels)
+        return self.pull_and_recognize(pcm_stream, stream_format, transcript_file_path)
+
+    def pull_and_recognize(self, audio_stream, stream_format, transcript_file_path):
+        """
+        Runs recognition on a pull stream reading from a binary file-like object. The speech service only reads as
+        fast as it recognizes, so a pipe's writer is held back instead of the whole audio being buffered in memory.
+
+        :param audio_stream: A binary file-like object yielding audio in the given format.
+        :param stream_format: The AudioStreamFormat of the audio.
+        :param transcript_file_path: The path to the file where the transcription is saved.
+        :return: The path to the file where the transcription is saved.
+        """
+        pull_stream = speechsdk.audio.PullAudioInputStream(pull_stream_callback=StreamReader(audio_stream), stream_format=stream_format)
+        audio_config = speechsdk.audio.AudioConfig(stream=pull_stream)
+        # A stream is consumed once, so it cannot be replayed on retry
+        return self.recognize(audio_config, transcript_file_path, max_retries=1)
+
+    def transcribe_segmented(self, wav_file_path, segment_paths, max_workers=4, rate_limiter=None):
+        """
+        Transcribes the segments of a long WAV file concurrently and stitches their text back together in order
+        into the transcript of the whole file.
+
+        :param wav_file_path: The path to the WAV file the segments were split from, which names the transcript.
+        :param segment_paths: The paths to the WAV segments, in order.
+        :param max_workers: The maximum number of segments recognized at once.
+        :param rate_limiter: Optional RateLimiter to take one request from before recognizing each segment.
+        :return: The path to the file where the transcription is saved.
+        :raises RuntimeError: If any segment could not be recognized.
+        """
+        transcript_file_path = self.create_transcript_filepath(wav_file_path)
+        print(f"Transcribing {len(segment_paths)} segments to: {transcript_file_path}")
+
+        def recognize_segment(segment_path):
             """
-            Callback function for handling recognition cancellation events.
-            
-            :param evt: Event containing the cancellation details.
+            Recognizes the speech in one segment.
+
+            :param segment_path: The path to the WAV segment.
+            :return: The recognized text segments.
+            :raises RuntimeError: If the segment could not be recognized, failing the whole file.
             """
-            nonlocal eos_reached
-            # print(f"Recognition canceled: {evt.cancellation_details}")
-            if evt.cancellation_details.reason == speechsdk.CancellationReason.EndOfStream:
-                print("Reached end of stream with no errors.")
-                eos_reached = True
-            elif evt.cancellation_details.reason == speechsdk.CancellationReason.Error:
-                print(f"Error details: {evt.cancellation_details.error_details}")
+            if rate_limiter is not None:
+                rate_limiter.acquire()
+            return self.recognize_segments(speechsdk.audio.AudioConfig(filename=segment_path))
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map returns results in submission order, so the transcript keeps the order of the audio
+            segments = [segment for part in executor.map(recognize_segment, segment_paths) for segment in part]
 
-        recognizer.recognized.connect(recognized)
-        recognizer.canceled.connect(canceled)
+        return self.write_transcript(segments, transcript_file_path)
 
+    def recognize(self, audio_config, transcript_file_path, max_retries=None):
+        """
+        Runs continuous recognition on the audio, buffering the recognized segments in memory and writing the
+        cleaned transcript once at the end.
+
+        :param audio_config: The AudioConfig of the audio to be transcribed.
+        :param transcript_file_path: The path to the file where the transcription is saved.
+        :param max_retries: The maximum number of attempts, defaults to the instance's max_retries.
+        :return: The path to the file where the transcription is saved.
+        """
+        print(f"Transcribing to: {transcript_file_path}")
+        return self.write_transcript(self.recognize_segments(audio_config, max_retries=max_retries), transcript_file_path)
+
+    def recognize_segments(self, audio_config, max_retries=None):
+        """
+        Runs continuous recognition on the audio and returns the recognized segments.
+
+        :param audio_config: The AudioConfig of the audio to be transcribed.
+        :param max_retries: The maximum number of attempts, defaults to the instance's max_retries.
+        :return: List of the recognized text segments in order.
+        :raises RuntimeError: If every attempt failed.
+        """
+        if self.session_limit is None:
+            return self.recognize_attempts(audio_config, max_retries)
+        with self.session_limit:
+            return self.recognize_attempts(audio_config, max_retries)
+
+    def recognize_attempts(self, audio_config, max_retries=None):
+        """
+        Runs continuous recognition on the audio, retrying failed sessions up to max_retries times.
+
+        :param audio_config: The AudioConfig of the audio to be transcribed.
+        :param max_retries: The maximum number of attempts, defaults to the instance's max_retries.
+        :return: List of the recognized text segments in order.
+        :raises RuntimeError: If every attempt failed.
+        """
+        max_retries = max_retries or self.max_retries
         retries = 0
-        while retries < self.max_retries:
+        while retries < max_retries:
+            segments = []
+            errors = []
+            session_done = threading.Event()
+            recognizer = speechsdk.SpeechRecognizer(speech_config=self.speech_config, audio_config=audio_config)
+
+            def recognized(evt):
+                """
+                Callback function for handling recognized speech segments.
+                
+                :param evt: Event containing the recognized speech result.
+                """
+                if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:
+                    segments.append(evt.result.text)
+
+            def canceled(evt):
+                """
+                Callback function for handling recognition cancellation events.
+                
+                :param evt: Event containing the cancellation details.
+                """
+                if evt.cancellation_details.reason == speechsdk.CancellationReason.EndOfStream:
+                    print("Reached end of stream with no errors.")
+                elif evt.cancellation_details.reason == speechsdk.CancellationReason.Error:
+                    print(f"Error details: {evt.cancellation_details.error_details}")
+                    errors.append(evt.cancellation_details.error_details)
+                session_done.set()
+
+            def session_stopped(evt):
+                """
+                Callback function signalling that the recognition session has ended.
+
+                :param evt: Event containing the session details.
+                """
+                session_done.set()
+
+            recognizer.recognized.connect(recognized)
+            recognizer.canceled.connect(canceled)
+            recognizer.session_stopped.connect(session_stopped)
+
             try:
-                recognizer.start_continuous_recognition_async().get()
-                while not eos_reached:
-                    time.sleep(0.5)  # Small sleep to yield control and prevent tight loop
-                recognizer.stop_continuous_recognition_async().get()
+                with metrics.track_request("speech"):
+                    recognizer.start_continuous_recognition_async().get()
+                    session_done.wait()
+                    recognizer.stop_continuous_recognition_async().get()
+                    if errors:
+                        raise RuntimeError(f"Recognition canceled with error: {errors[0]}")
                 break
             except Exception as e:
                 print(f"Error encountered: {e}")
                 retries += 1
-                print(f"Retrying... ({retries}/{self.max_retries})")
+                if retries >= max_retries:
+                    # Returning the partial segments would leave a silent gap in the transcript
+                    raise RuntimeError(f"Recognition failed after {max_retries} attempts: {e}") from e
+                print(f"Retrying... ({retries}/{max_retries})")
                 time.sleep(2)  # Wait for a few seconds before retrying
 
-        if recognized_segments == 0:
+        return segments
+
+    def write_transcript(self, segments, transcript_file_path):
+        """
+        Writes recognized segments to the transcript file, removing the pre-specified strings.
+
+        :param segments: The recognized text segments in order.
+        :param transcript_file_path: The path to the file where the transcription is saved.
+        :return: The path to the file where the transcription is saved.
+        """
+        if not segments:
             raise RuntimeError("No segments recognized, but EndOfStream reached.")
 
-        # Remove strings from the transcript file
-        self.clean_transcript_file(transcript_file_path)
+        # Remove strings once from the whole transcript and write it in a single pass
+        with open(transcript_file_path, 'w', encoding='utf-8') as file:
+            file.write(self.remove_strings('\n'.join(segments) + '\n'))
 
         return transcript_file_path
 
@@ -162,4 +303,31 @@ class AzureSpeechTranscriber:
             # print(f"Cleaned transcript file: {transcript_file_path}")
 
         except Exception as e:
-            print(f"Error cleaning transcript file {transcript_file_path}: {e}")
\ No newline at end of file
+            print(f"Error cleaning transcript file {transcript_file_path}: {e}")
+
+class StreamReader(speechsdk.audio.PullAudioInputStreamCallback):
+    def __init__(self, audio_stream):
+        """
+        Initializes a pull stream callback handing the speech service audio from a binary file-like object.
+
+        :param audio_stream: A binary file-like object, e.g. the stdout pipe of an ffmpeg process.
+        """
+        super().__init__()
+        self.audio_stream = audio_stream
+
+    def read(self, buffer: memoryview) -> int:
+        """
+        Fills the buffer with the next audio, blocking until the stream has enough data or ends.
+
+        :param buffer: The buffer the speech service reads the audio from.
+        :return: The number of bytes read, 0 at the end of the stream.
+        """
+        data = self.audio_stream.read(buffer.nbytes)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        """
+        Called by the speech service once it stops reading. The stream is left open for its owner to close.
+        """
+        pass
@@ -0,0 +1,255 @@
+import os
+import json
+import wave
+import numpy as np
+
+
+class AudioTrimmer:
+    def __init__(self, frame_ms=30, threshold_margin_db=10.0, min_threshold_db=-50.0, min_silence_ms=1000, padding_ms=250, block_seconds=60):
+        """
+        Initializes the AudioTrimmer, an energy-based voice activity detector that cuts long silent spans out of WAV files
+        and splits long WAV files at silence.
+
+        :param frame_ms: Length in milliseconds of the frames whose energy is measured.
+        :param threshold_margin_db: Margin in dB above the estimated noise floor for a frame to count as speech.
+        :param min_threshold_db: Minimum energy in dBFS for a frame to count as speech.
+        :param min_silence_ms: Silent gaps shorter than this are kept, so only long pauses are cut.
+        :param padding_ms: Audio kept around every speech span so word onsets and endings are not clipped.
+        :param block_seconds: Seconds of audio read at a time, which bounds memory use on multi-hour files.
+        """
+        self.frame_ms = frame_ms
+        self.threshold_margin_db = threshold_margin_db
+        self.min_threshold_db = min_threshold_db
+        self.min_silence_ms = min_silence_ms
+        self.padding_ms = padding_ms
+        self.block_seconds = block_seconds
+
+    @staticmethod
+    def _to_mono(data, sample_width, channels):
+        """
+        Converts raw PCM bytes into a mono float array scaled to [-1, 1].
+
+        :param data: Raw PCM bytes.
+        :param sample_width: Bytes per sample, 1, 2 or 4.
+        :param channels: The number of interleaved channels.
+        :return: The mono samples.
+        """
+        if sample_width == 1:
+            samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+        elif sample_width == 2:
+            samples = np.frombuffer(data, dtype='<i2').astype(np.float32) / 32768.0
+        elif sample_width == 4:
+            samples = np.frombuffer(data, dtype='<i4').astype(np.float32) / 2147483648.0
+        else:
+            raise ValueError(f"Unsupported WAV sample width of {sample_width} bytes")
+        if channels > 1:
+            samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels).mean(axis=1)
+        return samples
+
+    def _copy_frames(self, source, target, start_sample, end_sample):
+        """
+        Copies a range of audio frames from one open WAV file to another, block by block.
+
+        :param source: The WAV file opened for reading.
+        :param target: The WAV file opened for writing.
+        :param start_sample: The first frame to copy.
+        :param end_sample: The frame to stop at, exclusive.
+        """
+        block_frames = int(self.block_seconds * source.getframerate())
+        source.setpos(start_sample)
+        remaining = end_sample - start_sample
+        while remaining > 0:
+            data = source.readframes(min(block_frames, remaining))
+            if not data:
+                break
+            target.writeframes(data)
+            remaining -= min(block_frames, remaining)
+
+    def frame_energies(self, wav_file_path):
+        """
+        Measures the energy of every frame of a WAV file, reading it block by block.
+
+        :param wav_file_path: The path to the WAV file.
+        :return: Tuple of the frame energies in dBFS and the number of samples per frame.
+        """
+        with wave.open(wav_file_path, 'rb') as wav_file:
+            sample_rate = wav_file.getframerate()
+            frame_length = max(int(sample_rate * self.frame_ms / 1000), 1)
+            block_frames = frame_length * max(int(self.block_seconds * 1000 / self.frame_ms), 1)
+
+            energies = []
+            while True:
+                data = wav_file.readframes(block_frames)
+                if not data:
+                    break
+                samples = self._to_mono(data, wav_file.getsampwidth(), wav_file.getnchannels())
+                frame_count = -(-len(samples) // frame_length)
+                samples = np.pad(samples, (0, frame_count * frame_length - len(samples)))
+                rms = np.sqrt(np.mean(samples.reshape(frame_count, frame_length) ** 2, axis=1))
+                energies.append(20 * np.log10(np.maximum(rms, 1e-10)))
+
+        return (np.concatenate(energies) if energies else np.zeros(0)), frame_length
+
+    def detect_speech(self, energies):
+        """
+        Finds the speech spans from the frame energies.
+
+        :param energies: The frame energies in dBFS.
+        :return: List of (start_frame, end_frame) speech spans, end exclusive.
+        """
+        if len(energies) == 0:
+            return []
+
+        threshold = max(np.percentile(energies, 10) + self.threshold_margin_db, self.min_threshold_db)
+        is_speech = energies > threshold
+
+        # Find the boundaries of runs of speech frames
+        edges = np.diff(np.concatenate(([0], is_speech.astype(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+
+        padding = int(self.padding_ms / self.frame_ms)
+        min_silence = int(self.min_silence_ms / self.frame_ms)
+        spans = []
+        for start, end in zip(starts, ends):
+            start = max(start - padding, 0)
+            end = min(end + padding, len(energies))
+            if spans and start - spans[-1][1] < min_silence:
+                spans[-1] = (spans[-1][0], max(spans[-1][1], end))
+            else:
+                spans.append((int(start), int(end)))
+        return spans
+
+    def trim_wav(self, wav_file_path, offsets_path=None):
+        """
+        Cuts the non-speech spans out of a WAV file in place and records where each kept span came from.
+
+        :param wav_file_path: The path to the WAV file to be trimmed.
+        :param offsets_path: Optional path of a JSON file to save the offset map to.
+        :return: The offset map, a list of dictionaries with the start of each kept span in the trimmed and the
+                 original audio and its duration, all in seconds.
+        """
+        energies, frame_length = self.frame_energies(wav_file_path)
+        spans = self.detect_speech(energies)
+
+        with wave.open(wav_file_path, 'rb') as source:
+            sample_rate = source.getframerate()
+            total_frames = source.getnframes()
+
+        # Leave the file untouched when there is no silence long enough to cut
+        if spans == [(0, len(energies))]:
+            offset_map = [{"trimmed_start": 0.0, "original_start": 0.0, "duration": total_frames / sample_rate}]
+            self.save_offset_map(offsets_path, offset_map, total_frames / sample_rate)
+            return offset_map
+
+        trimmed_file_path = wav_file_path + ".trimmed"
+        offset_map = []
+        with wave.open(wav_file_path, 'rb') as source, wave.open(trimmed_file_path, 'wb') as target:
+            target.setnchannels(source.getnchannels())
+            target.setsampwidth(source.getsampwidth())
+            target.setframerate(sample_rate)
+
+            written = 0
+            for start, end in spans:
+                start_sample = start * frame_length
+                end_sample = min(end * frame_length, total_frames)
+                offset_map.append({
+                    "trimmed_start": written / sample_rate,
+                    "original_start": start_sample / sample_rate,
+                    "duration": (end_sample - start_sample) / sample_rate
+                })
+
+                self._copy_frames(source, target, start_sample, end_sample)
+                written += end_sample - start_sample
+
+        os.replace(trimmed_file_path, wav_file_path)
+        self.save_offset_map(offsets_path, offset_map, total_frames / sample_rate)
+
+        return offset_map
+
+    def split_points(self, energies, frame_length, sample_rate, segment_seconds, search_seconds=30):
+        """
+        Chooses where to split long audio, cutting at the quietest frame shortly before every segment boundary
+        so words are not split between segments.
+
+        :param energies: The frame energies in dBFS.
+        :param frame_length: The number of samples per frame.
+        :param sample_rate: The sample rate of the audio.
+        :param segment_seconds: The target length of a segment in seconds.
+        :param search_seconds: How far before each boundary to look for silence.
+        :return: List of split positions in samples, in order.
+        """
+        segment_frames = max(int(segment_seconds * sample_rate / frame_length), 1)
+        search_frames = min(max(int(search_seconds * sample_rate / frame_length), 1), segment_frames // 2 or 1)
+
+        split_frames = []
+        start = 0
+        while len(energies) - start > segment_frames:
+            window_start = start + segment_frames - search_frames
+            window_end = start + segment_frames
+            start = window_start + int(np.argmin(energies[window_start:window_end]))
+            split_frames.append(start)
+        return [frame * frame_length for frame in split_frames]
+
+    def split_wav(self, wav_file_path, segment_seconds, output_directory=None):
+        """
+        Splits a WAV file at silence into segments of roughly segment_seconds each. Files no longer than one
+        segment are not split.
+
+        :param wav_file_path: The path to the WAV file to be split.
+        :param segment_seconds: The target length of a segment in seconds.
+        :param output_directory: Directory to write the segments to, defaults to the directory of the WAV file.
+        :return: List of the segment file paths in order, or just the WAV file path if it is not split.
+        """
+        energies, frame_length = self.frame_energies(wav_file_path)
+        with wave.open(wav_file_path, 'rb') as source:
+            sample_rate = source.getframerate()
+            total_frames = source.getnframes()
+        split_points = self.split_points(energies, frame_length, sample_rate, segment_seconds)
+        if not split_points:
+            return [wav_file_path]
+
+        output_directory = output_directory or os.path.dirname(wav_file_path)
+        stem = os.path.splitext(os.path.basename(wav_file_path))[0]
+        boundaries = [0] + split_points + [total_frames]
+
+        segment_paths = []
+        with wave.open(wav_file_path, 'rb') as source:
+            for index, (start_sample, end_sample) in enumerate(zip(boundaries, boundaries[1:])):
+                segment_path = os.path.join(output_directory, f"{stem}_segment_{index:03d}.wav")
+                with wave.open(segment_path, 'wb') as target:
+                    target.setnchannels(source.getnchannels())
+                    target.setsampwidth(source.getsampwidth())
+                    target.setframerate(sample_rate)
+                    self._copy_frames(source, target, start_sample, end_sample)
+                segment_paths.append(segment_path)
+        return segment_paths
+
+    @staticmethod
+    def save_offset_map(offsets_path, offset_map, original_duration):
+        """
+        Saves an offset map as JSON, together with the original and trimmed durations.
+
+        :param offsets_path: The path of the JSON file, or None to not save the map.
+        :param offset_map: The offset map returned by trim_wav.
+        :param original_duration: The duration in seconds of the original audio.
+        """
+        if not offsets_path:
+            return
+        trimmed_duration = sum(span["duration"] for span in offset_map)
+        with open(offsets_path, 'w', encoding='utf-8') as file:
+            json.dump({"original_duration": original_duration, "trimmed_duration": trimmed_duration, "spans": offset_map}, file)
+
+    @staticmethod
+    def to_original_time(offset_map, trimmed_time):
+        """
+        Maps a time in the trimmed audio back to the original audio.
+
+        :param offset_map: The offset map returned by trim_wav.
+        :param trimmed_time: A time in seconds in the trimmed audio.
+        :return: The corresponding time in seconds in the original audio.
+        """
+        for span in reversed(offset_map):
+            if trimmed_time >= span["trimmed_start"]:
+                return span["original_start"] + min(trimmed_time - span["trimmed_start"], span["duration"])
+        return trimmed_time
@@ -0,0 +1,124 @@
+import os
+import threading
+from PIL import Image, ImageChops
+
+
+class ImageOptimizer:
+    # PIL format name and file extension of each output format
+    IMAGE_FORMATS = {
+        "png": ("PNG", ".png"),
+        "jpeg": ("JPEG", ".jpg"),
+        "webp": ("WEBP", ".webp"),
+    }
+
+    def __init__(self, max_dimension=2048, image_format="png", quality=90, grayscale="auto", grayscale_tolerance=8):
+        """
+        Initializes the ImageOptimizer, which shrinks slide images before they are base64 encoded and uploaded.
+
+        :param max_dimension: Images whose width or height exceeds this are downscaled to fit, keeping the aspect ratio.
+        :param image_format: The output format, 'png' (lossless), 'jpeg' or 'webp'.
+        :param quality: The quality of 'jpeg' and 'webp' output, from 1 to 100.
+        :param grayscale: 'always' or 'never' to force the colour mode, or 'auto' to convert images that have no colour.
+        :param grayscale_tolerance: Maximum difference between the colour channels of an 'auto' image to count as grayscale.
+        """
+        if image_format not in self.IMAGE_FORMATS:
+            raise ValueError(f"Unsupported image format '{image_format}'. Available options are: {', '.join(self.IMAGE_FORMATS)}")
+        if grayscale not in ("auto", "always", "never"):
+            raise ValueError(f"Unsupported grayscale mode '{grayscale}'. Available options are: auto, always, never")
+
+        self.max_dimension = max_dimension
+        self.image_format = image_format
+        self.quality = quality
+        self.grayscale = grayscale
+        self.grayscale_tolerance = grayscale_tolerance
+
+        self._lock = threading.Lock()
+        self.images = 0
+        self.original_bytes = 0
+        self.optimized_bytes = 0
+
+    @property
+    def extension(self):
+        """
+        The file extension of optimized images.
+
+        :return: The extension including the dot.
+        """
+        return self.IMAGE_FORMATS[self.image_format][1]
+
+    def is_grayscale(self, image):
+        """
+        Checks whether an RGB image has no visible colour.
+
+        :param image: An RGB PIL image.
+        :return: True if every pixel's channels differ by at most grayscale_tolerance.
+        """
+        red, green, blue = image.split()
+        return all(
+            ImageChops.difference(first, second).getextrema()[1] <= self.grayscale_tolerance
+            for first, second in ((red, green), (green, blue))
+        )
+
+    def optimize(self, image_file_path, output_path):
+        """
+        Writes a downscaled, metadata-free copy of an image. If the result is no smaller than the
+        original, the original bytes are copied instead.
+
+        :param image_file_path: The path to the source image.
+        :param output_path: The path to write the optimized image to, which should end with the extension property.
+        :return: Tuple of the original and written sizes in bytes.
+        """
+        original_size = os.path.getsize(image_file_path)
+
+        with Image.open(image_file_path) as source:
+            source.load()
+            has_alpha = source.mode in ("RGBA", "LA") or (source.mode == "P" and "transparency" in source.info)
+            image = source.convert("RGBA" if has_alpha else "RGB")
+
+        if has_alpha:
+            # Slides are read on white, and JPEG has no alpha channel
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+
+        if self.grayscale == "always" or (self.grayscale == "auto" and self.is_grayscale(image)):
+            image = image.convert("L")
+
+        if max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+
+        # A freshly converted image carries no EXIF, text chunks or ICC profile, so nothing but pixels is saved
+        pil_format = self.IMAGE_FORMATS[self.image_format][0]
+        temp_path = output_path + ".part"
+        if self.image_format == "png":
+            image.save(temp_path, format=pil_format, optimize=True)
+        else:
+            image.save(temp_path, format=pil_format, quality=self.quality)
+
+        if os.path.getsize(temp_path) >= original_size and os.path.splitext(image_file_path)[1].lower() == self.extension:
+            os.remove(temp_path)
+            with open(image_file_path, 'rb') as source_file, open(output_path, 'wb') as output_file:
+                output_file.write(source_file.read())
+        else:
+            os.replace(temp_path, output_path)
+
+        optimized_size = os.path.getsize(output_path)
+        with self._lock:
+            self.images += 1
+            self.original_bytes += original_size
+            self.optimized_bytes += optimized_size
+        return original_size, optimized_size
+
+    def stats(self):
+        """
+        Reports the total payload savings of the images optimized so far.
+
+        :return: A dictionary with the number of images, the original and optimized bytes and the fraction saved.
+        """
+        with self._lock:
+            return {
+                "images": self.images,
+                "original_bytes": self.original_bytes,
+                "optimized_bytes": self.optimized_bytes,
+                "saved": 1 - self.optimized_bytes / self.original_bytes if self.original_bytes else 0.0
+            }
@@ -3,13 +3,17 @@ import shutil
 from utils.util import create_image_filename
 
 class PNGCollater:
-    def __init__(self, output_directory="F:/duphonics_presentation_images"):
+    def __init__(self, output_directory="F:/duphonics_presentation_images", manifest=None, image_optimizer=None):
         """
         Initializes the PNGCollater with the specified output directory.
 
         :param output_directory: The directory where the PNG files will be copied to.
+        :param manifest: Optional JobManifest used for skip checks instead of listing the transcript directory.
+        :param image_optimizer: Optional ImageOptimizer that writes shrunk copies instead of copying the PNG files as they are.
         """
         self.output_directory = output_directory
+        self.manifest = manifest
+        self.image_optimizer = image_optimizer
         os.makedirs(self.output_directory, exist_ok=True)
 
     def create_image_filepath(self, png_file_path):
@@ -20,10 +24,24 @@ class PNGCollater:
         :return: The cleaned file path in the output directory.
         """
         cleaned_filename_without_extension = create_image_filename(png_file_path)
-        cleaned_filename_full = cleaned_filename_without_extension + '.png'
+        extension = self.image_optimizer.extension if self.image_optimizer is not None else '.png'
+        cleaned_filename_full = cleaned_filename_without_extension + extension
         
         return os.path.join(self.output_directory, cleaned_filename_full).replace('\\', '/')
     
+    def has_transcript(self, png_file_path, transcript_directory, transcript_name):
+        """
+        Checks whether the PNG file already has a transcript.
+
+        :param png_file_path: The path to the PNG file.
+        :param transcript_directory: The directory where transcript files are stored.
+        :param transcript_name: The expected file name of the transcript.
+        :return: True if the transcript exists, False otherwise.
+        """
+        if self.manifest is not None:
+            return self.manifest.has_transcript(png_file_path, transcript_directory, transcript_name)
+        return os.path.exists(os.path.join(transcript_directory, transcript_name))
+
     def copy_png_image(self, png_file_path, transcript_directory):
         """
         Copies the PNG image to the output directory if it doesn't already have a corresponding transcript.
@@ -41,12 +59,15 @@ class PNGCollater:
         cleaned_filename_without_extension = create_image_filename(png_file_path)
         
         # Check if corresponding transcript already exists
-        if f"{cleaned_filename_without_extension}.txt" in os.listdir(transcript_directory) or "slide" not in cleaned_filename_without_extension:
+        if "slide" not in cleaned_filename_without_extension or self.has_transcript(png_file_path, transcript_directory, f"{cleaned_filename_without_extension}.txt"):
             return None  # Skip this file as it already has a transcript or it is not a slide
 
         output_path = self.create_image_filepath(png_file_path)
 
-        # Copy image to image directory
-        shutil.copy2(png_file_path, output_path)
+        # Copy image to image directory, shrinking it first if an optimizer is set
+        if self.image_optimizer is not None:
+            self.image_optimizer.optimize(png_file_path, output_path)
+        else:
+            shutil.copy2(png_file_path, output_path)
         
         return output_path
\ No newline at end of file
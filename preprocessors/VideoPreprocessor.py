@@ -5,13 +5,34 @@ from moviepy.editor import VideoFileClip
 
 
 class VideoPreprocessor:
-    def __init__(self, temp_audio_path="E:/temp_audio_files"):
+    # ffmpeg codec arguments and container format for each speech-optimised output format
+    FFMPEG_AUDIO_FORMATS = {
+        "wav": (["-acodec", "pcm_s16le"], "wav"),
+        "ogg": (["-acodec", "libopus", "-b:a", "32k", "-application", "voip"], "ogg"),
+    }
+    # Bytes per second of audio written by each backend and format, used to size conversions before they run
+    AUDIO_BYTES_PER_SECOND = {
+        ("moviepy", "wav"): 44100 * 2 * 2,
+        ("ffmpeg", "wav"): 16000 * 2,
+        ("ffmpeg", "ogg"): 32000 // 8,
+    }
+
+    def __init__(self, temp_audio_path="E:/temp_audio_files", manifest=None, conversion_backend="moviepy", audio_format="wav"):
         """
         Initializes the VideoPreprocessor with the specified temporary audio path.
 
         :param temp_audio_path: The directory where the temporary audio files will be saved.
+        :param manifest: Optional JobManifest used for skip checks instead of listing the transcript directory.
+        :param conversion_backend: The backend used by convert_video_to_audio, 'moviepy' or 'ffmpeg'.
+        :param audio_format: The output format of the 'ffmpeg' backend, 'wav' or 'ogg'.
         """
+        if conversion_backend not in ("moviepy", "ffmpeg"):
+            raise ValueError(f"Unsupported conversion backend '{conversion_backend}'. Available options are: moviepy, ffmpeg")
+
         self.temp_audio_path = temp_audio_path
+        self.manifest = manifest
+        self.conversion_backend = conversion_backend
+        self.audio_format = audio_format
         os.makedirs(self.temp_audio_path, exist_ok=True)
 
     def create_audio_filepath_cfa(self, ogg_file_path):
@@ -25,24 +46,38 @@ class VideoPreprocessor:
         cleaned_filename_full = cleaned_filename_without_extension + '.wav'
         return os.path.join(self.temp_audio_path, cleaned_filename_full).replace('\\', '/')
     
-    def create_audio_filepath_duphonics(self, mp4_file_path):
+    def create_audio_filepath_duphonics(self, mp4_file_path, extension='.wav'):
         """
         Creates a cleaned file path for the Duphonics audio in the temporary audio directory.
 
         :param mp4_file_path: The original path of the MP4 file.
+        :param extension: The extension of the audio file.
         :return: The cleaned file path in the temporary audio directory.
         """
         cleaned_filename_without_extension = create_audio_filename_duphonics(mp4_file_path)
-        cleaned_filename_full = cleaned_filename_without_extension + '.wav'
+        cleaned_filename_full = cleaned_filename_without_extension + extension
         return os.path.join(self.temp_audio_path, cleaned_filename_full).replace('\\', '/')
     
-    def convert_mp4_or_webm_to_wav(self, input_path, transcript_directory):
+    def has_transcript(self, input_path, transcript_directory, transcript_name):
         """
-        Converts an MP4 or WEBM file to WAV format and saves it in the temporary audio directory.
+        Checks whether the input file already has a transcript.
 
-        :param input_path: The path to the MP4 or WEBM file to be converted.
+        :param input_path: The path to the input file.
         :param transcript_directory: The directory where transcript files are stored.
-        :return: The path to the converted WAV file, or None if the file has a transcript or is a deskshare.
+        :param transcript_name: The expected file name of the transcript.
+        :return: True if the transcript exists, False otherwise.
+        """
+        if self.manifest is not None:
+            return self.manifest.has_transcript(input_path, transcript_directory, transcript_name)
+        return os.path.exists(os.path.join(transcript_directory, transcript_name))
+
+    def needs_transcription(self, input_path, transcript_directory):
+        """
+        Validates an MP4 or WEBM file and checks whether it still needs to be transcribed.
+
+        :param input_path: The path to the MP4 or WEBM file.
+        :param transcript_directory: The directory where transcript files are stored.
+        :return: False if the file has a transcript or is a deskshare, True otherwise.
         :raises FileNotFoundError: If the MP4/WEBM file does not exist.
         :raises ValueError: If the input file is not an MP4 or WEBM file.
         """
@@ -54,11 +89,56 @@ class VideoPreprocessor:
         if not input_path.lower().endswith('.mp4') and not input_path.lower().endswith('.webm'):
             raise ValueError("Currently, only .mp4/.webm format is supported for conversion to .wav")
         
-        # Create the path for the output WAV file
+        # Create the name of the transcript file
         cleaned_filename_without_extension = create_audio_filename_duphonics(input_path)
         
         # Skip this file as it already has a transcript or is a deskshare
-        if f"{cleaned_filename_without_extension}.txt" in os.listdir(transcript_directory) or "deskshare" in input_path:
+        return not ("deskshare" in input_path or self.has_transcript(input_path, transcript_directory, f"{cleaned_filename_without_extension}.txt"))
+
+    @staticmethod
+    def probe_duration(input_path):
+        """
+        Reads the duration of a media file from its container with ffprobe, falling back to moviepy.
+
+        :param input_path: The path to the media file.
+        :return: The duration in seconds.
+        """
+        try:
+            result = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "default=noprint_wrappers=1:nokey=1", input_path],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            return float(result.stdout.decode('utf-8').strip())
+        except (OSError, ValueError, subprocess.CalledProcessError):
+            video_clip = VideoFileClip(input_path)
+            try:
+                return video_clip.duration
+            finally:
+                video_clip.close()
+
+    def estimate_audio_bytes(self, input_path):
+        """
+        Estimates the size of the audio file convert_video_to_audio will write for a video.
+
+        :param input_path: The path to the MP4 or WEBM file.
+        :return: The estimated size in bytes.
+        """
+        audio_format = self.audio_format if self.conversion_backend == "ffmpeg" else "wav"
+        return int(self.probe_duration(input_path) * self.AUDIO_BYTES_PER_SECOND[(self.conversion_backend, audio_format)])
+
+    def convert_mp4_or_webm_to_wav(self, input_path, transcript_directory):
+        """
+        Converts an MP4 or WEBM file to WAV format and saves it in the temporary audio directory.
+
+        :param input_path: The path to the MP4 or WEBM file to be converted.
+        :param transcript_directory: The directory where transcript files are stored.
+        :return: The path to the converted WAV file, or None if the file has a transcript or is a deskshare.
+        :raises FileNotFoundError: If the MP4/WEBM file does not exist.
+        :raises ValueError: If the input file is not an MP4 or WEBM file.
+        """
+        if not self.needs_transcription(input_path, transcript_directory):
             return None
         
         wav_file_path = self.create_audio_filepath_duphonics(input_path)
@@ -82,6 +162,93 @@ class VideoPreprocessor:
 
         return wav_file_path
 
+    def convert_video_to_audio(self, input_path, transcript_directory):
+        """
+        Converts an MP4 or WEBM file to audio with the configured conversion backend.
+
+        :param input_path: The path to the MP4 or WEBM file to be converted.
+        :param transcript_directory: The directory where transcript files are stored.
+        :return: The path to the converted audio file, or None if the file has a transcript or is a deskshare.
+        """
+        if self.conversion_backend == "ffmpeg":
+            return self.convert_mp4_or_webm_with_ffmpeg(input_path, transcript_directory, audio_format=self.audio_format)
+        return self.convert_mp4_or_webm_to_wav(input_path, transcript_directory)
+
+    def convert_mp4_or_webm_with_ffmpeg(self, input_path, transcript_directory, audio_format="wav", sample_rate=16000, channels=1):
+        """
+        Extracts the audio of an MP4 or WEBM file with ffmpeg directly, skipping the video stream and writing
+        speech-optimised 16kHz mono audio instead of 44.1kHz stereo.
+
+        :param input_path: The path to the MP4 or WEBM file to be converted.
+        :param transcript_directory: The directory where transcript files are stored.
+        :param audio_format: The output format, 'wav' for 16-bit PCM or 'ogg' for Opus in an OGG container.
+        :param sample_rate: The sample rate of the output audio.
+        :param channels: The number of channels of the output audio.
+        :return: The path to the converted audio file, or None if the file has a transcript or is a deskshare.
+        :raises FileNotFoundError: If the MP4/WEBM file does not exist.
+        :raises ValueError: If the input file is not an MP4 or WEBM file or the audio format is not supported.
+        :raises RuntimeError: If ffmpeg fails to convert the file.
+        """
+        if audio_format not in self.FFMPEG_AUDIO_FORMATS:
+            raise ValueError(f"Unsupported audio format '{audio_format}'. Available options are: {', '.join(self.FFMPEG_AUDIO_FORMATS)}")
+
+        if not self.needs_transcription(input_path, transcript_directory):
+            return None
+
+        codec_args, container = self.FFMPEG_AUDIO_FORMATS[audio_format]
+        audio_file_path = self.create_audio_filepath_duphonics(input_path, extension=f".{audio_format}")
+        partial_file_path = audio_file_path + ".part"
+
+        try:
+            # Write to a partial file first so an interrupted conversion never leaves a truncated audio file behind
+            subprocess.run(
+                ["ffmpeg", "-y", "-loglevel", "error", "-i", input_path, "-vn", "-ac", str(channels), "-ar", str(sample_rate)]
+                + codec_args + ["-f", container, partial_file_path],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
+            )
+            os.replace(partial_file_path, audio_file_path)
+        except subprocess.CalledProcessError as e:
+            if os.path.exists(partial_file_path):
+                os.remove(partial_file_path)
+            raise RuntimeError(f"Error occurred while converting {input_path} to {audio_format}: {e.stderr.decode('utf-8', errors='replace')}")
+
+        return audio_file_path
+
+    @staticmethod
+    def open_pcm_stream(input_path, sample_rate=16000, channels=1):
+        """
+        Starts ffmpeg decoding the audio track of a media file into raw 16-bit PCM on its stdout, so the
+        audio can be streamed to the speech service without writing a WAV file.
+
+        :param input_path: The path to the media file.
+        :param sample_rate: The sample rate of the decoded audio.
+        :param channels: The number of channels of the decoded audio.
+        :return: The ffmpeg process; read the PCM audio from its stdout and call close_pcm_stream when done.
+        """
+        return subprocess.Popen(
+            ["ffmpeg", "-loglevel", "error", "-i", input_path, "-vn", "-f", "s16le", "-acodec", "pcm_s16le",
+             "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+
+    @staticmethod
+    def close_pcm_stream(process, input_path):
+        """
+        Waits for an ffmpeg PCM stream to finish and checks that decoding succeeded.
+
+        :param process: The ffmpeg process returned by open_pcm_stream.
+        :param input_path: The path to the decoded media file, used in the error message.
+        :raises RuntimeError: If ffmpeg failed to decode the file.
+        """
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError(f"Error occurred while streaming audio from {input_path}: {stderr.decode('utf-8', errors='replace')}")
+
     def convert_ogg_to_wav(self, input_path, transcript_directory):
         """
         Converts an OGG file to WAV format and saves it in the temporary audio directory.
@@ -104,7 +271,7 @@ class VideoPreprocessor:
         cleaned_filename_without_extension = create_audio_filename_cfa(input_path)
         
         # Check if corresponding transcript already exists
-        if f"{cleaned_filename_without_extension}.txt" in os.listdir(transcript_directory):
+        if self.has_transcript(input_path, transcript_directory, f"{cleaned_filename_without_extension}.txt"):
             return None  # Skip this file as it already has a transcript
 
         wav_file_path = self.create_audio_filepath_cfa(input_path)
@@ -0,0 +1,225 @@
+import os
+import glob
+import json
+import math
+import argparse
+from collections import defaultdict
+from datetime import datetime
+
+SUCCESS_EVENTS = {"converted", "copied", "transcribed", "generated"}  # Events that finish a stage with a duration
+BUCKET_SECONDS = 60  # Default width in seconds of the throughput buckets
+SLOWEST_FILES = 10  # Default number of slowest files to list
+
+def parse_args():
+    """
+    Parses command-line arguments.
+
+    :return: Parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Summarize the JSONL event logs of the transcription and training data pipelines.")
+    parser.add_argument('events', help='Event files, directories of event files or glob patterns (default ./logs/events)', nargs='*', default=['./logs/events'])
+    parser.add_argument('--run_id', help='Only report events of this run, e.g. 20240101_120000 (defaults to every run found)', default=None)
+    parser.add_argument('--pipeline', help='Only report events of this pipeline, e.g. transcribe_video', default=None)
+    parser.add_argument('--bucket_seconds', help=f'Width in seconds of the throughput buckets (default {BUCKET_SECONDS})', type=int, default=BUCKET_SECONDS)
+    parser.add_argument('--slowest', help=f'Number of slowest files to list (default {SLOWEST_FILES})', type=int, default=SLOWEST_FILES)
+    parser.add_argument('--json', help='Print the report as JSON instead of tables', action='store_true')
+    args = parser.parse_args()
+    if args.bucket_seconds < 1:
+        parser.error("--bucket_seconds must be at least 1")
+    return args
+
+def event_files(paths):
+    """
+    Expands files, directories and glob patterns into the event files they contain.
+
+    :param paths: List of files, directories or glob patterns.
+    :return: Sorted list of event file paths.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(glob.glob(os.path.join(path, "*.jsonl")))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(glob.glob(path))
+    return sorted(files)
+
+def read_events(paths, run_id=None, pipeline=None):
+    """
+    Reads the events of every event file, skipping lines cut off by a crash.
+
+    :param paths: List of files, directories or glob patterns.
+    :param run_id: Only keep events of this run, or None for every run.
+    :param pipeline: Only keep events of this pipeline, or None for every pipeline.
+    :return: List of events sorted by time.
+    """
+    records = []
+    for file_path in event_files(paths):
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if run_id is not None and str(record.get("run_id")) != run_id:
+                    continue
+                if pipeline is not None and record.get("pipeline") != pipeline:
+                    continue
+                records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records
+
+def percentile(sorted_values, q):
+    """
+    Computes a percentile by linear interpolation between the closest ranks.
+
+    :param sorted_values: Sorted list of values.
+    :param q: Percentile from 0 to 100.
+    :return: The percentile, or None if there are no values.
+    """
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * q / 100
+    lower, upper = math.floor(rank), math.ceil(rank)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+def build_report(records, bucket_seconds=BUCKET_SECONDS, slowest=SLOWEST_FILES):
+    """
+    Summarizes events into throughput over time, stage latencies, retry amplification and the slowest files.
+
+    :param records: List of events sorted by time.
+    :param bucket_seconds: Width in seconds of the throughput buckets.
+    :param slowest: Number of slowest files to list.
+    :return: Dictionary with the sections of the report.
+    """
+    runs = {}
+    throughput = defaultdict(lambda: {"count": 0, "bytes": 0, "audio_seconds": 0.0})
+    durations = defaultdict(list)
+    attempts = defaultdict(lambda: {"started": 0, "retried": 0, "failed": 0, "succeeded": 0, "files": set()})
+    files = {}
+
+    for record in records:
+        run_key = (record.get("pipeline"), record.get("run_id"))
+        run = runs.setdefault(run_key, {"pipeline": run_key[0], "run_id": run_key[1], "start": record["ts"], "end": record["ts"], "events": 0})
+        run["end"] = record["ts"]
+        run["events"] += 1
+
+        event, stage, path = record["event"], record["stage"], record.get("path")
+        if event in SUCCESS_EVENTS:
+            bucket = throughput[(int(record["ts"] // bucket_seconds) * bucket_seconds, stage)]
+            bucket["count"] += 1
+            bucket["bytes"] += record.get("bytes") or 0
+            bucket["audio_seconds"] += record.get("audio_seconds") or 0
+            if record.get("duration") is not None:
+                durations[stage].append(record["duration"])
+
+        if stage != "discover":
+            stage_attempts = attempts[stage]
+            if event == "started":
+                stage_attempts["started"] += 1
+                stage_attempts["files"].add((run_key, path))
+            elif event in ("retried", "failed"):
+                stage_attempts[event] += 1
+            elif event in SUCCESS_EVENTS:
+                stage_attempts["succeeded"] += 1
+
+        if path is None:
+            continue
+        file = files.setdefault((run_key, path), {"path": path, "run_id": run_key[1], "first": record["ts"], "last": record["ts"], "stages": {}, "retries": 0, "status": event})
+        file["first"] = min(file["first"], record.get("started_at") or record["ts"])
+        file["last"] = record["ts"]
+        file["status"] = event
+        if event == "retried":
+            file["retries"] += 1
+        if event in SUCCESS_EVENTS and record.get("duration") is not None:
+            file["stages"][stage] = round(file["stages"].get(stage, 0) + record["duration"], 3)
+
+    latency = {}
+    for stage, values in sorted(durations.items()):
+        values.sort()
+        latency[stage] = {"count": len(values), "p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99), "max": values[-1]}
+
+    retries = {}
+    for stage, stage_attempts in sorted(attempts.items()):
+        distinct_files = len(stage_attempts["files"])
+        retries[stage] = {
+            "files": distinct_files,
+            "attempts": stage_attempts["started"],
+            "amplification": stage_attempts["started"] / distinct_files if distinct_files else None,
+            "retried": stage_attempts["retried"],
+            "failed": stage_attempts["failed"],
+            "succeeded": stage_attempts["succeeded"],
+        }
+
+    slowest_files = sorted(files.values(), key=lambda file: file["last"] - file["first"], reverse=True)[:slowest]
+    for file in slowest_files:
+        file["elapsed"] = file["last"] - file["first"]
+
+    return {
+        "runs": [dict(run, elapsed=run["end"] - run["start"]) for run in runs.values()],
+        "throughput": [dict(values, bucket=bucket, stage=stage) for (bucket, stage), values in sorted(throughput.items())],
+        "latency": latency,
+        "retries": retries,
+        "slowest_files": slowest_files,
+    }
+
+def format_time(ts):
+    """
+    Formats a Unix time for the report tables.
+
+    :param ts: Unix time.
+    :return: Local time as a string.
+    """
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+def print_report(report, bucket_seconds=BUCKET_SECONDS):
+    """
+    Prints the report as plain text tables.
+
+    :param report: Dictionary returned by build_report.
+    :param bucket_seconds: Width in seconds of the throughput buckets.
+    """
+    print("Runs")
+    for run in report["runs"]:
+        print(f"  {run['pipeline']} {run['run_id']}: {run['events']} events from {format_time(run['start'])} over {run['elapsed']:.1f}s")
+
+    print(f"\nThroughput per {bucket_seconds}s")
+    print(f"  {'bucket':<19}  {'stage':<12} {'files':>7} {'MB':>9} {'audio s':>10}")
+    for row in report["throughput"]:
+        print(f"  {format_time(row['bucket'])}  {row['stage']:<12} {row['count']:>7} {row['bytes'] / 1024 ** 2:>9.1f} {row['audio_seconds']:>10.1f}")
+
+    print("\nStage latency in seconds")
+    print(f"  {'stage':<12} {'count':>7} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for stage, row in report["latency"].items():
+        print(f"  {stage:<12} {row['count']:>7} {row['p50']:>9.2f} {row['p95']:>9.2f} {row['p99']:>9.2f} {row['max']:>9.2f}")
+
+    print("\nRetry amplification (attempts per file)")
+    print(f"  {'stage':<12} {'files':>7} {'attempts':>9} {'ampl.':>7} {'retried':>8} {'failed':>7}")
+    for stage, row in report["retries"].items():
+        amplification = f"{row['amplification']:.2f}" if row["amplification"] is not None else "-"
+        print(f"  {stage:<12} {row['files']:>7} {row['attempts']:>9} {amplification:>7} {row['retried']:>8} {row['failed']:>7}")
+
+    print("\nSlowest files (first to last event)")
+    for file in report["slowest_files"]:
+        stages = ", ".join(f"{stage} {duration:.1f}s" for stage, duration in file["stages"].items())
+        print(f"  {file['elapsed']:>9.1f}s  {file['path']} [{file['status']}, {file['retries']} retries{', ' + stages if stages else ''}]")
+
+def main():
+    """
+    Main function to read the event logs and print the report.
+    """
+    args = parse_args()
+    records = read_events(args.events, args.run_id, args.pipeline)
+    if not records:
+        print("No events found.")
+        return
+
+    report = build_report(records, args.bucket_seconds, args.slowest)
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        print_report(report, args.bucket_seconds)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import subprocess
+
+from benchmarks.MockOpenAIServer import MockOpenAIServer
+from benchmarks.corpus import build_corpus
+from report_events import read_events, build_report, percentile
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINES = {
+    # Corpus kind and the stage whose success event finishes a file
+    "transcribe_image": ("image", "transcribe"),
+    "transcribe_video": ("video", "transcribe"),
+    "create_training_data": ("text", "generate"),
+}
+BENCHMARK_FILES = 10000  # Default number of files in the synthetic corpus
+RUN_TIMEOUT = 6 * 3600  # Delay in seconds before a benchmark run is killed
+TOLERANCE = 0.1  # Default fraction by which throughput may drop or tail latency may rise before a run counts as a regression
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    :return: Parsed command line arguments.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark a pipeline end to end against local stand-ins of the Azure services.")
+    parser.add_argument('pipeline', help='Pipeline script to benchmark', choices=list(PIPELINES))
+    parser.add_argument('--files', help=f'Number of files in the synthetic corpus (default {BENCHMARK_FILES})', type=int, default=BENCHMARK_FILES)
+    parser.add_argument('--corpus_dir', help='Directory of the synthetic corpus, reused by later runs with the same settings (defaults to ./benchmark_runs/corpus_<pipeline>)', default=None)
+    parser.add_argument('--work_dir', help='Directory of the outputs, logs and events of each run (default ./benchmark_runs)', default='./benchmark_runs')
+    parser.add_argument('--image_size', help='Width and height of the synthetic slides (default 1280 720)', type=int, nargs=2, default=[1280, 720])
+    parser.add_argument('--video_seconds', help='Duration of the synthetic lectures in seconds (default 30)', type=int, default=30)
+    parser.add_argument('--text_chars', help='Characters per synthetic text file (default 20000)', type=int, default=20000)
+    parser.add_argument('--latency', help='Median response time of the stand-in service in seconds, on top of the audio for speech (default 0.5)', type=float, default=0.5)
+    parser.add_argument('--latency_sigma', help='Spread of the log-normal response time, 0 for a fixed latency (default 0.5)', type=float, default=0.5)
+    parser.add_argument('--rate_limit_ratio', help='Fraction of requests answered with a 429 rate limit error (default 0)', type=float, default=0.0)
+    parser.add_argument('--retry_after', help='Retry-After delay in seconds of the 429 responses (default 1)', type=int, default=1)
+    parser.add_argument('--response_tokens', help='Tokens per chat completion, or words per recognized speech segment (default 200)', type=int, default=200)
+    parser.add_argument('--real_time_factor', help='Seconds of audio the fake speech recognizer gets through per second (default 10)', type=float, default=10.0)
+    parser.add_argument('--set', help='Override a module constant (NAME=VALUE) or pass a script flag (--flag=VALUE) in every run (repeatable)', action='append', default=[])
+    parser.add_argument('--sweep', help='Run once per value of a constant or script flag, e.g. MAX_TRANSCRIBE_WORKERS=8,16,32 or --max_concurrency=50,100', default=None)
+    parser.add_argument('--script_args', help='Extra arguments passed to the pipeline script, e.g. "--async_mode --images_per_request 4"', default='')
+    parser.add_argument('--repeat', help='Number of runs per setting (default 1)', type=int, default=1)
+    parser.add_argument('--seed', help='Seed of the corpus and the stand-in latencies and errors (default 0)', type=int, default=0)
+    parser.add_argument('--timeout', help=f'Seconds before a run is killed (default {RUN_TIMEOUT})', type=int, default=RUN_TIMEOUT)
+    parser.add_argument('--output', help='Write the results to this JSON file (defaults to <work_dir>/results_<pipeline>.json)', default=None)
+    parser.add_argument('--baseline', help='Results JSON of an earlier benchmark to compare against; exits with status 1 on a regression', default=None)
+    parser.add_argument('--tolerance', help=f'Fraction by which throughput may drop or p95 latency may rise against the baseline (default {TOLERANCE})', type=float, default=TOLERANCE)
+    args = parser.parse_args()
+    if args.pipeline == "create_training_data" and any(override.startswith("--") for override in args.set + [args.sweep or ""]):
+        parser.error("create_training_data is configured through its constants and takes no script flags")
+    return args
+
+def split_overrides(overrides):
+    """
+    Splits NAME=VALUE overrides into module constants and script flags.
+
+    :param overrides: List of NAME=VALUE strings, where names starting with '--' are script flags.
+    :return: Tuple of the constant overrides and the script arguments.
+    """
+    constants, flags = [], []
+    for override in overrides:
+        name, _, value = override.partition("=")
+        if name.startswith("--"):
+            flags.extend([name, value] if value else [name])
+        else:
+            constants.append(override)
+    return constants, flags
+
+def pipeline_args(pipeline, input_dir, run_dir):
+    """
+    Builds the inputs and outputs of a run: script arguments for the transcription scripts, constants for
+    create_training_data.
+
+    :param pipeline: Name of the pipeline script.
+    :param input_dir: Directory of the synthetic corpus.
+    :param run_dir: Directory of the run's outputs.
+    :return: Tuple of the constant overrides and the script arguments.
+    """
+    events_dir = os.path.join(run_dir, "events")
+    output_txt_dir = os.path.join(run_dir, "txt")
+    if pipeline == "transcribe_image":
+        return [], ["--base_dir", input_dir, "--output_image_dir", os.path.join(run_dir, "images"), "--output_txt_dir", output_txt_dir,
+                    "--logs_dir", os.path.join(run_dir, "logs"), "--events_dir", events_dir]
+    if pipeline == "transcribe_video":
+        return [], ["--base_dir", input_dir, "--output_wav_dir", os.path.join(run_dir, "wav"), "--output_txt_dir", output_txt_dir,
+                    "--logs_dir", os.path.join(run_dir, "logs"), "--events_dir", events_dir, "--language", "english", "--conversion_backend", "ffmpeg"]
+    constants = {
+        "INPUT_DIR": input_dir,
+        "OUTPUT_TXT_DIR": output_txt_dir,
+        "MANIFEST_PATH": os.path.join(output_txt_dir, "create_training_data_manifest.db"),
+        "RATE_LIMIT_STATE": os.path.join(output_txt_dir, "create_training_data_rate_limit.db"),
+        "RESPONSE_CACHE_PATH": os.path.join(output_txt_dir, "create_training_data_response_cache.db"),
+        "USE_RESPONSE_CACHE": False,
+        "EVENTS_DIR": events_dir,
+        "LOG_DIR": os.path.join(run_dir, "logs"),
+    }
+    os.makedirs(output_txt_dir, exist_ok=True)
+    return [f"{name}={value!r}" for name, value in constants.items()], []
+
+def summarize_run(pipeline, run_dir, elapsed):
+    """
+    Reads a run's event log into throughput and latency figures.
+
+    :param pipeline: Name of the pipeline script.
+    :param run_dir: Directory of the run's outputs.
+    :param elapsed: Wall time of the run in seconds.
+    :return: Dictionary of the run's results.
+    """
+    _, final_stage = PIPELINES[pipeline]
+    records = read_events([os.path.join(run_dir, "events")])
+    report = build_report(records, slowest=len(records))
+    discovered = sum(1 for record in records if record["event"] == "discovered")
+    finished = sorted(file["elapsed"] for file in report["slowest_files"] if final_stage in file["stages"])
+    return {
+        "discovered": discovered,
+        "completed": len(finished),
+        "elapsed": elapsed,
+        "files_per_second": len(finished) / elapsed if elapsed else None,
+        "p50": percentile(finished, 50),
+        "p95": percentile(finished, 95),
+        "p99": percentile(finished, 99),
+        "stages": report["latency"],
+        "retries": report["retries"],
+    }
+
+def run_once(args, label, constants, flags, input_dir, server):
+    """
+    Runs the pipeline once over the corpus in a fresh run directory.
+
+    :param args: Parsed command line arguments.
+    :param label: Label of the run's setting.
+    :param constants: Module constant overrides, as NAME=VALUE strings.
+    :param flags: Extra script arguments.
+    :param input_dir: Directory of the synthetic corpus.
+    :param server: Running MockOpenAIServer, or None for the speech pipeline.
+    :return: Dictionary of the run's results.
+    """
+    run_dir = os.path.abspath(os.path.join(args.work_dir, f"{args.pipeline}_{label}".replace("=", "_").replace("-", "")))
+    shutil.rmtree(run_dir, ignore_errors=True)
+    os.makedirs(run_dir)
+    run_constants, run_args = pipeline_args(args.pipeline, input_dir, run_dir)
+
+    command = [sys.executable, "-m", "benchmarks.launch", args.pipeline, "--seed", str(args.seed)]
+    for override in run_constants + constants:
+        command += ["--set", override]
+    if args.pipeline == "transcribe_video":
+        command += ["--fake_speech", json.dumps({"latency": args.latency, "latency_sigma": args.latency_sigma, "real_time_factor": args.real_time_factor,
+                                                 "rate_limit_ratio": args.rate_limit_ratio, "segment_words": args.response_tokens})]
+    command += ["--"] + run_args + flags + shlex.split(args.script_args)
+
+    env = dict(os.environ, AZURE_OPENAI_API_KEY="benchmark", API_VERSION="2024-06-01", DEPLOYMENT_NAME="benchmark",
+               AZURE_SPEECH_API_KEY="benchmark", AZURE_SPEECH_REGION="benchmark")
+    if server is not None:
+        env["AZURE_OPENAI_ENDPOINT"] = server.url
+        server.reset_stats()
+
+    print(f"[BENCHMARK] Running {args.pipeline} ({label}) over {args.files} files")
+    start_time = time.monotonic()
+    with open(os.path.join(run_dir, "output.log"), 'w', encoding='utf-8') as output:
+        try:
+            exit_code = subprocess.run(command, cwd=REPO_DIR, env=env, stdout=output, stderr=subprocess.STDOUT, timeout=args.timeout).returncode
+        except subprocess.TimeoutExpired:
+            exit_code = "timeout"
+    elapsed = time.monotonic() - start_time
+
+    result = {"pipeline": args.pipeline, "label": label, "files": args.files, "exit_code": exit_code, "run_dir": run_dir}
+    result.update(summarize_run(args.pipeline, run_dir, elapsed))
+    if server is not None:
+        result["server"] = server.stats()
+    return result
+
+def compare(results, baseline_results, tolerance):
+    """
+    Compares results with a baseline of the same pipeline and settings.
+
+    :param results: List of result dictionaries.
+    :param baseline_results: List of result dictionaries of an earlier benchmark.
+    :param tolerance: Fraction by which throughput may drop or p95 latency may rise.
+    :return: List of regression messages, empty if there is none.
+    """
+    baseline = {(result["pipeline"], result["label"]): result for result in baseline_results}
+    regressions = []
+    for result in results:
+        previous = baseline.get((result["pipeline"], result["label"]))
+        if previous is None:
+            continue
+        if previous["files_per_second"] and (result["files_per_second"] or 0) < previous["files_per_second"] * (1 - tolerance):
+            regressions.append(f"{result['label']}: {result['files_per_second'] or 0:.2f} files/s against {previous['files_per_second']:.2f} in the baseline")
+        if previous["p95"] and result["p95"] and result["p95"] > previous["p95"] * (1 + tolerance):
+            regressions.append(f"{result['label']}: p95 latency {result['p95']:.2f}s against {previous['p95']:.2f}s in the baseline")
+    return regressions
+
+def print_results(results):
+    """
+    Prints a table of the results.
+
+    :param results: List of result dictionaries.
+    """
+    def seconds(value):
+        """
+        Formats a value in seconds, or a dash if there is none.
+
+        :param value: The value, or None.
+        :return: The formatted value.
+        """
+        return f"{value:.2f}" if value is not None else "-"
+
+    print(f"\n{'setting':<32} {'done':>7} {'files/s':>9} {'p50 s':>8} {'p95 s':>8} {'p99 s':>8} {'429s':>6} {'exit':>7}")
+    for result in results:
+        rate_limited = result.get("server", {}).get("rate_limited", sum(stage["retried"] for stage in result["retries"].values()))
+        print(f"{result['label']:<32} {result['completed']:>7} {seconds(result['files_per_second']):>9} {seconds(result['p50']):>8} "
+              f"{seconds(result['p95']):>8} {seconds(result['p99']):>8} {rate_limited:>6} {str(result['exit_code']):>7}")
+
+def main():
+    """
+    Main function to build the corpus, start the stand-ins and run the pipeline once per setting.
+    """
+    args = parse_args()
+    os.makedirs(args.work_dir, exist_ok=True)
+    kind, _ = PIPELINES[args.pipeline]
+    corpus_options = {"image": {"width": args.image_size[0], "height": args.image_size[1]}, "video": {"seconds": args.video_seconds}, "text": {"chars": args.text_chars}}[kind]
+    corpus_dir = args.corpus_dir or os.path.join(args.work_dir, f"corpus_{args.pipeline}")
+    print(f"[BENCHMARK] Preparing {args.files} synthetic {kind} files in {corpus_dir}")
+    input_dir = os.path.abspath(build_corpus(kind, corpus_dir, args.files, seed=args.seed, **corpus_options))
+
+    server = None
+    if args.pipeline != "transcribe_video":
+        server = MockOpenAIServer(latency=args.latency, latency_sigma=args.latency_sigma, rate_limit_ratio=args.rate_limit_ratio,
+                                  retry_after=args.retry_after, response_tokens=args.response_tokens, seed=args.seed)
+        print(f"[BENCHMARK] Mock OpenAI server listening on {server.start()}")
+
+    sweep = [None]
+    if args.sweep:
+        name, _, values = args.sweep.partition("=")
+        sweep = [f"{name}={value}" for value in values.split(",")]
+
+    results = []
+    try:
+        for setting in sweep:
+            constants, flags = split_overrides(args.set + ([setting] if setting else []))
+            for repeat in range(args.repeat):
+                label = (setting or "default") + (f"#{repeat + 1}" if args.repeat > 1 else "")
+                results.append(run_once(args, label, constants, flags, input_dir, server))
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_results(results)
+    output_path = args.output or os.path.join(args.work_dir, f"results_{args.pipeline}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[BENCHMARK] Results written to {output_path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[REGRESSION] {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"[BENCHMARK] No regressions against {args.baseline}")
+
+if __name__ == '__main__':
+    main()
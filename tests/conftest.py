@@ -0,0 +1,18 @@
+import os
+import sys
+
+import pytest
+
+# The scripts import memory/, models/, preprocessors/ and utils/ as namespace packages from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def o200k_encoding():
+    """
+    The o200k_base encoding, skipping the test when tiktoken is missing or cannot download the encoding.
+    """
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        pytest.skip(f"o200k_base encoding unavailable: {e}")
@@ -0,0 +1,84 @@
+import json
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from preprocessors.AudioTrimmer import AudioTrimmer
+
+SAMPLE_RATE = 16000
+
+def write_wav(path, pieces):
+    """
+    Writes a mono 16-bit WAV file of tone and silence pieces.
+
+    :param path: The path of the WAV file.
+    :param pieces: List of (seconds, is_tone) pieces in order.
+    """
+    samples = []
+    for seconds, is_tone in pieces:
+        t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+        samples.append(0.5 * np.sin(2 * np.pi * 440 * t) if is_tone else np.zeros(len(t)))
+    data = (np.concatenate(samples) * 32767).astype('<i2').tobytes()
+    with wave.open(str(path), 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(data)
+
+def frame_count(path):
+    with wave.open(str(path), 'rb') as wav_file:
+        return wav_file.getnframes()
+
+def test_split_points_cut_at_the_quietest_frame_before_each_boundary():
+    trimmer = AudioTrimmer()
+    energies = np.zeros(100)
+    energies[35] = -80.0
+    energies[72] = -80.0
+
+    points = trimmer.split_points(energies, frame_length=10, sample_rate=100, segment_seconds=4, search_seconds=1)
+    assert points == [350, 720]
+
+def test_short_audio_is_not_split(tmp_path):
+    wav_path = tmp_path / "short.wav"
+    write_wav(wav_path, [(3, True)])
+    assert AudioTrimmer().split_wav(str(wav_path), segment_seconds=10) == [str(wav_path)]
+
+def test_split_wav_cuts_in_the_silence_and_keeps_every_frame(tmp_path):
+    wav_path = tmp_path / "lecture.wav"
+    write_wav(wav_path, [(8, True), (1, False), (5, True)])
+
+    segment_paths = AudioTrimmer().split_wav(str(wav_path), segment_seconds=9)
+    assert [path.rsplit("_", 1)[-1] for path in segment_paths] == ["000.wav", "001.wav"]
+    assert sum(frame_count(path) for path in segment_paths) == frame_count(wav_path)
+    assert 8 <= frame_count(segment_paths[0]) / SAMPLE_RATE <= 9
+
+def test_trim_wav_maps_trimmed_time_back_to_the_original(tmp_path):
+    wav_path = tmp_path / "lecture.wav"
+    offsets_path = tmp_path / "lecture.offsets.json"
+    write_wav(wav_path, [(2, True), (5, False), (2, True)])
+
+    offset_map = AudioTrimmer().trim_wav(str(wav_path), str(offsets_path))
+    assert len(offset_map) == 2
+    assert offset_map[0]["original_start"] == 0.0
+    assert offset_map[1]["trimmed_start"] == pytest.approx(offset_map[0]["duration"])
+    assert 6.5 < offset_map[1]["original_start"] < 7.0
+    assert frame_count(wav_path) / SAMPLE_RATE == pytest.approx(sum(span["duration"] for span in offset_map))
+
+    later = offset_map[1]["trimmed_start"] + 1.0
+    assert AudioTrimmer.to_original_time(offset_map, later) == pytest.approx(offset_map[1]["original_start"] + 1.0)
+    assert AudioTrimmer.to_original_time(offset_map, 1.0) == pytest.approx(1.0)
+
+    saved = json.loads(offsets_path.read_text(encoding="utf-8"))
+    assert saved["original_duration"] == pytest.approx(9.0)
+    assert saved["spans"] == offset_map
+
+def test_audio_without_long_silence_is_left_untouched(tmp_path):
+    wav_path = tmp_path / "lecture.wav"
+    write_wav(wav_path, [(2, True), (0.5, False), (2, True)])
+    before = wav_path.read_bytes()
+
+    offset_map = AudioTrimmer().trim_wav(str(wav_path))
+    assert offset_map == [{"trimmed_start": 0.0, "original_start": 0.0, "duration": 4.5}]
+    assert wav_path.read_bytes() == before
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("dotenv")
+requests = pytest.importorskip("requests")
+
+from benchmarks import fake_speechsdk
+
+fake_speechsdk.install()
+
+from models.AzureBatchTranscriber import AzureBatchTranscriber
+from models.AzureSpeechTranscriber import AzureSpeechTranscriber
+
+def http_error(status_code, headers=None):
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers.update(headers or {})
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+class FakeClient:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.polls = 0
+
+    def get_status(self, job_url):
+        self.polls += 1
+        status = self.statuses.pop(0)
+        if isinstance(status, Exception):
+            raise status
+        return status
+
+@pytest.fixture
+def transcriber(tmp_path, monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    return AzureBatchTranscriber("en-US", output_folder=str(tmp_path / "transcripts"), content_base_url="https://blob.example/audio",
+                                 client=FakeClient([]), poll_interval=1, max_wait=3600)
+
+def test_throttled_status_check_is_retried(transcriber):
+    transcriber.client = FakeClient([http_error(429, {"Retry-After": "5"}), "Running", http_error(503), "Succeeded"])
+    transcriber.wait_for_job("https://speech.example/jobs/1")
+    assert transcriber.client.polls == 4
+
+def test_retry_delay_honours_retry_after(transcriber):
+    assert transcriber.poll_retry_delay(http_error(429, {"Retry-After": "7"}), 1) == 7
+    assert transcriber.poll_retry_delay(http_error(429), 3) == 8
+    assert transcriber.poll_retry_delay(http_error(429), 30) == transcriber.MAX_POLL_BACKOFF
+
+def test_client_errors_are_not_retried(transcriber):
+    transcriber.client = FakeClient([http_error(404)])
+    with pytest.raises(requests.HTTPError):
+        transcriber.wait_for_job("https://speech.example/jobs/1")
+
+def test_failed_job_raises(transcriber):
+    transcriber.client = FakeClient(["Running", "Failed"])
+    with pytest.raises(RuntimeError):
+        transcriber.wait_for_job("https://speech.example/jobs/1")
+
+def test_transcript_path_matches_realtime(transcriber):
+    realtime = AzureSpeechTranscriber("en-US", output_folder=transcriber.output_folder)
+    wav_path = "/data/wav/lecture_1.wav"
+    assert transcriber.create_batch_transcript_filepath(wav_path) == realtime.create_transcript_filepath(wav_path)
+    assert transcriber.create_batch_transcript_filepath("/data/wav/lecture_1.ogg") == realtime.create_transcript_filepath(wav_path)
+
+def test_same_basename_in_other_directories_does_not_collide(transcriber):
+    assert transcriber.create_batch_transcript_filepath("/data/a/lecture_1.wav") != transcriber.create_batch_transcript_filepath("/data/b/lecture_1.wav")
+    assert (transcriber.create_batch_transcript_filepath("https://blob.example/a/lecture_1.wav?sig=x")
+            != transcriber.create_batch_transcript_filepath("https://blob.example/b/lecture_1.wav?sig=x"))
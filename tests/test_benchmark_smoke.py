@@ -0,0 +1,35 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_create_training_data_benchmark_finishes(tmp_path, o200k_encoding):
+    # A run that never exits is killed at --timeout and still reports files per second, so check the exit code
+    for module in ("openai", "langchain", "tiktoken"):
+        pytest.importorskip(module)
+
+    output_path = tmp_path / "results.json"
+    command = [sys.executable, "run_benchmark.py", "create_training_data", "--files", "3", "--text_chars", "2000",
+               "--latency", "0.01", "--latency_sigma", "0", "--response_tokens", "20", "--timeout", "120",
+               "--work_dir", str(tmp_path), "--output", str(output_path)]
+    subprocess.run(command, cwd=REPO_DIR, check=True, timeout=300)
+
+    with open(output_path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    assert results[0]["exit_code"] == 0
+    assert results[0]["discovered"] == 3
+    assert results[0]["completed"] == 3
+
+def test_spawned_workers_get_the_overrides():
+    # Spawned workers, as on Windows, import the launcher as __mp_main__ instead of inheriting its state
+    pytest.importorskip("openai")
+    pytest.importorskip("PIL")
+    code = ("import runpy, sys; runpy.run_module('benchmarks.launch', run_name='__mp_main__'); "
+            "print(sys.modules['transcribe_image'].RETRY_DELAY)")
+    env = dict(os.environ, BENCHMARK_LAUNCH_ARGS=json.dumps(["transcribe_image", "--set", "RETRY_DELAY=7"]))
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, env=env, check=True, capture_output=True, text=True, timeout=120)
+    assert output.stdout.splitlines()[-1] == "7"
@@ -0,0 +1,46 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("langchain")
+
+import create_training_data
+from memory.JobManifest import JobManifest
+
+class FakeChat:
+    def __init__(self, outcome):
+        self.outcome = outcome
+
+    def send_message(self, file_path):
+        if isinstance(self.outcome, Exception):
+            raise self.outcome
+        return self.outcome
+
+@pytest.fixture
+def manifest(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_training_data, "job_queue", create_training_data.Queue())
+    manifest = JobManifest(str(tmp_path / "manifest.db"))
+    yield manifest
+    manifest.close()
+
+def process(chat, path, manifest):
+    create_training_data.job_queue.put(path)
+    create_training_data.job_queue.get()
+    create_training_data.process_file(chat, path, manifest)
+
+def test_success_is_marked_done(manifest, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("text", encoding="utf-8")
+    process(FakeChat(True), str(path), manifest)
+    assert manifest.is_done(str(path), "generate")
+
+def test_failure_is_marked_failed_not_done(manifest, tmp_path):
+    path = str(tmp_path / "notes.txt")
+    process(FakeChat(RuntimeError("connection reset")), path, manifest)
+    assert manifest.get(path, "generate")["status"] == "failed"
+    assert not manifest.is_done(path, "generate")
+
+def test_rate_limited_file_is_requeued(manifest, tmp_path):
+    path = str(tmp_path / "notes.txt")
+    process(FakeChat(False), path, manifest)
+    assert not manifest.is_done(path, "generate")
+    assert create_training_data.job_queue.get_nowait() == path
@@ -0,0 +1,96 @@
+import json
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+
+from utils.dedup import band_keys, deduplicate_jsonl_files, minhash, normalize_text, similarity, summarize
+
+QUESTION = ("Explain how the duration of a bond portfolio changes when interest rates rise, and how convexity "
+            "affects the estimate of the price change for large moves in yield.")
+
+def example(question, answer="Duration falls and convexity adds to the estimate."):
+    return json.dumps({"messages": [{"role": "system", "content": "Answer CFA questions."},
+                                    {"role": "user", "content": question},
+                                    {"role": "assistant", "content": answer}]})
+
+def write_lines(path, lines):
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+def read_report(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+def test_normalize_text():
+    assert normalize_text("  Ｈｅｌｌｏ,\tWORLD!! (again) ") == "hello world again"
+    assert normalize_text("ราคา พันธบัตร?") == "ราคา พันธบัตร"
+
+def test_signature_similarity_tracks_shingle_overlap():
+    signature = minhash(normalize_text(QUESTION))
+    assert similarity(signature, minhash(normalize_text(QUESTION))) == 1.0
+    assert similarity(signature, minhash(normalize_text(QUESTION.replace("large", "big")))) > 0.8
+    assert similarity(signature, minhash(normalize_text("What is the time value of money?"))) < 0.2
+    assert len(band_keys(signature)) == 16
+
+def test_exact_and_near_duplicates_are_dropped_across_files(tmp_path):
+    write_lines(tmp_path / "a.jsonl", [example(QUESTION), example("What is the time value of money?")])
+    write_lines(tmp_path / "b.jsonl", [
+        example(QUESTION.upper().replace(",", " ;")),
+        example(QUESTION.replace("large", "big")),
+        example("What is the time value of money?", "A different answer is not an exact duplicate."),
+        "not json",
+        "",
+    ])
+    output_path = tmp_path / "out" / "dedup.jsonl"
+    report_path = tmp_path / "out" / "report.jsonl"
+
+    all_stats = deduplicate_jsonl_files([str(tmp_path / "*.jsonl")], str(output_path), str(report_path))
+    assert [(stats["kept"], stats["exact"], stats["near"], stats["invalid"], stats["blank"]) for stats in all_stats] == [(2, 0, 0, 0, 0), (0, 1, 2, 1, 1)]
+    assert summarize(all_stats)["lines"] == 7
+    assert len(output_path.read_text(encoding="utf-8").splitlines()) == 2
+
+    report = read_report(report_path)
+    assert [(entry["line"], entry["reason"]) for entry in report] == [(1, "exact"), (2, "near"), (3, "near"), (4, "invalid_json")]
+    assert report[0]["duplicate_of"] == {"file": str(tmp_path / "a.jsonl"), "line": 1}
+    assert report[2]["duplicate_of"]["line"] == 2
+
+def test_exact_only(tmp_path):
+    write_lines(tmp_path / "a.jsonl", [example(QUESTION), example(QUESTION.replace("large", "big")), example(QUESTION)])
+    all_stats = deduplicate_jsonl_files([str(tmp_path / "a.jsonl")], str(tmp_path / "out.jsonl"), threshold=None)
+    assert (all_stats[0]["kept"], all_stats[0]["exact"], all_stats[0]["near"]) == (2, 1, 0)
+
+def test_persistent_index_drops_pairs_kept_in_earlier_runs(tmp_path):
+    index_path = str(tmp_path / "index.db")
+    write_lines(tmp_path / "first.jsonl", [example(QUESTION)])
+    write_lines(tmp_path / "second.jsonl", [example(QUESTION.replace("large", "big"))])
+
+    deduplicate_jsonl_files([str(tmp_path / "first.jsonl")], str(tmp_path / "out_1.jsonl"), index_path=index_path)
+    # Rerunning over the same file keeps its lines, which match themselves in the index
+    rerun = deduplicate_jsonl_files([str(tmp_path / "first.jsonl")], str(tmp_path / "out_2.jsonl"), index_path=index_path)
+    assert rerun[0]["kept"] == 1
+    later = deduplicate_jsonl_files([str(tmp_path / "second.jsonl")], str(tmp_path / "out_3.jsonl"), index_path=index_path)
+    assert later[0]["near"] == 1
+
+def test_rerun_with_a_differently_spelled_path_keeps_the_indexed_lines(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    write_lines(tmp_path / "data" / "a.jsonl", [example(QUESTION), example("What is the time value of money?"), example(QUESTION)])
+
+    first = deduplicate_jsonl_files(["data"], "out_1.jsonl", index_path="index.db")
+    rerun = deduplicate_jsonl_files(["./data/"], "out_2.jsonl", index_path="index.db")
+    assert [(stats["kept"], stats["exact"]) for stats in first + rerun] == [(2, 1), (2, 1)]
+    assert (tmp_path / "out_2.jsonl").read_text(encoding="utf-8") == (tmp_path / "out_1.jsonl").read_text(encoding="utf-8")
+
+def test_rerun_over_a_rewritten_file_keeps_shifted_lines(tmp_path):
+    index_path = str(tmp_path / "index.db")
+    path = tmp_path / "a.jsonl"
+    write_lines(path, [example(QUESTION), example("What is the time value of money?")])
+    deduplicate_jsonl_files([str(path)], str(tmp_path / "out_1.jsonl"), index_path=index_path)
+
+    write_lines(path, [example("Define the yield curve."), example("What is the time value of money?"), example(QUESTION)])
+    rerun = deduplicate_jsonl_files([str(path)], str(tmp_path / "out_2.jsonl"), index_path=index_path)
+    assert (rerun[0]["kept"], rerun[0]["exact"], rerun[0]["near"]) == (3, 0, 0)
+
+def test_bands_must_divide_the_signature(tmp_path):
+    with pytest.raises(ValueError):
+        deduplicate_jsonl_files([str(tmp_path)], str(tmp_path / "out.jsonl"), num_perm=128, bands=10)
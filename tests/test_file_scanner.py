@@ -0,0 +1,53 @@
+import os
+
+from utils.FileScanner import FileScanner
+
+def make_tree(base_dir, paths):
+    for path in paths:
+        full_path = os.path.join(base_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "wb"):
+            pass
+
+def relative(base_dir, paths):
+    return [os.path.relpath(path, base_dir).replace(os.sep, "/") for path in paths]
+
+def test_require_matches_the_file_name_only(tmp_path):
+    base_dir = tmp_path / "slides_export"
+    make_tree(base_dir, ["deck/slide_1.png", "deck/thumbnail.png", "slide_decks/cover.png", "deck/slide_2.svg"])
+
+    scanner = FileScanner((".png",), require=("slide",))
+    assert relative(base_dir, scanner.walk(str(base_dir))) == ["deck/slide_1.png"]
+    assert scanner.filtered == 3
+
+def test_excluded_subtrees_are_skipped(tmp_path):
+    make_tree(tmp_path, ["course/lecture.mp4", "course/deskshare/screen.mp4", "course/lecture_deskshare.webm", "course/notes.txt"])
+
+    scanner = FileScanner((".mp4", ".webm"), exclude=("deskshare",))
+    assert relative(tmp_path, scanner.walk(str(tmp_path))) == ["course/lecture.mp4"]
+
+def test_walk_order_is_stable(tmp_path):
+    make_tree(tmp_path, ["b/slide_2.png", "a/slide_9.png", "slide_1.png", "a/c/slide_3.png"])
+
+    scanner = FileScanner((".png",), require=("slide",), max_workers=4)
+    assert relative(tmp_path, scanner.walk(str(tmp_path))) == ["slide_1.png", "a/slide_9.png", "a/c/slide_3.png", "b/slide_2.png"]
+
+def test_unchanged_directories_are_reused_from_the_index(tmp_path, monkeypatch):
+    base_dir = tmp_path / "presentation"
+    make_tree(base_dir, ["deck/slide_1.png", "deck/slide_2.png"])
+    monkeypatch.setattr(FileScanner, "RACY_SECONDS", -1)
+    index_path = str(tmp_path / "index.db")
+
+    scanner = FileScanner((".png",), require=("slide",), index_path=index_path)
+    first = list(scanner.walk(str(base_dir)))
+    scanner.close()
+
+    scanner = FileScanner((".png",), require=("slide",), index_path=index_path)
+    assert list(scanner.walk(str(base_dir))) == first
+    assert (scanner.listed, scanner.reused) == (0, 2)
+    scanner.close()
+
+    scanner = FileScanner((".png",), index_path=index_path)
+    list(scanner.walk(str(base_dir)))
+    assert scanner.reused == 0
+    scanner.close()
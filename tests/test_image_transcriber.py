@@ -0,0 +1,101 @@
+import asyncio
+import os
+import types
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+requests = pytest.importorskip("requests")
+
+from models.AzureImageTranscriber import AzureImageTranscriber
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def http_error(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.HTTPError(f"{status_code} error", response=response)
+
+def completion(content):
+    return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+class FakeCompletions:
+    def __init__(self, batch_outcome):
+        """
+        :param batch_outcome: The response content or exception of the multi-image request. Single-image
+                              requests answer with the number of the image.
+        """
+        self.batch_outcome = batch_outcome
+        self.image_counts = []
+
+    def __call__(self, messages, image_count=1):
+        self.image_counts.append(image_count)
+        if image_count == 1:
+            return completion(f"slide {messages[1]['content'][0]['image']}")
+        if isinstance(self.batch_outcome, Exception):
+            raise self.batch_outcome
+        return completion(self.batch_outcome)
+
+    async def create_async(self, messages, image_count=1):
+        return self(messages, image_count)
+
+@pytest.fixture
+def transcriber(tmp_path, monkeypatch):
+    monkeypatch.chdir(REPO_ROOT)
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://openai.example")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "key")
+    monkeypatch.setenv("API_VERSION", "2024-06-01")
+    transcriber = AzureImageTranscriber(str(tmp_path / "transcripts"))
+    monkeypatch.setattr(transcriber, "encode_image", lambda path: os.path.basename(path))
+    return transcriber
+
+def images(tmp_path, count):
+    return [str(tmp_path / f"slide_{index}.png") for index in range(1, count + 1)]
+
+def test_split_batch_response(transcriber):
+    content = "===== IMAGE 1 =====\nfirst\n\n== image 2 ==\nsecond\n===== IMAGE 3 =====\n\n===== IMAGE 9 =====\nextra"
+    assert transcriber.split_batch_response(content, 3) == {1: "first", 2: "second"}
+
+def test_split_batch_response_drops_duplicated_images(transcriber):
+    content = "===== IMAGE 1 =====\nfirst\n===== IMAGE 2 =====\nsecond\n===== IMAGE 1 =====\nagain"
+    assert transcriber.split_batch_response(content, 2) == {2: "second"}
+    assert transcriber.split_batch_response(None, 2) == {}
+
+def test_missing_transcripts_fall_back_to_single_requests(transcriber, tmp_path, monkeypatch):
+    fake = FakeCompletions("===== IMAGE 1 =====\nfirst\n===== IMAGE 3 =====\nthird")
+    monkeypatch.setattr(transcriber, "create_completion", fake)
+    paths = images(tmp_path, 3)
+
+    results = transcriber.transcribe_images(paths, 1)
+    assert results == {paths[0]: "first", paths[1]: "slide slide_2.png", paths[2]: "third"}
+    assert fake.image_counts == [3, 1]
+    with open(transcriber.create_output_txt_path(paths[1]), encoding="utf-8") as file:
+        assert file.read() == "slide slide_2.png"
+
+@pytest.mark.parametrize("error", [http_error(400), http_error(413), ValueError("no choices")])
+def test_failed_batch_request_falls_back_to_single_requests(transcriber, tmp_path, monkeypatch, error):
+    fake = FakeCompletions(error)
+    monkeypatch.setattr(transcriber, "create_completion", fake)
+    paths = images(tmp_path, 2)
+
+    results = transcriber.transcribe_images(paths, 1)
+    assert results == {paths[0]: "slide slide_1.png", paths[1]: "slide slide_2.png"}
+    assert fake.image_counts == [2, 1, 1]
+
+def test_rate_limited_batch_request_is_raised(transcriber, tmp_path, monkeypatch):
+    fake = FakeCompletions(http_error(429))
+    monkeypatch.setattr(transcriber, "create_completion", fake)
+
+    with pytest.raises(requests.HTTPError):
+        transcriber.transcribe_images(images(tmp_path, 2), 1)
+    assert fake.image_counts == [2]
+
+def test_failed_async_batch_request_falls_back_to_single_requests(transcriber, tmp_path, monkeypatch):
+    fake = FakeCompletions(http_error(400))
+    monkeypatch.setattr(transcriber, "create_completion_async", fake.create_async)
+    paths = images(tmp_path, 2)
+
+    results = asyncio.run(transcriber.transcribe_images_async(paths, 1))
+    assert results == {paths[0]: "slide slide_1.png", paths[1]: "slide slide_2.png"}
+    assert fake.image_counts == [2, 1, 1]
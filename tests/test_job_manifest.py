@@ -0,0 +1,73 @@
+import pytest
+
+from memory.JobManifest import JobManifest
+
+@pytest.fixture
+def manifest(tmp_path):
+    manifest = JobManifest(str(tmp_path / "manifest.db"))
+    yield manifest
+    manifest.close()
+
+def test_done_stage_is_skipped_after_reopening(tmp_path):
+    db_path = str(tmp_path / "manifest.db")
+    source = str(tmp_path / "lecture.mp4")
+    manifest = JobManifest(db_path)
+    manifest.mark_started(source, "convert")
+    manifest.mark_done(source, "convert", output_path=str(tmp_path / "lecture.wav"))
+    manifest.close()
+
+    manifest = JobManifest(db_path)
+    assert manifest.is_done(source, "convert")
+    assert not manifest.is_done(source, "transcribe")
+    assert manifest.get(source, "convert")["output_path"].endswith("lecture.wav")
+    manifest.close()
+
+def test_failed_stage_is_not_done(manifest, tmp_path):
+    source = str(tmp_path / "notes.txt")
+    manifest.mark_started(source, "generate")
+    manifest.mark_failed(source, "generate", ValueError("content filter"))
+
+    entry = manifest.get(source, "generate")
+    assert entry["status"] == "failed"
+    assert entry["error"] == "content filter"
+    assert not manifest.is_done(source, "generate")
+
+def test_interrupted_stage_is_not_done(manifest, tmp_path):
+    source = str(tmp_path / "notes.txt")
+    manifest.mark_started(source, "generate")
+    assert manifest.get(source, "generate")["status"] == "running"
+    assert not manifest.is_done(source, "generate")
+
+def test_retry_counts_attempts_and_clears_error(manifest, tmp_path):
+    source = str(tmp_path / "notes.txt")
+    manifest.mark_started(source, "generate")
+    manifest.mark_failed(source, "generate", "timeout")
+    manifest.mark_started(source, "generate")
+
+    entry = manifest.get(source, "generate")
+    assert entry["attempts"] == 2
+    assert entry["error"] is None
+    manifest.mark_done(source, "generate")
+    assert manifest.is_done(source, "generate")
+
+def test_paths_are_normalised(manifest, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    manifest.mark_done("sub/../notes.txt", "generate")
+    assert manifest.is_done(str(tmp_path / "notes.txt"), "generate")
+
+def test_sync_outputs_records_existing_transcripts(manifest, tmp_path):
+    transcripts = tmp_path / "transcripts"
+    transcripts.mkdir()
+    (transcripts / "lecture_1.txt").write_text("hello", encoding="utf-8")
+    (transcripts / "lecture_1.wav").write_bytes(b"")
+
+    assert manifest.sync_outputs(str(transcripts)) == 1
+    assert manifest.has_transcript(str(tmp_path / "lecture_1.mp4"), str(transcripts), "lecture_1.txt")
+    assert not manifest.has_transcript(str(tmp_path / "lecture_2.mp4"), str(transcripts), "lecture_2.txt")
+
+def test_content_hash_changes_with_content(tmp_path):
+    path = tmp_path / "clip.bin"
+    path.write_bytes(b"a" * 100)
+    first = JobManifest.content_hash(str(path), sample_size=16)
+    path.write_bytes(b"a" * 99 + b"b")
+    assert JobManifest.content_hash(str(path), sample_size=16) != first
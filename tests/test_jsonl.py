@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+pytest.importorskip("orjson")
+
+from utils.jsonl import filter_jsonl_file, find_jsonl_files, merge_jsonl_files, summarize, validate_record
+
+def example(answer="answer"):
+    return {"messages": [{"role": "system", "content": "system"}, {"role": "user", "content": "question"}, {"role": "assistant", "content": answer}]}
+
+REJECTED_LINES = {
+    "invalid_json": '{"messages": [',
+    "not_an_object": '["messages"]',
+    "missing_messages": '{"prompt": "question"}',
+    "wrong_message_count": json.dumps({"messages": example()["messages"][:2]}),
+    "wrong_roles": json.dumps({"messages": list(reversed(example()["messages"]))}),
+    "invalid_content": json.dumps({"messages": example()["messages"][:2] + [{"role": "assistant", "content": None}]}),
+}
+
+@pytest.mark.parametrize("reason", sorted(set(REJECTED_LINES) - {"invalid_json"}))
+def test_each_structure_reject_reason(reason):
+    assert validate_record(json.loads(REJECTED_LINES[reason])) == reason
+
+def test_valid_example():
+    assert validate_record(example()) is None
+
+def write_lines(path, lines, bom=False):
+    path.write_bytes((b'\xef\xbb\xbf' if bom else b'') + "\n".join(lines).encode("utf-8") + b"\n")
+
+def test_filter_counts_every_line(tmp_path):
+    input_path = tmp_path / "data.jsonl"
+    output_path = tmp_path / "valid.jsonl"
+    write_lines(input_path, [json.dumps(example("first")), "", *REJECTED_LINES.values(), json.dumps(example("second"))], bom=True)
+
+    stats = filter_jsonl_file(str(input_path), str(output_path))
+    assert (stats["lines"], stats["valid"], stats["blank"], stats["rejected"]) == (9, 2, 1, 6)
+    assert all(stats[reason] == 1 for reason in REJECTED_LINES)
+    assert [json.loads(line)["messages"][2]["content"] for line in output_path.read_text(encoding="utf-8").splitlines()] == ["first", "second"]
+
+def test_without_validation_only_json_is_checked(tmp_path):
+    input_path = tmp_path / "data.jsonl"
+    write_lines(input_path, list(REJECTED_LINES.values()))
+    stats = filter_jsonl_file(str(input_path), validate=False)
+    assert (stats["valid"], stats["invalid_json"]) == (5, 1)
+
+def test_merge_keeps_input_order_and_skips_its_own_output(tmp_path):
+    for index in range(3):
+        write_lines(tmp_path / f"part_{index}.jsonl", [json.dumps(example(f"{index}-{line}")) for line in range(2)] + ["not json"])
+    output_path = tmp_path / "merged.jsonl"
+    output_path.write_text(json.dumps(example("previous run")) + "\n", encoding="utf-8")
+
+    all_stats = merge_jsonl_files([str(tmp_path)], str(output_path), workers=2)
+    assert [stats["file"] for stats in all_stats] == find_jsonl_files([str(tmp_path / "part_*.jsonl")])
+    contents = [json.loads(line)["messages"][2]["content"] for line in output_path.read_text(encoding="utf-8").splitlines()]
+    assert contents == ["0-0", "0-1", "1-0", "1-1", "2-0", "2-1"]
+
+    totals = summarize(all_stats)
+    assert (totals["files"], totals["lines"], totals["valid"], totals["rejected"], totals["invalid_json"]) == (3, 9, 6, 3, 3)
+    assert not [path for path in tmp_path.iterdir() if path.name.startswith(".merge_parts_")]
@@ -0,0 +1,98 @@
+import asyncio
+import threading
+
+import pytest
+
+from utils.RateLimiter import RateLimiter
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("utils.RateLimiter.time.time", clock)
+    return clock
+
+@pytest.fixture
+def limiter(tmp_path, clock):
+    limiter = RateLimiter(str(tmp_path / "rate_limit.db"), requests_per_minute=60, tokens_per_minute=6000, default_retry_delay=30)
+    yield limiter
+    limiter.close()
+
+def test_refill_is_capped_at_one_minute_of_quota():
+    assert RateLimiter._refill(None, 60, 0) == 60.0
+    assert RateLimiter._refill(10.0, 60, 5) == 15.0
+    assert RateLimiter._refill(10.0, 60, 600) == 60.0
+    assert RateLimiter._refill(10.0, None, 5) is None
+
+def test_empty_bucket_reports_the_wait_for_the_missing_quota(limiter, clock):
+    for _ in range(60):
+        assert limiter.try_acquire() == 0
+    assert limiter.try_acquire() == pytest.approx(1.0)
+
+    clock.now += 1.0
+    assert limiter.try_acquire() == 0
+
+def test_token_bucket_waits_for_the_missing_tokens(limiter, clock):
+    assert limiter.try_acquire(5000) == 0
+    assert limiter.try_acquire(2000) == pytest.approx(10.0)
+    clock.now += 10.0
+    assert limiter.try_acquire(2000) == 0
+
+def test_requests_larger_than_the_quota_are_capped(limiter):
+    assert limiter.try_acquire(10 ** 6) == 0
+
+def test_state_is_shared_through_the_file(limiter, tmp_path):
+    other = RateLimiter(str(tmp_path / "rate_limit.db"), requests_per_minute=60, tokens_per_minute=6000)
+    for _ in range(30):
+        limiter.try_acquire()
+        other.try_acquire()
+    assert other.try_acquire() > 0
+    other.close()
+
+def test_penalize_blocks_every_worker_and_empties_the_buckets(limiter, clock):
+    assert limiter.penalize() == 30
+    assert limiter.try_acquire() == pytest.approx(30.0)
+
+    # Quota only refills once the block has ended
+    clock.now += 30.0
+    assert limiter.try_acquire() == pytest.approx(1.0)
+    clock.now += 1.0
+    assert limiter.try_acquire() == 0
+
+def test_penalize_honours_retry_after(limiter):
+    error = Exception("429")
+    error.response = type("Response", (), {"headers": {"retry-after-ms": "2500"}})()
+    assert limiter.penalize(error) == 2.5
+
+def test_headers_lower_the_buckets_and_block_when_exhausted(limiter, clock):
+    limiter.update_from_headers({"x-ratelimit-remaining-requests": "0", "x-ratelimit-reset-requests": "6m0s"})
+    assert limiter.try_acquire() == pytest.approx(360.0)
+
+@pytest.mark.parametrize("value, seconds", [("20", 20.0), ("1s", 1.0), ("250ms", 0.25), ("6m0s", 360.0), ("1h2m", 3720.0), ("soon", None), (None, None)])
+def test_parse_duration(value, seconds):
+    assert RateLimiter.parse_duration(value) == seconds
+
+def test_async_calls_run_the_transaction_off_the_event_loop(limiter, monkeypatch):
+    threads = []
+    transaction = limiter._transaction
+
+    def record_thread(update):
+        threads.append(threading.current_thread())
+        return transaction(update)
+
+    monkeypatch.setattr(limiter, "_transaction", record_thread)
+
+    async def run():
+        await limiter.acquire_async(10)
+        await limiter.update_from_headers_async({"x-ratelimit-remaining-tokens": "100"})
+        return await limiter.penalize_async()
+
+    assert asyncio.run(run()) == 30
+    assert len(threads) == 3
+    assert threading.main_thread() not in threads
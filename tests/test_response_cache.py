@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from memory.ResponseCache import ResponseCache
+
+@pytest.fixture
+def clock(monkeypatch):
+    ticks = iter(range(1, 1000))
+    monkeypatch.setattr("memory.ResponseCache.time.time", lambda: next(ticks))
+
+def last_used(db_path, key):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute("SELECT last_used FROM responses WHERE key = ?", (key,)).fetchone()[0]
+
+def test_key_changes_with_any_part_of_the_request():
+    key = ResponseCache.make_key("gpt-4o", "system", "user", 4096)
+    assert key == ResponseCache.make_key("gpt-4o", "system", "user", 4096)
+    assert key != ResponseCache.make_key("gpt-4o", "system", "user", 2048)
+    assert key != ResponseCache.make_key("gpt-4o-mini", "system", "user", 4096)
+
+def test_hits_are_written_in_batches(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(ResponseCache, "TOUCH_BATCH", 3)
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path)
+    for key in "abc":
+        cache.put(key, key * 4)
+    stored = last_used(db_path, "a")
+
+    assert cache.get("a") == "aaaa"
+    assert cache.get("b") == "bbbb"
+    assert cache.get("a") == "aaaa"
+    assert last_used(db_path, "a") == stored
+    assert cache.get("c") == "cccc"
+    assert last_used(db_path, "a") > stored
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 4, "misses": 1, "hit_rate": 0.8}
+    cache.close()
+
+def test_pending_hits_count_for_eviction(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "cache.db"), max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("b", "bbbb")
+    assert cache.get("a") == "aaaa"
+    cache.put("c", "cccc")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa"
+    assert cache.get("c") == "cccc"
+    cache.close()
+
+def test_size_total_survives_replacements_and_reopening(tmp_path, clock):
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path, max_bytes=10)
+    cache.put("a", "aaaa")
+    cache.put("a", "aa")
+    cache.put("b", "bbbbbbbb")
+    assert cache.get("a") == "aa"
+    cache.close()
+
+    cache = ResponseCache(db_path, max_bytes=10)
+    cache.put("c", "c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "aa"
+    cache.close()
+
+def test_close_writes_pending_hits(tmp_path, clock):
+    db_path = str(tmp_path / "cache.db")
+    cache = ResponseCache(db_path)
+    cache.put("a", "first")
+    stored = last_used(db_path, "a")
+    cache.get("a")
+    cache.close()
+    assert last_used(db_path, "a") > stored
@@ -0,0 +1,53 @@
+import os
+
+from memory.ShardClaims import ShardClaims
+from utils.sharding import shard_files, shard_key, shard_of
+
+def corpus(base_dir, count=40):
+    return [os.path.join(base_dir, f"deck_{index // 10}", f"slide_{index % 10}.png") for index in range(count)]
+
+def test_shard_key_is_relative_to_the_base_directory(tmp_path):
+    path = os.path.join(str(tmp_path), "deck_1", "slide_2.png")
+    assert shard_key(path, str(tmp_path)) == "deck_1/slide_2.png"
+    assert shard_key("https://blob.example/a.wav", str(tmp_path)) == "https://blob.example/a.wav"
+    assert shard_key(path) == path
+
+def test_assignment_is_stable_across_mount_points():
+    first = [shard_of(path, "/mnt/a", 4) for path in corpus("/mnt/a")]
+    second = [shard_of(path, "/data/corpus", 4) for path in corpus("/data/corpus")]
+    assert first == second
+    assert set(first) == {0, 1, 2, 3}
+
+def test_static_shards_partition_the_corpus():
+    files = corpus("/corpus")
+    shards = [list(shard_files(files, "/corpus", index, 3)) for index in range(3)]
+    assert sorted(path for shard in shards for path in shard) == sorted(files)
+    assert sum(len(shard) for shard in shards) == len(files)
+
+def test_claims_are_exclusive_but_resumable(tmp_path):
+    claims_dir = str(tmp_path / "claims")
+    first = ShardClaims(claims_dir, node_id="node-a")
+    second = ShardClaims(claims_dir, node_id="node-b")
+
+    assert first.claim("deck_0/slide_0.png")
+    assert not second.claim("deck_0/slide_0.png")
+    assert ShardClaims(claims_dir, node_id="node-a").claim("deck_0/slide_0.png")
+    assert (first.claimed, second.claimed) == (1, 0)
+
+def test_idle_node_steals_unclaimed_files_from_the_end(tmp_path):
+    files = corpus("/corpus")
+    claims_dir = str(tmp_path / "claims")
+    owned = [path for path in files if shard_of(path, "/corpus", 2) == 1]
+
+    stealer = list(shard_files(files, "/corpus", 0, 2, ShardClaims(claims_dir, node_id="node-a")))
+    stolen = stealer[len(files) - len(owned):]
+    assert stolen == sorted(owned, key=lambda path: shard_key(path, "/corpus"), reverse=True)
+    assert list(shard_files(files, "/corpus", 1, 2, ShardClaims(claims_dir, node_id="node-b"))) == []
+
+def test_claims_are_only_taken_as_files_are_consumed(tmp_path):
+    claims = ShardClaims(str(tmp_path / "claims"), node_id="node-a")
+    generator = shard_files(corpus("/corpus"), "/corpus", 0, 1, claims)
+    next(generator)
+    next(generator)
+    assert claims.claimed == 2
+    assert len(os.listdir(claims.claims_dir)) == 2
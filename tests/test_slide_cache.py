@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from memory.SlideCache import SlideCache
+
+def flip_bits(perceptual_hash, positions):
+    value = int(perceptual_hash, 16)
+    for position in positions:
+        value ^= 1 << position
+    return f"{value:0{len(perceptual_hash)}x}"
+
+@pytest.fixture
+def hashes(monkeypatch):
+    """
+    Maps image paths to fake content and perceptual hashes, so no image has to be rendered.
+    """
+    hashes = {}
+    monkeypatch.setattr(SlideCache, "content_hash", staticmethod(lambda path: hashes[path][0]))
+    monkeypatch.setattr(SlideCache, "perceptual_hash", staticmethod(lambda path: hashes[path][1]))
+    return hashes
+
+def test_bands_cover_every_bit_once():
+    cache = SlideCache.__new__(SlideCache)
+    cache.max_hash_distance = 6
+    perceptual_hash = f"{random.Random(1).getrandbits(256):064x}"
+
+    bands = cache.hash_bands(perceptual_hash)
+    assert [band for band, _ in bands] == list(range(7))
+    value = 0
+    for (_, band_value), width in zip(bands, [37] * 4 + [36] * 3):
+        value = (value << width) | int(band_value, 16)
+    assert value == int(perceptual_hash, 16)
+
+def test_near_identical_slide_is_found_through_its_bands(tmp_path, hashes):
+    base = f"{random.Random(2).getrandbits(256):064x}"
+    hashes["a.png"] = ("a", base)
+    hashes["b.png"] = ("b", flip_bits(base, [0, 40, 80, 120, 160, 200]))
+    hashes["c.png"] = ("c", flip_bits(base, range(0, 256, 36)))
+    cache = SlideCache(str(tmp_path / "cache.db"), use_perceptual_hash=True, max_hash_distance=6)
+
+    cache.put("a.png", "slide a")
+    assert cache.get("b.png") == "slide a"
+    assert cache.get("c.png") is None
+    assert cache.stats()["near_hits"] == 1
+    cache.close()
+
+def test_bands_are_rebuilt_when_the_distance_changes(tmp_path, hashes):
+    base = f"{random.Random(3).getrandbits(256):064x}"
+    hashes["a.png"] = ("a", base)
+    hashes["b.png"] = ("b", flip_bits(base, range(0, 256, 26)))
+    db_path = str(tmp_path / "cache.db")
+
+    cache = SlideCache(db_path, use_perceptual_hash=True, max_hash_distance=2)
+    cache.put("a.png", "slide a")
+    assert cache.get("b.png") is None
+    cache.close()
+
+    cache = SlideCache(db_path, use_perceptual_hash=True, max_hash_distance=10)
+    assert cache.get("b.png") == "slide a"
+    cache.close()
+
+def test_least_recently_used_slides_are_evicted(tmp_path, hashes, monkeypatch):
+    for name in "abc":
+        hashes[f"{name}.png"] = (name, None)
+    clock = iter(range(100))
+    monkeypatch.setattr("time.time", lambda: next(clock))
+    db_path = str(tmp_path / "cache.db")
+
+    cache = SlideCache(db_path, max_bytes=10)
+    cache.put("a.png", "aaaa")
+    cache.put("b.png", "bbbb")
+    assert cache.get("a.png") == "aaaa"
+    cache.put("c.png", "cccc")
+    assert cache.get("b.png") is None
+    assert cache.get("a.png") == "aaaa"
+    cache.put("c.png", "cc")
+    cache.close()
+
+    cache = SlideCache(db_path, max_bytes=10)
+    assert cache._total_size == 6
+    cache.close()
@@ -0,0 +1,112 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from benchmarks import fake_speechsdk
+
+fake_speechsdk.install()
+
+from models.AzureSpeechTranscriber import AzureSpeechTranscriber
+
+@pytest.fixture
+def fast_speech(monkeypatch):
+    monkeypatch.setitem(fake_speechsdk.options, "latency", 0.0)
+    monkeypatch.setitem(fake_speechsdk.options, "latency_sigma", 0.0)
+    monkeypatch.setitem(fake_speechsdk.options, "real_time_factor", 1e6)
+
+def make_segments(tmp_path, count):
+    segment_paths = []
+    for index in range(count):
+        segment_path = tmp_path / f"lecture_segment_{index:03d}.wav"
+        segment_path.write_bytes(b"\0" * 4000)
+        segment_paths.append(str(segment_path))
+    return segment_paths
+
+def test_recognition_raises_once_every_attempt_failed(tmp_path, fast_speech, monkeypatch):
+    monkeypatch.setitem(fake_speechsdk.options, "rate_limit_ratio", 1.0)
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    transcriber = AzureSpeechTranscriber("en-US", output_folder=str(tmp_path / "transcripts"))
+    segment_path = make_segments(tmp_path, 1)[0]
+
+    with pytest.raises(RuntimeError, match="after 3 attempts"):
+        transcriber.recognize_segments(fake_speechsdk.AudioConfig(filename=segment_path))
+
+def test_failed_segment_fails_the_whole_file(tmp_path, fast_speech, monkeypatch):
+    transcriber = AzureSpeechTranscriber("en-US", output_folder=str(tmp_path / "transcripts"))
+    recognize_attempts = transcriber.recognize_attempts
+
+    def fail_second_segment(audio_config, max_retries=None):
+        if audio_config.filename.endswith("_001.wav"):
+            raise RuntimeError("Recognition failed after 3 attempts: 429")
+        return recognize_attempts(audio_config, max_retries)
+
+    monkeypatch.setattr(transcriber, "recognize_attempts", fail_second_segment)
+    wav_path = str(tmp_path / "lecture.wav")
+
+    with pytest.raises(RuntimeError):
+        transcriber.transcribe_segmented(wav_path, make_segments(tmp_path, 3), max_workers=3)
+    assert not (tmp_path / "transcripts" / "lecture.txt").exists()
+
+def test_segments_are_stitched_in_order(tmp_path, fast_speech):
+    transcriber = AzureSpeechTranscriber("en-US", output_folder=str(tmp_path / "transcripts"))
+    transcript_path = transcriber.transcribe_segmented(str(tmp_path / "lecture.wav"), make_segments(tmp_path, 3), max_workers=3)
+    with open(transcript_path, encoding="utf-8") as file:
+        assert len(file.read().splitlines()) == 3
+
+def test_sessions_are_capped_across_workers(tmp_path, monkeypatch):
+    transcriber = AzureSpeechTranscriber("en-US", output_folder=str(tmp_path / "transcripts"), max_sessions=2)
+    open_sessions = []
+    peak = []
+    lock = threading.Lock()
+
+    def recognize_attempts(audio_config, max_retries=None):
+        with lock:
+            open_sessions.append(audio_config)
+            peak.append(len(open_sessions))
+        time.sleep(0.02)
+        with lock:
+            open_sessions.remove(audio_config)
+        return ["lorem"]
+
+    monkeypatch.setattr(transcriber, "recognize_attempts", recognize_attempts)
+    workers = []
+    for worker in range(3):
+        segment_paths = make_segments(tmp_path, 4)
+        wav_path = str(tmp_path / f"lecture_{worker}.wav")
+        workers.append(threading.Thread(target=transcriber.transcribe_segmented, args=(wav_path, segment_paths), kwargs={"max_workers": 4}))
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert len(peak) == 12
+    assert max(peak) == 2
+
+class RecordingStream:
+    """
+    Serves silent PCM audio and records the size and thread of every read.
+    """
+    def __init__(self, size):
+        self.remaining = size
+        self.reads = []
+
+    def read(self, size):
+        self.reads.append((size, threading.current_thread()))
+        size = min(size, self.remaining)
+        self.remaining -= size
+        return b"\0" * size
+
+def test_stream_is_read_by_the_speech_service_as_it_recognizes(tmp_path, fast_speech):
+    transcriber = AzureSpeechTranscriber("en-US", output_folder=str(tmp_path / "transcripts"))
+    # 40 seconds of 16kHz mono 16-bit audio
+    stream = RecordingStream(16000 * 2 * 40)
+    transcript_path = transcriber.transcribe_stream(stream, str(tmp_path / "transcripts" / "lecture.txt"))
+
+    assert stream.remaining == 0
+    assert all(size <= fake_speechsdk.PullAudioInputStream.READ_SIZE for size, _ in stream.reads)
+    assert threading.current_thread() not in {thread for _, thread in stream.reads}
+    with open(transcript_path, encoding="utf-8") as file:
+        assert len(file.read().splitlines()) == 3
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("orjson")
+pytest.importorskip("tiktoken")
+
+from utils import token_stats
+
+EXAMPLES = [
+    {"messages": [{"role": "system", "content": "You answer CFA questions."},
+                  {"role": "user", "content": "What is duration?"},
+                  {"role": "assistant", "content": "Duration measures the price sensitivity of a bond to yields."}]},
+    {"messages": [{"role": "system", "content": "ตอบคำถามเป็นภาษาไทย"},
+                  {"role": "user", "name": "student", "content": "อัตราดอกเบี้ยคืออะไร"},
+                  {"role": "assistant", "content": "อัตราดอกเบี้ยคือต้นทุนของการกู้ยืมเงิน"}]},
+    {"messages": [{"role": "user", "content": "No system prompt here."},
+                  {"role": "assistant", "content": "First answer."},
+                  {"role": "user", "content": "Follow up?"},
+                  {"role": "assistant", "content": "Second answer."}]},
+]
+
+def notebook_counts(messages, encode):
+    """
+    num_tokens_from_messages and num_assistant_tokens_from_messages as written in finetune.ipynb.
+    """
+    num_tokens = 0
+    for message in messages:
+        num_tokens += 3
+        for key, value in message.items():
+            num_tokens += len(encode(value))
+            if key == "name":
+                num_tokens += 1
+    num_tokens += 3
+    assistant_tokens = sum(len(encode(message["content"])) for message in messages if message["role"] == "assistant")
+    return num_tokens, assistant_tokens
+
+@pytest.fixture
+def word_tokens(monkeypatch):
+    """
+    Counts words instead of tokens, so the counting logic can be checked without downloading an encoding. Only
+    reaches code running in this process, so any pool started while it is in use fails the test.
+    """
+    monkeypatch.setattr(token_stats, "count_tokens", lambda text, encoding_name=None: len(text.split()))
+    monkeypatch.setattr(token_stats, "Pool", None)
+    return str.split
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_counts_match_the_notebook_with_o200k(example, o200k_encoding):
+    expected = notebook_counts(example["messages"], o200k_encoding.encode)
+    assert token_stats.count_message_tokens(example["messages"], "o200k_base") == expected
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_counts_match_the_notebook_formula(example, word_tokens):
+    assert token_stats.count_message_tokens(example["messages"]) == notebook_counts(example["messages"], word_tokens)
+
+def test_dataset_stats_and_cache(tmp_path, word_tokens):
+    path = tmp_path / "training_set.jsonl"
+    lines = [json.dumps(example, ensure_ascii=False) for example in EXAMPLES] + [json.dumps(EXAMPLES[0]), "not json", "", '{"prompt": "x"}']
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    cache_path = str(tmp_path / "token_counts.db")
+    expected = np.array([notebook_counts(example["messages"], word_tokens) for example in EXAMPLES + [EXAMPLES[0]]])
+
+    stats = token_stats.compute_token_stats(str(path), cache_path=cache_path, workers=1, batch_size=2, max_tokens=30)
+    assert (stats["examples"], stats["skipped"]) == (4, 2)
+    assert stats["total_tokens"]["max"] == expected[:, 0].max()
+    assert stats["assistant_tokens"]["mean"] == pytest.approx(expected[:, 1].mean())
+    assert stats["over_limit"] == int((expected[:, 0] > 30).sum())
+    assert stats["billing_tokens_per_epoch"] == int(np.minimum(expected[:, 0], 30).sum())
+    assert stats["billing_tokens"] == stats["billing_tokens_per_epoch"] * stats["epochs"]
+
+    rerun = token_stats.compute_token_stats(str(path), cache_path=cache_path, workers=1, batch_size=2, max_tokens=30)
+    assert rerun["total_tokens"] == stats["total_tokens"]
+    # Only the lines that are not examples are looked up again, as they have no counts to cache
+    assert (rerun["cache"]["hits"], rerun["cache"]["misses"]) == (4, 2)
+
+@pytest.mark.parametrize("n_examples, epochs", [(10, 10), (1, 25), (1000, 3), (10000, 2), (100000, 1)])
+def test_estimate_epochs(n_examples, epochs):
+    assert token_stats.estimate_epochs(n_examples) == epochs
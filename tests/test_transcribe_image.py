@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import os
+import queue
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("PIL")
+
+import transcribe_image
+from models.AzureImageTranscriber import AzureImageTranscriber
+
+class RecordingManifest:
+    """
+    Records the thread every manifest call is made from.
+    """
+    def __init__(self):
+        self.calls = []
+
+    def _record(self, name, png_path):
+        self.calls.append((name, png_path, threading.current_thread()))
+
+    def mark_started(self, png_path, stage):
+        self._record("started", png_path)
+
+    def mark_done(self, png_path, stage, output_path=None):
+        self._record("done", png_path)
+
+    def mark_failed(self, png_path, stage, error):
+        self._record("failed", png_path)
+
+class FakeTranscriber:
+    is_rate_limit_error = staticmethod(AzureImageTranscriber.is_rate_limit_error)
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+
+    def create_output_txt_path(self, image_file_path):
+        return image_file_path + ".txt"
+
+    async def transcribe_image_async(self, image_file_path, job_id):
+        if image_file_path in self.failing:
+            raise ValueError("content filter")
+        return "text"
+
+    async def transcribe_images_async(self, image_file_paths, job_id):
+        return {path: ValueError("content filter") if path in self.failing else "text" for path in image_file_paths}
+
+class FakeMemoryManager:
+    def del_temp_audio(self, path):
+        pass
+
+@pytest.fixture(autouse=True)
+def error_logger(monkeypatch):
+    monkeypatch.setattr(transcribe_image, "error_logger", logging.getLogger("test_errors"), raising=False)
+
+def images(tmp_path, names):
+    paths = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(b"png")
+        paths.append(str(path))
+    return paths
+
+def run_async_worker(jobs, transcriber, manifest):
+    transcription_queue = queue.Queue()
+    for job in jobs + [None]:
+        transcription_queue.put(job)
+    asyncio.run(transcribe_image.transcribe_images_async(transcription_queue, transcriber, FakeMemoryManager(), manifest, max_concurrency=4))
+
+def test_async_worker_keeps_manifest_calls_off_the_event_loop(tmp_path):
+    first, second, third, fourth = images(tmp_path, ["1.png", "2.png", "3.png", "4.png"])
+    manifest = RecordingManifest()
+    jobs = [(1, first, first), (2, second, second), [(3, third, third), (4, fourth, fourth)]]
+
+    run_async_worker(jobs, FakeTranscriber(failing={second, fourth}), manifest)
+
+    outcomes = {(name, path) for name, path, _ in manifest.calls}
+    assert outcomes == {("started", path) for path in (first, second, third, fourth)} | {("done", first), ("failed", second), ("done", third), ("failed", fourth)}
+    assert threading.main_thread() not in [thread for _, _, thread in manifest.calls]
+
+class RateLimitedOnce:
+    """
+    Fails the first request with a 429, then transcribes.
+    """
+    is_rate_limit_error = staticmethod(AzureImageTranscriber.is_rate_limit_error)
+
+    def __init__(self):
+        self.calls = 0
+
+    def create_output_txt_path(self, image_file_path):
+        return image_file_path + ".txt"
+
+    def _request(self):
+        self.calls += 1
+        if self.calls == 1:
+            error = Exception("429 Too Many Requests")
+            error.response = type("Response", (), {"status_code": 429})()
+            raise error
+
+    def transcribe_image(self, image_file_path, job_id):
+        self._request()
+        return "text"
+
+    def transcribe_images(self, image_file_paths, job_id):
+        self._request()
+        return {path: "text" for path in image_file_paths}
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_rate_limited_job_is_retried_before_the_termination_signal(tmp_path, batched):
+    first, second = images(tmp_path, ["1.png", "2.png"])
+    jobs = [(1, first, first), (2, second, second)]
+    transcription_queue = queue.Queue()
+    transcription_queue.put(jobs if batched else jobs[0])
+    if not batched:
+        transcription_queue.put(jobs[1])
+    transcription_queue.put(None)
+    manifest = RecordingManifest()
+    transcriber = RateLimitedOnce()
+
+    transcribe_image.transcribe_image_task(transcription_queue, transcriber, FakeMemoryManager(), manifest)
+
+    assert {path for name, path, _ in manifest.calls if name == "done"} == {first, second}
+    assert transcription_queue.empty()
+
+def drain(batch_queue):
+    batches = []
+    while not batch_queue.empty():
+        batches.append(batch_queue.get())
+    return batches
+
+def test_small_decks_are_sent_while_slides_keep_arriving():
+    transcription_queue = queue.Queue()
+    batch_queue = queue.Queue()
+    collector = threading.Thread(target=transcribe_image.collect_image_batches, args=(transcription_queue, batch_queue, 4, 1))
+    collector.start()
+    job_id = 0
+    for deck in range(50):
+        for slide in range(3):
+            job_id += 1
+            transcription_queue.put((job_id, f"/slides/deck_{deck}/{slide}.png", f"/copies/deck_{deck}/{slide}.png"))
+
+    # Every deck but the last two is sent without waiting for the termination signal or the timeout
+    deadline = time.monotonic() + 5
+    while batch_queue.qsize() < 48 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    batches = drain(batch_queue)
+    assert len(batches) == 48
+    assert all(len(batch) == 3 and len({os.path.dirname(path) for _, path, _ in batch}) == 1 for batch in batches)
+
+    transcription_queue.put(None)
+    collector.join()
+    assert [len(batch) for batch in drain(batch_queue)[:-1]] == [3, 3]
+
+def test_partial_batch_is_sent_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(transcribe_image, "BATCH_COLLECT_TIMEOUT", 0.05)
+    transcription_queue = queue.Queue()
+    batch_queue = queue.Queue()
+    collector = threading.Thread(target=transcribe_image.collect_image_batches, args=(transcription_queue, batch_queue, 4, 1))
+    collector.start()
+    transcription_queue.put((1, "/slides/deck/1.png", "/copies/deck/1.png"))
+    transcription_queue.put((2, "/slides/deck/2.png", "/copies/deck/2.png"))
+
+    assert len(batch_queue.get(timeout=5)) == 2
+    transcription_queue.put(None)
+    collector.join()
+    assert batch_queue.get_nowait() is None
+
+class NoResponse(FakeTranscriber):
+    """
+    Fails every request with an error that has a response attribute but no response, like a connection error.
+    """
+    def transcribe_image(self, image_file_path, job_id):
+        error = Exception("connection reset")
+        error.response = None
+        raise error
+
+def test_error_without_a_response_fails_the_job_not_the_worker(tmp_path):
+    first, second = images(tmp_path, ["1.png", "2.png"])
+    transcription_queue = queue.Queue()
+    for job in [(1, first, first), (2, second, second), None]:
+        transcription_queue.put(job)
+    manifest = RecordingManifest()
+
+    transcribe_image.transcribe_image_task(transcription_queue, NoResponse(), FakeMemoryManager(), manifest)
+
+    assert {path for name, path, _ in manifest.calls if name == "failed"} == {first, second}
@@ -1,8 +1,11 @@
 from datetime import datetime
 import logging
 import os
-import time
 import argparse
+import asyncio
+import queue
+import socket
+import time
 from dotenv import load_dotenv
 
 import threading
@@ -10,14 +13,28 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from preprocessors.PNGCollater import PNGCollater
+from preprocessors.ImageOptimizer import ImageOptimizer
 from models.AzureImageTranscriber import AzureImageTranscriber
 from memory.MemoryManagement import MemoryManager
+from memory.JobManifest import JobManifest
+from memory.SlideCache import SlideCache
+from memory.ShardClaims import ShardClaims
+from utils.RateLimiter import RateLimiter
+from utils.sharding import shard_files
+from utils.FileScanner import FileScanner
+from utils.Metrics import metrics
+from utils.EventLog import events
 
 load_dotenv()
 
 MAX_CONVERT_WORKERS = 2
 MAX_TRANSCRIBE_WORKERS = os.cpu_count() * 2
-RETRY_DELAY = 60  # Delay in seconds before retrying transcription after rate limit error
+MAX_ASYNC_CONCURRENCY = 100  # Default number of in-flight requests in asyncio mode
+SLIDE_CACHE_MAX_MB = 512  # Default size limit of the cached slide transcripts
+BATCH_COLLECT_TIMEOUT = 30  # Delay in seconds before sending a partially filled multi-image request
+RETRY_DELAY = 60  # Delay in seconds before retrying transcription after a rate limit error without Retry-After
+MAX_QUEUED_FILES = MAX_TRANSCRIBE_WORKERS * 2  # Capacity of the queues between file discovery, copying and transcription
+DISCOVERY_WORKERS = 8  # Number of directories listed at once during file discovery
 
 job_counter = threading.Lock()
 job_id = 0
@@ -68,7 +85,7 @@ def generate_job_id():
         job_id += 1
         return job_id
 
-def copy_png_image_task(png_path, collater, transcription_queue, job_id, transcript_directory):
+def copy_png_image_task(png_path, collater, transcription_queue, job_id, transcript_directory, manifest):
     """
     Task to copy PNG images to the output directory.
 
@@ -77,54 +94,333 @@ def copy_png_image_task(png_path, collater, transcription_queue, job_id, transcr
     :param transcription_queue: Queue to add tasks for transcription.
     :param job_id: Unique job ID.
     :param transcript_directory: Directory containing transcript files.
+    :param manifest: Instance of JobManifest.
     :return: Path to the copied image or a status message.
     """
     global error_logger
     try:
-        output_image_path = collater.copy_png_image(png_path, transcript_directory)
+        # Resume from a previous run if the image was copied but never transcribed
+        previous = manifest.get(png_path, "copy")
+        if previous and previous["status"] == "done" and previous["output_path"] and os.path.exists(previous["output_path"]) and not manifest.is_done(png_path, "transcribe"):
+            logging.info(f"[JOB_ID_{job_id}]: [COPY RESUMED] Reusing {previous['output_path']} from a previous run")
+            events.emit("resumed", "copy", job_id, png_path, output_path=previous["output_path"])
+            transcription_queue.put((job_id, png_path, previous["output_path"]))
+            return previous["output_path"]
+
+        started_at = time.time()
+        events.emit("started", "copy", job_id, png_path)
+        with metrics.stage("copy"):
+            manifest.mark_started(png_path, "copy", JobManifest.content_hash(png_path))
+            output_image_path = collater.copy_png_image(png_path, transcript_directory)
         if output_image_path:  # Only add to the queue if the image was copied
+            manifest.mark_done(png_path, "copy", output_image_path)
+            metrics.inc("jobs_total", stage="copy", status="success")
+            metrics.inc("bytes_processed_total", os.path.getsize(output_image_path), stage="copy")
+            events.emit("copied", "copy", job_id, png_path, started_at, output_path=output_image_path, bytes=os.path.getsize(output_image_path))
             logging.info(f"[JOB_ID_{job_id}]: [COPY SUCCESS] Copied {png_path} to {output_image_path}")
-            transcription_queue.put((job_id, output_image_path))  # Put the result into the transcription queue
+            if collater.image_optimizer is not None:
+                original_size, optimized_size = os.path.getsize(png_path), os.path.getsize(output_image_path)
+                logging.info(f"[JOB_ID_{job_id}]: [PAYLOAD] Optimized {png_path} from {original_size / 1024:.0f} KB to {optimized_size / 1024:.0f} KB")
+            transcription_queue.put((job_id, png_path, output_image_path))  # Put the result into the transcription queue
             return output_image_path
         else:
+            manifest.mark_skipped(png_path, "copy")
+            metrics.inc("jobs_total", stage="copy", status="skipped")
+            events.emit("skipped", "copy", job_id, png_path, started_at)
             logging.info(f"[JOB_ID_{job_id}]: [COPY SKIPPED] Skipped copying for {png_path} as it already has a transcript/it is not a slide")
             return "Skipped"
     except Exception as e:
+        manifest.mark_failed(png_path, "copy", e)
+        metrics.inc("jobs_total", stage="copy", status="failed")
+        events.emit("failed", "copy", job_id, png_path, error=str(e))
         logging.error(f"[JOB_ID_{job_id}]: [COPY FAILED] Failed to copy {png_path}: {e}")
         error_logger.error(f"[JOB_ID_{job_id}]: Failed to copy {png_path}: {e}")
         return f"Failed: {e}"
 
-def transcribe_image_task(transcription_queue, azure_image_transcriber, memory_manager):
+def collect_image_batches(transcription_queue, batch_queue, images_per_request, consumers):
+    """
+    Groups transcription jobs of slides from the same deck into batches for multi-image requests. A deck's partial
+    batch is sent once jobs from a newer deck arrive, as decks are discovered one at a time, or at the latest
+    BATCH_COLLECT_TIMEOUT seconds after its first job.
+
+    :param transcription_queue: Queue to retrieve tasks for transcription.
+    :param batch_queue: Queue the batches are put on, as lists of jobs. Batches of one image are put as a single job.
+    :param images_per_request: Maximum number of images per request.
+    :param consumers: Number of workers reading the batch queue, each sent a termination signal at the end.
+    """
+    pending = {}
+    first_job_at = {}
+    last_deck = None
+
+    def send(deck):
+        batch = pending.pop(deck)
+        del first_job_at[deck]
+        batch_queue.put(batch if len(batch) > 1 else batch[0])
+
+    while True:
+        now = time.monotonic()
+        for deck in [deck for deck, started in first_job_at.items() if now - started >= BATCH_COLLECT_TIMEOUT]:
+            send(deck)
+
+        try:
+            timeout = BATCH_COLLECT_TIMEOUT - (now - min(first_job_at.values())) if first_job_at else None
+            job = transcription_queue.get(timeout=timeout)
+        except queue.Empty:
+            continue
+
+        if job is None:
+            logging.info("[BATCH COLLECTOR END] Received termination signal, sending the remaining batches.")
+            break
+
+        # Slides exported from the same deck share a directory
+        deck = os.path.dirname(job[1])
+        if deck not in pending:
+            # The conversion workers can still be finishing the previous deck, so only older decks are sent
+            for other in [other for other in pending if other != last_deck]:
+                send(other)
+            pending[deck] = []
+            first_job_at[deck] = time.monotonic()
+        pending[deck].append(job)
+        last_deck = deck
+        if len(pending[deck]) >= images_per_request:
+            send(deck)
+
+    for deck in list(pending):
+        send(deck)
+    for _ in range(consumers):
+        batch_queue.put(None)
+
+def finish_image_batch(batch, results, azure_image_transcriber, memory_manager, manifest, started_at):
+    """
+    Records the outcome of every image of a multi-image request.
+
+    :param batch: List of transcription jobs.
+    :param results: Dictionary mapping each image path to its transcript or to the exception explaining why it has none.
+    :param azure_image_transcriber: Instance of AzureImageTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    :param started_at: Unix time the request was first sent.
+    """
+    global error_logger
+    job_ids = f"{batch[0][0]}-{batch[-1][0]}"
+    for job_id, png_path, image_file_path in batch:
+        result = results[image_file_path]
+        if isinstance(result, Exception):
+            manifest.mark_failed(png_path, "transcribe", result)
+            metrics.inc("jobs_total", stage="transcribe", status="failed")
+            events.emit("failed", "transcribe", job_id, png_path, started_at, error=str(result), batch=job_ids)
+            logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {image_file_path} : {result}")
+            error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Error during transcription : {result}")
+            continue
+
+        manifest.mark_done(png_path, "transcribe", azure_image_transcriber.create_output_txt_path(image_file_path))
+        metrics.inc("jobs_total", stage="transcribe", status="success")
+        metrics.inc("bytes_processed_total", os.path.getsize(image_file_path), stage="transcribe")
+        events.emit("transcribed", "transcribe", job_id, png_path, started_at, output_path=azure_image_transcriber.create_output_txt_path(image_file_path), batch=job_ids)
+        logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE SUCCESS] Transcribed and saved result for {image_file_path}")
+        memory_manager.del_temp_audio(image_file_path)
+        events.emit("deleted", "transcribe", job_id, png_path, output_path=image_file_path)
+        logging.info(f"[JOB_ID_{job_id}]: [MEMORY MANAGEMENT] Deleted temporary file {image_file_path}")
+
+def transcribe_image_batch(batch, azure_image_transcriber, memory_manager, manifest):
+    """
+    Transcribes a batch of images from the same deck in one multi-image request.
+
+    :param batch: List of transcription jobs.
+    :param azure_image_transcriber: Instance of AzureImageTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    :return: True if the request hit the rate limit and the batch has to be retried, otherwise False.
     """
-    Task to transcribe images using Azure.
+    global error_logger
+    job_ids = f"{batch[0][0]}-{batch[-1][0]}"
+    started_at = time.time()
+    try:
+        for job_id, png_path, _ in batch:
+            manifest.mark_started(png_path, "transcribe")
+            events.emit("started", "transcribe", job_id, png_path, batch=job_ids)
+        with metrics.stage("transcribe_batch"):
+            results = azure_image_transcriber.transcribe_images([image_file_path for _, _, image_file_path in batch], job_ids)
+    except Exception as e:
+        if azure_image_transcriber.is_rate_limit_error(e):
+            metrics.inc("jobs_total", len(batch), stage="transcribe", status="rate_limited")
+            # The shared rate limiter holds back every worker until the Retry-After delay has passed
+            logging.error(f"[JOB_ID_{job_ids}]: [RATE LIMIT EXCEEDED] Rate limit error for a batch of {len(batch)} images. Retrying.")
+            for job_id, png_path, _ in batch:
+                events.emit("retried", "transcribe", job_id, png_path, started_at, error=str(e), batch=job_ids)
+            return True
+        results = {image_file_path: e for _, _, image_file_path in batch}
+    finish_image_batch(batch, results, azure_image_transcriber, memory_manager, manifest, started_at)
+    return False
+
+def transcribe_image_task(transcription_queue, azure_image_transcriber, memory_manager, manifest):
+    """
+    Task to transcribe images using Azure. Jobs that hit the rate limit are retried by the same worker, since a job
+    put back on the queue could land behind the termination signals and never be picked up.
 
     :param transcription_queue: Queue to retrieve tasks for transcription.
     :param azure_image_transcriber: Instance of AzureImageTranscriber.
     :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
     """
     global error_logger
+    retry_job = None
     while True:
-        job = transcription_queue.get()
+        job = retry_job if retry_job is not None else transcription_queue.get()
+        retry_job = None
         if job is None:
             logging.info("[TRANSCRIBE END] Received termination signal, exiting transcription worker.")
             break
 
-        job_id, image_file_path = job
+        if isinstance(job, list):
+            if transcribe_image_batch(job, azure_image_transcriber, memory_manager, manifest):
+                retry_job = job
+            continue
+
+        job_id, png_path, image_file_path = job
+        started_at = time.time()
         try:
-            azure_image_transcriber.transcribe_image(image_file_path, job_id)
+            manifest.mark_started(png_path, "transcribe")
+            events.emit("started", "transcribe", job_id, png_path)
+            with metrics.stage("transcribe"):
+                azure_image_transcriber.transcribe_image(image_file_path, job_id)
+            manifest.mark_done(png_path, "transcribe", azure_image_transcriber.create_output_txt_path(image_file_path))
+            metrics.inc("jobs_total", stage="transcribe", status="success")
+            metrics.inc("bytes_processed_total", os.path.getsize(image_file_path), stage="transcribe")
+            events.emit("transcribed", "transcribe", job_id, png_path, started_at, output_path=azure_image_transcriber.create_output_txt_path(image_file_path))
             logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE SUCCESS] Transcribed and saved result for {image_file_path}")
             memory_manager.del_temp_audio(image_file_path)
+            events.emit("deleted", "transcribe", job_id, png_path, output_path=image_file_path)
             logging.info(f"[JOB_ID_{job_id}]: [MEMORY MANAGEMENT] Deleted temporary file {image_file_path}")
         except Exception as e:
-            if hasattr(e, 'response') and e.response.status_code == 429:
-                logging.error(f"[JOB_ID_{job_id}]: [RATE LIMIT EXCEEDED] Rate limit error for {image_file_path}. Re-adding to queue after delay.")
-                time.sleep(RETRY_DELAY)
-                transcription_queue.put(job)
-                logging.info(f"[JOB_ID_{job_id}]: [RETRY] Re-added task to queue after rate limit error for {image_file_path}")
+            if azure_image_transcriber.is_rate_limit_error(e):
+                # The shared rate limiter holds back every worker until the Retry-After delay has passed
+                metrics.inc("jobs_total", stage="transcribe", status="rate_limited")
+                logging.error(f"[JOB_ID_{job_id}]: [RATE LIMIT EXCEEDED] Rate limit error for {image_file_path}. Retrying.")
+                events.emit("retried", "transcribe", job_id, png_path, started_at, error=str(e))
+                retry_job = job
+                logging.info(f"[JOB_ID_{job_id}]: [RETRY] Retrying after rate limit error for {image_file_path}")
             else:
+                manifest.mark_failed(png_path, "transcribe", e)
+                metrics.inc("jobs_total", stage="transcribe", status="failed")
+                events.emit("failed", "transcribe", job_id, png_path, started_at, error=str(e))
                 logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {image_file_path} : {e}")
                 error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Error during transcription : {e}")
 
+async def transcribe_image_async_task(job, azure_image_transcriber, memory_manager, manifest):
+    """
+    Coroutine to transcribe a single image using Azure, retrying in place after rate limit errors.
+
+    :param job: Tuple of the job ID, source PNG path and copied image path, or a list of such jobs for a multi-image request.
+    :param azure_image_transcriber: Instance of AzureImageTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    """
+    global error_logger
+    if isinstance(job, list):
+        await transcribe_image_batch_async_task(job, azure_image_transcriber, memory_manager, manifest)
+        return
+
+    job_id, png_path, image_file_path = job
+    started_at = time.time()
+    # The manifest and temporary file calls touch SQLite and the disk, so they run in the default executor
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            await loop.run_in_executor(None, manifest.mark_started, png_path, "transcribe")
+            events.emit("started", "transcribe", job_id, png_path)
+            with metrics.stage("transcribe"):
+                await azure_image_transcriber.transcribe_image_async(image_file_path, job_id)
+            await loop.run_in_executor(None, manifest.mark_done, png_path, "transcribe", azure_image_transcriber.create_output_txt_path(image_file_path))
+            metrics.inc("jobs_total", stage="transcribe", status="success")
+            metrics.inc("bytes_processed_total", os.path.getsize(image_file_path), stage="transcribe")
+            events.emit("transcribed", "transcribe", job_id, png_path, started_at, output_path=azure_image_transcriber.create_output_txt_path(image_file_path))
+            logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE SUCCESS] Transcribed and saved result for {image_file_path}")
+            await loop.run_in_executor(None, memory_manager.del_temp_audio, image_file_path)
+            events.emit("deleted", "transcribe", job_id, png_path, output_path=image_file_path)
+            logging.info(f"[JOB_ID_{job_id}]: [MEMORY MANAGEMENT] Deleted temporary file {image_file_path}")
+            return
+        except Exception as e:
+            if azure_image_transcriber.is_rate_limit_error(e):
+                # The shared rate limiter holds back every request until the Retry-After delay has passed
+                metrics.inc("jobs_total", stage="transcribe", status="rate_limited")
+                logging.error(f"[JOB_ID_{job_id}]: [RATE LIMIT EXCEEDED] Rate limit error for {image_file_path}. Retrying.")
+                events.emit("retried", "transcribe", job_id, png_path, started_at, error=str(e))
+                logging.info(f"[JOB_ID_{job_id}]: [RETRY] Retrying after rate limit error for {image_file_path}")
+            else:
+                await loop.run_in_executor(None, manifest.mark_failed, png_path, "transcribe", e)
+                metrics.inc("jobs_total", stage="transcribe", status="failed")
+                events.emit("failed", "transcribe", job_id, png_path, started_at, error=str(e))
+                logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {image_file_path} : {e}")
+                error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Error during transcription : {e}")
+                return
+
+async def transcribe_image_batch_async_task(batch, azure_image_transcriber, memory_manager, manifest):
+    """
+    Coroutine to transcribe a batch of images from the same deck in one multi-image request, retrying in place after rate limit errors.
+
+    :param batch: List of transcription jobs.
+    :param azure_image_transcriber: Instance of AzureImageTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    """
+    job_ids = f"{batch[0][0]}-{batch[-1][0]}"
+    started_at = time.time()
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            for job_id, png_path, _ in batch:
+                await loop.run_in_executor(None, manifest.mark_started, png_path, "transcribe")
+                events.emit("started", "transcribe", job_id, png_path, batch=job_ids)
+            with metrics.stage("transcribe_batch"):
+                results = await azure_image_transcriber.transcribe_images_async([image_file_path for _, _, image_file_path in batch], job_ids)
+            break
+        except Exception as e:
+            if azure_image_transcriber.is_rate_limit_error(e):
+                metrics.inc("jobs_total", len(batch), stage="transcribe", status="rate_limited")
+                # The shared rate limiter holds back every request until the Retry-After delay has passed
+                logging.error(f"[JOB_ID_{job_ids}]: [RATE LIMIT EXCEEDED] Rate limit error for a batch of {len(batch)} images. Retrying.")
+                for job_id, png_path, _ in batch:
+                    events.emit("retried", "transcribe", job_id, png_path, started_at, error=str(e), batch=job_ids)
+                continue
+            results = {image_file_path: e for _, _, image_file_path in batch}
+            break
+    await loop.run_in_executor(None, finish_image_batch, batch, results, azure_image_transcriber, memory_manager, manifest, started_at)
+
+async def transcribe_images_async(transcription_queue, azure_image_transcriber, memory_manager, manifest, max_concurrency):
+    """
+    Async entry point that keeps up to max_concurrency transcription requests in flight from a single thread.
+
+    :param transcription_queue: Queue to retrieve tasks for transcription.
+    :param azure_image_transcriber: Instance of AzureImageTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    :param max_concurrency: Maximum number of requests in flight at once.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    tasks = set()
+
+    def on_task_done(task):
+        tasks.discard(task)
+        semaphore.release()
+
+    while True:
+        # Only pull the next job once a slot is free, so the queue provides backpressure
+        await semaphore.acquire()
+        job = await loop.run_in_executor(None, transcription_queue.get)
+        if job is None:
+            semaphore.release()
+            logging.info("[TRANSCRIBE END] Received termination signal, waiting for in-flight transcriptions.")
+            break
+
+        task = asyncio.create_task(transcribe_image_async_task(job, azure_image_transcriber, memory_manager, manifest))
+        tasks.add(task)
+        task.add_done_callback(on_task_done)
+
+    if tasks:
+        await asyncio.gather(*tasks)
+
 def parse_args():
     """
     Parses command line arguments.
@@ -136,19 +432,51 @@ def parse_args():
     parser.add_argument('--output_image_dir', help='Directory to save copied PNG images', required=True)
     parser.add_argument('--output_txt_dir', help='Directory to save transcribed text', required=True)
     parser.add_argument('--logs_dir', help='Directory to save logging', required=True)
-    return parser.parse_args()
-
-def file_generator(base_dir):
+    parser.add_argument('--async_mode', help='Transcribe images with asyncio from a single thread instead of a thread pool', action='store_true')
+    parser.add_argument('--max_concurrency', help=f'Maximum number of in-flight requests in asyncio mode (default {MAX_ASYNC_CONCURRENCY})', type=int, default=MAX_ASYNC_CONCURRENCY)
+    parser.add_argument('--requests_per_minute', help='Request quota per minute shared by all workers (default: only throttle on rate limit headers)', type=int, default=None)
+    parser.add_argument('--tokens_per_minute', help='Token quota per minute shared by all workers (default: only throttle on rate limit headers)', type=int, default=None)
+    parser.add_argument('--rate_limit_state', help='SQLite file holding the shared rate limiter state (defaults to <output_txt_dir>/transcribe_image_rate_limit.db)', default=None)
+    parser.add_argument('--optimize_images', help='Downscale, strip metadata and optionally re-encode images before upload instead of copying them as they are', action='store_true')
+    parser.add_argument('--max_image_dimension', help='Maximum width or height of optimized images in pixels (default 2048)', type=int, default=2048)
+    parser.add_argument('--image_format', help='Format of optimized images: "png" (lossless), "jpeg" or "webp"', choices=['png', 'jpeg', 'webp'], default='png')
+    parser.add_argument('--image_quality', help='Quality of optimized JPEG/WebP images from 1 to 100 (default 90)', type=int, default=90)
+    parser.add_argument('--grayscale', help='Convert optimized images to grayscale: "auto" when they have no colour, "always" or "never"', choices=['auto', 'always', 'never'], default='auto')
+    parser.add_argument('--images_per_request', help='Pack up to this many slides from the same deck into one request, falling back to single-image requests for any transcript that cannot be split out (default 1)', type=int, default=1)
+    parser.add_argument('--slide_cache', help='SQLite cache of transcripts keyed by image content, shared across runs (defaults to <output_txt_dir>/slide_cache.db)', default=None)
+    parser.add_argument('--disable_slide_cache', help='Transcribe every image even if an identical slide was transcribed before', action='store_true')
+    parser.add_argument('--slide_cache_max_mb', help=f'Size limit of the cached transcripts in MB, least recently used entries are evicted beyond it (default {SLIDE_CACHE_MAX_MB})', type=int, default=SLIDE_CACHE_MAX_MB)
+    parser.add_argument('--perceptual_hash', help='Also reuse transcripts of near-identical renders of a slide, matched by perceptual hash', action='store_true')
+    parser.add_argument('--perceptual_hash_distance', help='Maximum differing bits of two 256-bit perceptual hashes to count as the same slide (default 6)', type=int, default=6)
+    parser.add_argument('--discovery_workers', help=f'Number of directories listed at once while discovering files (default {DISCOVERY_WORKERS})', type=int, default=DISCOVERY_WORKERS)
+    parser.add_argument('--discovery_index', help='SQLite index of directory listings, so a rerun only lists directories whose mtime changed (defaults to <output_txt_dir>/transcribe_image_discovery.db)', default=None)
+    parser.add_argument('--disable_discovery_index', help='List every directory on each run instead of reusing unchanged listings', action='store_true')
+    parser.add_argument('--manifest_path', help='SQLite job manifest used to skip finished files and resume crashed runs (defaults to <output_txt_dir>/transcribe_image_manifest.db)', default=None)
+    parser.add_argument('--events_dir', help='Directory of the structured JSONL event log of every job stage, read by report_events.py (defaults to <logs_dir>/events)', default=None)
+    parser.add_argument('--metrics_dir', help='Directory in which each process rewrites its metrics as a Prometheus textfile (defaults to <logs_dir>/metrics with --metrics_port)', default=None)
+    parser.add_argument('--metrics_port', help='Serve the metrics of all processes in the Prometheus format on this localhost port', type=int, default=None)
+    parser.add_argument('--queue_size', help=f'Capacity of the queues between file discovery, copying and transcription (default {MAX_QUEUED_FILES})', type=int, default=MAX_QUEUED_FILES)
+    parser.add_argument('--shard_index', help='Shard of the input files this node processes, from 0 to --shard_count - 1 (default 0)', type=int, default=0)
+    parser.add_argument('--shard_count', help='Number of nodes the input files are split across by a stable hash of their path under --base_dir (default 1)', type=int, default=1)
+    parser.add_argument('--shared_manifest_dir', help='Directory shared by all nodes in which files are claimed before processing, letting a node steal unclaimed files of other shards once its own are done', default=None)
+    args = parser.parse_args()
+    if args.shard_count < 1 or not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard_index must be between 0 and --shard_count - 1")
+    return args
+
+def file_generator(base_dir, scanner, manifest):
     """
-    Generator to yield PNG files from the base directory.
+    Generator to yield the PNG slides from the base directory that still need a transcript, in the same order on
+    every node. Images that are not slides and slides transcribed in a previous run are left out before they are queued.
 
     :param base_dir: Base directory containing PNG files.
+    :param scanner: Instance of FileScanner.
+    :param manifest: Instance of JobManifest.
     :yield: Paths to PNG files.
     """
-    for root, _, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith('.png'):
-                yield os.path.join(root, file)
+    for png_path in scanner.walk(base_dir):
+        if not manifest.is_done(png_path, "transcribe"):
+            yield png_path
 
 def conversion_worker(args):
     """
@@ -156,24 +484,35 @@ def conversion_worker(args):
 
     :param args: Arguments for the conversion worker.
     """
-    file_queue, output_image_dir, output_txt_dir, transcription_queue, logs_dir = args
+    file_queue, output_image_dir, output_txt_dir, transcription_queue, logs_dir, manifest_path, optimizer_args, telemetry_options = args
+    metrics_dir, events_dir, run_id = telemetry_options
     global error_logger
     error_logger = setup_logging(logs_dir)
+    metrics.configure(pipeline="transcribe_image", process="conversion")
+    metrics.start_exporting(metrics_dir)
+    events.configure(events_dir, pipeline="transcribe_image", run_id=run_id, process="conversion")
     
-    collater = PNGCollater(output_directory=output_image_dir)
-    logging.info("[CONVERTER INITIALISATION] Initialised PNG Collater")
+    manifest = JobManifest(manifest_path)
+    image_optimizer = ImageOptimizer(*optimizer_args) if optimizer_args is not None else None
+    collater = PNGCollater(output_directory=output_image_dir, manifest=manifest, image_optimizer=image_optimizer)
+    logging.info(f"[CONVERTER INITIALISATION] Initialised PNG Collater{' with image optimization' if image_optimizer else ''}")
+
+    # Only take a file off the queue once a worker is nearly free, so the bounded file queue holds back discovery
+    slots = threading.BoundedSemaphore(MAX_CONVERT_WORKERS * 2)
 
     with ThreadPoolExecutor(max_workers=MAX_CONVERT_WORKERS) as executor:
         futures = []
 
         while True:
+            slots.acquire()
             png_path = file_queue.get()
             if png_path is None:
                 logging.info("[CONVERSION END] Received termination signal in conversion worker, exiting.")
                 break
 
             job_id = generate_job_id()
-            future = executor.submit(copy_png_image_task, png_path, collater, transcription_queue, job_id, output_txt_dir)
+            future = executor.submit(copy_png_image_task, png_path, collater, transcription_queue, job_id, output_txt_dir, manifest)
+            future.add_done_callback(lambda _: slots.release())
             futures.append(future)
 
         # Wait for all futures to complete
@@ -184,8 +523,13 @@ def conversion_worker(args):
             else:
                 logging.info(f"Successfully copied file to: {result}")
 
+    if image_optimizer is not None:
+        stats = image_optimizer.stats()
+        logging.info(f"[PAYLOAD] Optimized {stats['images']} images from {stats['original_bytes'] / 1024 ** 2:.1f} MB to {stats['optimized_bytes'] / 1024 ** 2:.1f} MB ({stats['saved']:.1%} saved)")
+    manifest.close()
+    metrics.stop_exporting()
+    events.close()
     logging.info("[CONVERSION COMPLETE] All conversion tasks are complete.")
-    transcription_queue.put(None)  # Signal to terminate transcription workers
 
 def transcription_worker(args):
     """
@@ -193,23 +537,56 @@ def transcription_worker(args):
 
     :param args: Arguments for the transcription worker.
     """
-    transcription_queue, output_txt_dir, logs_dir = args
+    transcription_queue, output_txt_dir, logs_dir, manifest_path, async_mode, max_concurrency, rate_limit_args, slide_cache_args, images_per_request, telemetry_options = args
+    metrics_dir, events_dir, run_id = telemetry_options
     global error_logger
     error_logger = setup_logging(logs_dir)
+    metrics.configure(pipeline="transcribe_image", process="transcription")
+    metrics.start_exporting(metrics_dir)
+    events.configure(events_dir, pipeline="transcribe_image", run_id=run_id, process="transcription")
+    manifest = JobManifest(manifest_path)
+    rate_limiter = RateLimiter(*rate_limit_args, default_retry_delay=RETRY_DELAY)
+    
+    slide_cache = None
+    if slide_cache_args is not None:
+        slide_cache_path, slide_cache_max_mb, use_perceptual_hash, perceptual_hash_distance = slide_cache_args
+        slide_cache = SlideCache(slide_cache_path, max_bytes=slide_cache_max_mb * 1024 * 1024, use_perceptual_hash=use_perceptual_hash, max_hash_distance=perceptual_hash_distance)
     
-    azure_image_transcriber = AzureImageTranscriber(output_txt_dir=output_txt_dir)
-    logging.info("[TRANSCRIBER INITIALISATION] Initialised Azure Image Transcriber")
+    azure_image_transcriber = AzureImageTranscriber(output_txt_dir=output_txt_dir, rate_limiter=rate_limiter, slide_cache=slide_cache)
+    logging.info(f"[TRANSCRIBER INITIALISATION] Initialised Azure Image Transcriber{' with slide cache ' + slide_cache.db_path if slide_cache else ''}")
     memory_manager = MemoryManager()
 
-    transcribe_threads = []
-    for _ in range(MAX_TRANSCRIBE_WORKERS):
-        thread = threading.Thread(target=transcribe_image_task, args=(transcription_queue, azure_image_transcriber, memory_manager))
-        thread.start()
-        transcribe_threads.append(thread)
-
-    for thread in transcribe_threads:
-        thread.join()
-
+    if images_per_request > 1:
+        # Workers read batches of slides from the same deck instead of single jobs
+        logging.info(f"[TRANSCRIBER INITIALISATION] Packing up to {images_per_request} slides from the same deck into each request")
+        batch_queue = queue.Queue()
+        collector = threading.Thread(target=collect_image_batches, args=(transcription_queue, batch_queue, images_per_request, 1 if async_mode else MAX_TRANSCRIBE_WORKERS))
+        collector.start()
+        transcription_queue = batch_queue
+
+    if async_mode:
+        logging.info(f"[TRANSCRIBER INITIALISATION] Running in asyncio mode with up to {max_concurrency} requests in flight")
+        asyncio.run(transcribe_images_async(transcription_queue, azure_image_transcriber, memory_manager, manifest, max_concurrency))
+    else:
+        transcribe_threads = []
+        for _ in range(MAX_TRANSCRIBE_WORKERS):
+            thread = threading.Thread(target=transcribe_image_task, args=(transcription_queue, azure_image_transcriber, memory_manager, manifest))
+            thread.start()
+            transcribe_threads.append(thread)
+
+        for thread in transcribe_threads:
+            thread.join()
+
+    if images_per_request > 1:
+        collector.join()
+    if slide_cache is not None:
+        stats = slide_cache.stats()
+        logging.info(f"[SLIDE CACHE] {stats['hits']} hits, {stats['near_hits']} near-identical hits, {stats['misses']} misses ({stats['hit_rate']:.1%} hit rate)")
+        slide_cache.close()
+    manifest.close()
+    rate_limiter.close()
+    metrics.stop_exporting()
+    events.close()
     logging.info("[TRANSCRIPTION COMPLETE] All transcription tasks are complete.")
 
 def main():
@@ -222,18 +599,54 @@ def main():
     output_image_dir = args.output_image_dir
     output_txt_dir = args.output_txt_dir
     logs_dir = args.logs_dir
+    manifest_path = args.manifest_path or os.path.join(output_txt_dir, "transcribe_image_manifest.db")
+    rate_limit_state = args.rate_limit_state or os.path.join(output_txt_dir, "transcribe_image_rate_limit.db")
+    slide_cache_args = None
+    if not args.disable_slide_cache:
+        slide_cache_args = (args.slide_cache or os.path.join(output_txt_dir, "slide_cache.db"), args.slide_cache_max_mb, args.perceptual_hash, args.perceptual_hash_distance)
 
     os.makedirs(output_txt_dir, exist_ok=True)
 
     setup_logging(logs_dir)  # Initial logging setup
-    logging.info("Collecting PNG files to process.")
 
-    transcription_queue = multiprocessing.Queue()
-    file_queue = multiprocessing.Queue()
+    shard_claims = None
+    if args.shared_manifest_dir:
+        shard_claims = ShardClaims(args.shared_manifest_dir, node_id=f"{socket.gethostname()}_shard_{args.shard_index}")
+    if args.shard_count > 1 or shard_claims is not None:
+        logging.info(f"[SHARDING] Processing shard {args.shard_index} of {args.shard_count}{', stealing unclaimed files from ' + args.shared_manifest_dir if shard_claims else ''}")
+
+    # Record existing transcripts once so skip checks are indexed lookups
+    manifest = JobManifest(manifest_path)
+    logging.info(f"[MANIFEST] Recorded {manifest.sync_outputs(output_txt_dir)} existing transcripts in {manifest_path}")
+
+    logging.info("Collecting PNG files to process.")
+    discovery_index = None if args.disable_discovery_index else (args.discovery_index or os.path.join(output_txt_dir, "transcribe_image_discovery.db"))
+    scanner = FileScanner(('.png',), require=('slide',), index_path=discovery_index, max_workers=args.discovery_workers)
+
+    # Bounded queues keep file discovery and copying only a few files ahead of transcription
+    transcription_queue = multiprocessing.Queue(maxsize=args.queue_size)
+    file_queue = multiprocessing.Queue(maxsize=args.queue_size)
+
+    # The main process serves the metrics endpoint, merging in the textfiles of the worker processes
+    metrics_dir = args.metrics_dir or (os.path.join(logs_dir, "metrics") if args.metrics_port else None)
+    metrics.configure(pipeline="transcribe_image", process="main")
+    metrics.set_callback("queue_depth", file_queue.qsize, queue="file")
+    metrics.set_callback("queue_depth", transcription_queue.qsize, queue="transcription")
+    metrics.start_exporting(metrics_dir, args.metrics_port)
+    if args.metrics_port:
+        logging.info(f"[METRICS] Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+    events_dir = args.events_dir or os.path.join(logs_dir, "events")
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    events.configure(events_dir, pipeline="transcribe_image", run_id=run_id, process="main")
+    telemetry_options = (metrics_dir, events_dir, run_id)
 
     # Start the workers
-    transcription_args = (transcription_queue, output_txt_dir, logs_dir)
-    conversion_args = (file_queue, output_image_dir, output_txt_dir, transcription_queue, logs_dir)
+    rate_limit_args = (rate_limit_state, args.requests_per_minute, args.tokens_per_minute)
+    transcription_args = (transcription_queue, output_txt_dir, logs_dir, manifest_path, args.async_mode, args.max_concurrency, rate_limit_args, slide_cache_args, args.images_per_request, telemetry_options)
+    optimizer_args = None
+    if args.optimize_images:
+        optimizer_args = (args.max_image_dimension, args.image_format, args.image_quality, args.grayscale)
+    conversion_args = (file_queue, output_image_dir, output_txt_dir, transcription_queue, logs_dir, manifest_path, optimizer_args, telemetry_options)
     
     transcription_process = multiprocessing.Process(target=transcription_worker, args=(transcription_args,))
     conversion_process = multiprocessing.Process(target=conversion_worker, args=(conversion_args,))
@@ -243,8 +656,14 @@ def main():
     conversion_process.start()
 
     # Add files to the file queue using the generator
-    for png_file in file_generator(base_dir):
+    queued = 0
+    for png_file in shard_files(file_generator(base_dir, scanner, manifest), base_dir, args.shard_index, args.shard_count, shard_claims):
+        events.emit("discovered", "discover", path=png_file)
         file_queue.put(png_file)
+        queued += 1
+    logging.info(f"[DISCOVERY] Queued {queued} files after listing {scanner.listed} directories and reusing {scanner.reused} unchanged listings ({scanner.filtered} files filtered out)")
+    manifest.close()
+    scanner.close()
 
     # Add termination signals to close the conversion worker
     file_queue.put(None)
@@ -252,12 +671,16 @@ def main():
     # Wait for the conversion process to finish
     conversion_process.join()
 
-    # Add termination signals to close the transcription workers
-    for _ in range(MAX_TRANSCRIBE_WORKERS):
+    # Add one termination signal per reader of the transcription queue, as extra signals would fill the bounded queue
+    # with nobody left to read them. The async loop and the batch collector read it alone, otherwise every thread does
+    transcription_consumers = 1 if args.async_mode or args.images_per_request > 1 else MAX_TRANSCRIBE_WORKERS
+    for _ in range(transcription_consumers):
         transcription_queue.put(None)
 
     # Wait for the transcription process to finish
     transcription_process.join()
+    metrics.stop_exporting()
+    events.close()
 
     logging.info("[PROGRAM COMPLETE] All tasks are complete. Terminating the program.")
 
@@ -1,27 +1,46 @@
 from datetime import datetime
 import argparse
 import os
-import time
 import logging
+import time
 import shutil
+import queue
+import socket
+import wave
 from dotenv import load_dotenv
 
 import threading
+import functools
 import multiprocessing
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from models.AzureSpeechTranscriber import AzureSpeechTranscriber
+from models.AzureBatchTranscriber import AzureBatchTranscriber, AzureBatchTranscriptionClient
 from preprocessors.VideoPreprocessor import VideoPreprocessor
+from preprocessors.AudioTrimmer import AudioTrimmer
 from memory.MemoryManagement import MemoryManager
+from memory.DiskBudget import DiskBudget
+from memory.ShardClaims import ShardClaims
+from memory.JobManifest import JobManifest
+from utils.RateLimiter import RateLimiter
 from utils.languages import LANGUAGE_MAP
+from utils.sharding import shard_files
+from utils.FileScanner import FileScanner
+from utils.Metrics import metrics
+from utils.EventLog import events
 
 load_dotenv()
 
 MAX_CONVERT_WORKERS = 2  # Set an appropriate number based on your CPU capabilities
 MAX_TRANSCRIBE_WORKERS = os.cpu_count() * 3  # Adjust for I/O-bound nature of transcription tasks
-RETRY_DELAY = 60  # Delay in seconds before retrying API call after rate limit error
-CONVERT_RETRY_DELAY = 1000  # Delay in seconds before restarting conversion
-STORAGE_THRESHOLD = 100  # Storage threshold in GB for conversion tasks
+RETRY_DELAY = 60  # Delay in seconds before retrying API call after a rate limit error without Retry-After
+DISK_BUDGET_GB = 20  # Temporary audio in GB allowed on disk before new conversions wait for transcriptions to free space
+MAX_QUEUED_FILES = MAX_TRANSCRIBE_WORKERS * 2  # Capacity of the queues between file discovery, conversion and transcription
+SEGMENT_WORKERS = 4  # Number of segments of one long file transcribed at once
+MAX_SPEECH_SESSIONS = MAX_TRANSCRIBE_WORKERS  # Recognition sessions open at once across all workers and segments
+MAX_BATCH_JOBS = 4  # Number of batch transcription jobs in flight at once
+BATCH_COLLECT_TIMEOUT = 300  # Delay in seconds before submitting a partially filled batch
+DISCOVERY_WORKERS = 8  # Number of directories listed at once during file discovery
 
 job_counter = threading.Lock()
 job_id = 0
@@ -71,7 +90,7 @@ def generate_job_id():
         job_id += 1
         return job_id
 
-def convert_video_to_wav_task(mp4_path, video_preprocessor, transcription_queue, job_id, transcription_directory):
+def convert_video_to_wav_task(mp4_path, video_preprocessor, transcription_queue, job_id, transcription_directory, manifest, stream_audio=False, audio_trimmer=None, disk_budget=None):
     """
     Task to convert MP4 video to WAV audio file.
 
@@ -80,65 +99,342 @@ def convert_video_to_wav_task(mp4_path, video_preprocessor, transcription_queue,
     :param transcription_queue: Queue to add tasks for transcription.
     :param job_id: Unique job ID.
     :param transcription_directory: Directory containing transcription files.
+    :param manifest: Instance of JobManifest.
+    :param stream_audio: Whether the audio is streamed at transcription time instead of converted to a WAV file.
+    :param audio_trimmer: Instance of AudioTrimmer to cut silence out of the converted WAV file, or None to keep it whole.
+    :param disk_budget: Instance of DiskBudget the converted audio is counted against until it is deleted, or None.
     :return: Path to the converted WAV file or a status message.
     """
     global error_logger  # Ensure error_logger is accessible within this function
     try:
-        # Check available disk space
-        while True:
-            _, _, free = shutil.disk_usage(transcription_directory)
-            free_gb = free / (1024 ** 3)
-            if free_gb < STORAGE_THRESHOLD:
-                logging.warning(f"[JOB_ID_{job_id}]: Insufficient storage. Pausing conversion process as only {free_gb:.2f} GB is available.")
-                time.sleep(CONVERT_RETRY_DELAY)
-            else:
-                break
+        # In streaming mode the transcription worker decodes the audio itself, so only the skip check runs here
+        if stream_audio:
+            if video_preprocessor.needs_transcription(mp4_path, transcription_directory):
+                logging.info(f"[JOB_ID_{job_id}]: [STREAM QUEUED] Queued {mp4_path} for streaming transcription")
+                events.emit("queued", "convert", job_id, mp4_path)
+                transcription_queue.put((job_id, mp4_path, None))
+                return mp4_path
+            manifest.mark_skipped(mp4_path, "convert")
+            metrics.inc("jobs_total", stage="convert", status="skipped")
+            events.emit("skipped", "convert", job_id, mp4_path)
+            logging.info(f"[JOB_ID_{job_id}]: [CONVERT SKIPPED] Skipped {mp4_path} as it already has a transcript")
+            return "Skipped"
+
+        # Resume from a previous run if the WAV file was converted but never transcribed
+        previous = manifest.get(mp4_path, "convert")
+        if previous and previous["status"] == "done" and previous["output_path"] and os.path.exists(previous["output_path"]) and not manifest.is_done(mp4_path, "transcribe"):
+            logging.info(f"[JOB_ID_{job_id}]: [CONVERT RESUMED] Reusing {previous['output_path']} from a previous run")
+            if disk_budget is not None:
+                disk_budget.acquire(os.path.getsize(previous["output_path"]), block=False)
+            events.emit("resumed", "convert", job_id, mp4_path, output_path=previous["output_path"])
+            transcription_queue.put((job_id, mp4_path, previous["output_path"]))
+            return previous["output_path"]
+
+        # Wait for transcriptions to free enough of the disk budget before writing more audio
+        reserved = 0
+        if disk_budget is not None and video_preprocessor.needs_transcription(mp4_path, transcription_directory):
+            reserved = video_preprocessor.estimate_audio_bytes(mp4_path)
+            waited = disk_budget.acquire(reserved)
+            if waited >= 1:
+                logging.info(f"[JOB_ID_{job_id}]: [DISK BUDGET] Waited {waited:.0f}s for {reserved / (1024 ** 2):.0f} MB of disk budget")
 
         logging.info(f"[JOB_ID_{job_id}]: Starting conversion for {mp4_path}...")
-        output_wav_path = video_preprocessor.convert_mp4_or_webm_to_wav(mp4_path, transcription_directory)
+        started_at = time.time()
+        events.emit("started", "convert", job_id, mp4_path)
+        try:
+            with metrics.stage("convert"):
+                manifest.mark_started(mp4_path, "convert", JobManifest.content_hash(mp4_path))
+                output_wav_path = video_preprocessor.convert_video_to_audio(mp4_path, transcription_directory)
+                if output_wav_path and audio_trimmer is not None:
+                    # Keep the offset map next to the transcript so times in the trimmed audio can be mapped back
+                    offsets_path = os.path.join(transcription_directory, os.path.splitext(os.path.basename(output_wav_path))[0] + ".offsets.json")
+                    offset_map = audio_trimmer.trim_wav(output_wav_path, offsets_path)
+                    logging.info(f"[JOB_ID_{job_id}]: [VAD TRIM] Kept {sum(span['duration'] for span in offset_map):.1f}s of speech in {len(offset_map)} spans from {output_wav_path}")
+        except Exception:
+            if disk_budget is not None:
+                disk_budget.release(reserved)
+            raise
+
+        output_size = os.path.getsize(output_wav_path) if output_wav_path and os.path.exists(output_wav_path) else 0
+        if disk_budget is not None:
+            # Count the file at its real size from here on, which is what del_temp_audio returns to the budget
+            disk_budget.adjust(reserved, output_size)
+
         if output_wav_path:  # Only add to the queue if conversion is successful
+            manifest.mark_done(mp4_path, "convert", output_wav_path)
+            metrics.inc("jobs_total", stage="convert", status="success")
+            metrics.inc("bytes_processed_total", output_size, stage="convert")
+            events.emit("converted", "convert", job_id, mp4_path, started_at, output_path=output_wav_path, bytes=output_size)
             logging.info(f"[JOB_ID_{job_id}]: [CONVERT SUCCESS] Converted {mp4_path} to {output_wav_path}")
-            transcription_queue.put((job_id, output_wav_path))  # Put the result into the transcription queue
+            transcription_queue.put((job_id, mp4_path, output_wav_path))  # Put the result into the transcription queue
             return output_wav_path
         else:
+            manifest.mark_skipped(mp4_path, "convert")
+            metrics.inc("jobs_total", stage="convert", status="skipped")
+            events.emit("skipped", "convert", job_id, mp4_path, started_at)
             logging.info(f"[JOB_ID_{job_id}]: [CONVERT SKIPPED] Skipped conversion for {mp4_path} as it already has a transcript")
             return "Skipped"
     except Exception as e:
+        manifest.mark_failed(mp4_path, "convert", e)
+        metrics.inc("jobs_total", stage="convert", status="failed")
+        events.emit("failed", "convert", job_id, mp4_path, error=str(e))
         logging.error(f"[JOB_ID_{job_id}]: [CONVERT FAILED] Failed to convert {mp4_path}: {e}")
         error_logger.error(f"[JOB_ID_{job_id}]: [CONVERT FAILED] Failed to convert {mp4_path}: {e}")
         return f"Failed: {e}"
 
-def transcribe_wav_task(transcription_queue, azure_speech_transcriber, memory_manager):
+def audio_duration(audio_path):
+    """
+    Reads the duration of a local audio or video file for the throughput metrics.
+
+    :param audio_path: Path to the audio or video file.
+    :return: The duration in seconds, or 0 if it cannot be read.
+    """
+    try:
+        if audio_path.lower().endswith('.wav'):
+            with wave.open(audio_path, 'rb') as wav:
+                return wav.getnframes() / wav.getframerate()
+        if "://" in audio_path:
+            return 0
+        return VideoPreprocessor.probe_duration(audio_path)
+    except Exception:
+        return 0
+
+def transcribe_video_stream(mp4_path, video_preprocessor, azure_speech_transcriber):
+    """
+    Streams the audio of a video through an ffmpeg pipe straight into the speech service, without a temporary WAV file.
+
+    :param mp4_path: Path to the MP4 file.
+    :param video_preprocessor: Instance of VideoPreprocessor.
+    :param azure_speech_transcriber: Instance of AzureSpeechTranscriber.
+    :return: Path to the saved transcript.
+    """
+    # Name the transcript after the WAV file the conversion would have produced, so both modes share outputs
+    transcript_file_path = azure_speech_transcriber.create_transcript_filepath(video_preprocessor.create_audio_filepath_duphonics(mp4_path))
+    process = video_preprocessor.open_pcm_stream(mp4_path)
+    try:
+        azure_speech_transcriber.transcribe_stream(process.stdout, transcript_file_path)
+    except Exception:
+        process.kill()
+        process.wait()
+        raise
+    video_preprocessor.close_pcm_stream(process, mp4_path)
+    return transcript_file_path
+
+def transcribe_wav_segmented(job_id, wav_file_path, azure_speech_transcriber, audio_trimmer, memory_manager, rate_limiter, segment_seconds, segment_workers):
+    """
+    Splits a long WAV file at silence and transcribes the segments concurrently into the transcript of the whole file.
+
+    :param job_id: Unique job ID.
+    :param wav_file_path: Path to the WAV file.
+    :param azure_speech_transcriber: Instance of AzureSpeechTranscriber.
+    :param audio_trimmer: Instance of AudioTrimmer used to find the silences to split at.
+    :param memory_manager: Instance of MemoryManager used to delete the segment files.
+    :param rate_limiter: Instance of RateLimiter shared by all transcription workers.
+    :param segment_seconds: Target segment length in seconds.
+    :param segment_workers: Number of segments transcribed at once.
+    :return: Path to the saved transcript.
+    """
+    segment_paths = audio_trimmer.split_wav(wav_file_path, segment_seconds)
+    if len(segment_paths) == 1:
+        rate_limiter.acquire()
+        return azure_speech_transcriber.transcribe(wav_file_path)
+
+    logging.info(f"[JOB_ID_{job_id}]: [SEGMENTED] Split {wav_file_path} into {len(segment_paths)} segments")
+    if memory_manager.disk_budget is not None:
+        # The segments are copies of the audio, so count them until del_temp_audio removes them
+        memory_manager.disk_budget.acquire(sum(os.path.getsize(segment_path) for segment_path in segment_paths), block=False)
+    try:
+        return azure_speech_transcriber.transcribe_segmented(wav_file_path, segment_paths, max_workers=segment_workers, rate_limiter=rate_limiter)
+    finally:
+        for segment_path in segment_paths:
+            memory_manager.del_temp_audio(segment_path)
+
+def transcribe_wav_task(transcription_queue, azure_speech_transcriber, memory_manager, manifest, rate_limiter, video_preprocessor, audio_trimmer=None, segment_seconds=None, segment_workers=SEGMENT_WORKERS):
     """
     Task to transcribe WAV audio files using Azure.
 
     :param transcription_queue: Queue to retrieve tasks for transcription.
     :param azure_speech_transcriber: Instance of AzureSpeechTranscriber.
     :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    :param rate_limiter: Instance of RateLimiter shared by all transcription workers.
+    :param video_preprocessor: Instance of VideoPreprocessor used to stream audio for jobs without a WAV file.
+    :param audio_trimmer: Instance of AudioTrimmer used to split long WAV files at silence.
+    :param segment_seconds: Target segment length in seconds for splitting long WAV files, or None to transcribe them whole.
+    :param segment_workers: Number of segments of one file transcribed at once.
     """
     global error_logger  # Ensure error_logger is accessible within this function
+    retry_job = None
     while True:
-        job = transcription_queue.get()
+        job = retry_job if retry_job is not None else transcription_queue.get()
+        retry_job = None
         if job is None:
             logging.info("[TRANSCRIBE WORKER END] Received termination signal in transcription worker, exiting.")
             break
         
-        job_id, wav_file_path = job
+        job_id, mp4_path, wav_file_path = job
+        audio_path = wav_file_path or mp4_path
         try:
-            logging.info(f"[JOB_ID_{job_id}]: Starting transcription for {wav_file_path}")
-            transcript_file_path = azure_speech_transcriber.transcribe(wav_file_path)
+            logging.info(f"[JOB_ID_{job_id}]: Starting transcription for {audio_path}")
+            manifest.mark_started(mp4_path, "transcribe")
+            started_at = time.time()
+            events.emit("started", "transcribe", job_id, mp4_path)
+            with metrics.stage("transcribe"):
+                if wav_file_path is None:
+                    rate_limiter.acquire()
+                    transcript_file_path = transcribe_video_stream(mp4_path, video_preprocessor, azure_speech_transcriber)
+                elif segment_seconds and wav_file_path.lower().endswith('.wav'):
+                    transcript_file_path = transcribe_wav_segmented(job_id, wav_file_path, azure_speech_transcriber, audio_trimmer, memory_manager, rate_limiter, segment_seconds, segment_workers)
+                else:
+                    rate_limiter.acquire()
+                    transcript_file_path = azure_speech_transcriber.transcribe(wav_file_path)
+            manifest.mark_done(mp4_path, "transcribe", transcript_file_path)
+            audio_seconds = audio_duration(audio_path)
+            metrics.inc("jobs_total", stage="transcribe", status="success")
+            metrics.inc("audio_seconds_total", audio_seconds)
+            if wav_file_path is not None:
+                metrics.inc("bytes_processed_total", os.path.getsize(wav_file_path), stage="transcribe")
+            events.emit("transcribed", "transcribe", job_id, mp4_path, started_at, output_path=transcript_file_path, audio_seconds=audio_seconds)
             logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE SUCCESS] Transcribed and saved transcript to: {transcript_file_path}")
-            memory_manager.del_temp_audio(wav_file_path)
-            logging.info(f"[JOB_ID_{job_id}]: [MEMORY_MANAGEMENT] Deleted {wav_file_path} for memory management")
+            if wav_file_path is not None:
+                memory_manager.del_temp_audio(wav_file_path)
+                events.emit("deleted", "transcribe", job_id, mp4_path, output_path=wav_file_path)
+                logging.info(f"[JOB_ID_{job_id}]: [MEMORY_MANAGEMENT] Deleted {wav_file_path} for memory management")
         except Exception as e:
-            if hasattr(e, 'response') and e.response.status_code == 429:
-                logging.info(f"[JOB_ID_{job_id}]: [RE-ADD_TO_QUEUE] Rate limit exceeded for {wav_file_path}. Re-adding to queue after delay.")
-                time.sleep(RETRY_DELAY)
-                transcription_queue.put(job)  # Re-add the task to the queue
-                logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE RETRY] Task re-added to the queue after rate limit error.")
+            if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
+                # Hold back every worker until the Retry-After delay has passed instead of sleeping in this thread only
+                retry_after = rate_limiter.penalize(e)
+                metrics.inc("jobs_total", stage="transcribe", status="rate_limited")
+                events.emit("retried", "transcribe", job_id, mp4_path, started_at, error=str(e), retry_after=retry_after)
+                logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE RETRY] Rate limit exceeded for {audio_path}. Retrying in this worker, all workers paused for {retry_after:.0f}s.")
+                # A task put back on the queue could land behind the termination signals and never be picked up
+                retry_job = job
             else:
-                logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {wav_file_path}: {e}")
-                error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {wav_file_path}: {e}")
+                manifest.mark_failed(mp4_path, "transcribe", e)
+                metrics.inc("jobs_total", stage="transcribe", status="failed")
+                events.emit("failed", "transcribe", job_id, mp4_path, started_at, error=str(e))
+                if wav_file_path is not None:
+                    # The audio is kept for a later run, but must not hold up new conversions
+                    memory_manager.forget_temp_audio(wav_file_path)
+                logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {audio_path}: {e}")
+                error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {audio_path}: {e}")
+
+def collect_batches(transcription_queue, batch_size):
+    """
+    Groups transcription jobs into batches, submitting a partial batch when no job arrives for BATCH_COLLECT_TIMEOUT seconds.
+
+    :param transcription_queue: Queue to retrieve tasks for transcription.
+    :param batch_size: Maximum number of files per batch.
+    :yield: Lists of transcription jobs.
+    """
+    batch = []
+    while True:
+        try:
+            job = transcription_queue.get(timeout=BATCH_COLLECT_TIMEOUT if batch else None)
+        except queue.Empty:
+            yield batch
+            batch = []
+            continue
+
+        if job is None:
+            logging.info("[TRANSCRIBE WORKER END] Received termination signal in batch transcription worker, exiting.")
+            if batch:
+                yield batch
+            return
+
+        batch.append(job)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+def transcribe_batch_task(batch, azure_batch_transcriber, memory_manager, manifest, rate_limiter):
+    """
+    Task to transcribe a batch of audio files in a single batch transcription job.
+
+    :param batch: List of transcription jobs.
+    :param azure_batch_transcriber: Instance of AzureBatchTranscriber.
+    :param memory_manager: Instance of MemoryManager.
+    :param manifest: Instance of JobManifest.
+    :param rate_limiter: Instance of RateLimiter shared by all transcription workers.
+    """
+    global error_logger  # Ensure error_logger is accessible within this function
+    job_ids = f"{batch[0][0]}-{batch[-1][0]}"
+    for job_id, source_path, _ in batch:
+        manifest.mark_started(source_path, "transcribe")
+        events.emit("started", "transcribe", job_id, source_path, batch=job_ids)
+
+    while True:
+        started_at = time.time()
+        try:
+            rate_limiter.acquire()
+            logging.info(f"[JOB_ID_{job_ids}]: Starting batch transcription of {len(batch)} files")
+            with metrics.stage("transcribe_batch"):
+                results = azure_batch_transcriber.transcribe_batch([audio_source for _, _, audio_source in batch], display_name=f"transcribe_video jobs {job_ids}")
+            break
+        except Exception as e:
+            if hasattr(e, 'response') and e.response is not None and e.response.status_code == 429:
+                retry_after = rate_limiter.penalize(e)
+                for job_id, source_path, _ in batch:
+                    events.emit("retried", "transcribe", job_id, source_path, error=str(e), retry_after=retry_after, batch=job_ids)
+                logging.info(f"[JOB_ID_{job_ids}]: [TRANSCRIBE RETRY] Rate limit exceeded when submitting batch. Retrying, all workers paused for {retry_after:.0f}s.")
+                continue
+            for job_id, source_path, audio_source in batch:
+                manifest.mark_failed(source_path, "transcribe", e)
+                metrics.inc("jobs_total", stage="transcribe", status="failed")
+                events.emit("failed", "transcribe", job_id, source_path, started_at, error=str(e), batch=job_ids)
+                if not azure_batch_transcriber.is_url(audio_source):
+                    memory_manager.forget_temp_audio(audio_source)
+            logging.error(f"[JOB_ID_{job_ids}]: [TRANSCRIBE FAILED] Failed batch transcription: {e}")
+            error_logger.error(f"[JOB_ID_{job_ids}]: [TRANSCRIBE FAILED] Failed batch transcription: {e}")
+            return
+
+    for job_id, source_path, audio_source in batch:
+        result = results[audio_source]
+        if isinstance(result, Exception):
+            manifest.mark_failed(source_path, "transcribe", result)
+            metrics.inc("jobs_total", stage="transcribe", status="failed")
+            events.emit("failed", "transcribe", job_id, source_path, started_at, error=str(result), batch=job_ids)
+            if not azure_batch_transcriber.is_url(audio_source):
+                memory_manager.forget_temp_audio(audio_source)
+            logging.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {audio_source}: {result}")
+            error_logger.error(f"[JOB_ID_{job_id}]: [TRANSCRIBE FAILED] Failed to transcribe {audio_source}: {result}")
+            continue
+
+        manifest.mark_done(source_path, "transcribe", result)
+        audio_seconds = audio_duration(audio_source)
+        metrics.inc("jobs_total", stage="transcribe", status="success")
+        metrics.inc("audio_seconds_total", audio_seconds)
+        events.emit("transcribed", "transcribe", job_id, source_path, started_at, output_path=result, audio_seconds=audio_seconds, batch=job_ids)
+        logging.info(f"[JOB_ID_{job_id}]: [TRANSCRIBE SUCCESS] Transcribed and saved transcript to: {result}")
+        if not azure_batch_transcriber.is_url(audio_source):
+            metrics.inc("bytes_processed_total", os.path.getsize(audio_source), stage="transcribe")
+            memory_manager.del_temp_audio(audio_source)
+            events.emit("deleted", "transcribe", job_id, source_path, output_path=audio_source)
+            logging.info(f"[JOB_ID_{job_id}]: [MEMORY_MANAGEMENT] Deleted {audio_source} for memory management")
+
+def report_batch_failure(batch, future):
+    """
+    Logs the exception of a finished batch transcription task, which would otherwise be lost with its future.
+
+    :param batch: List of transcription jobs of the task.
+    :param future: The task's future.
+    """
+    error = future.exception()
+    if error is None:
+        return
+    job_ids = f"{batch[0][0]}-{batch[-1][0]}"
+    logging.error(f"[JOB_ID_{job_ids}]: [TRANSCRIBE FAILED] Batch transcription task failed: {error!r}", exc_info=error)
+    error_logger.error(f"[JOB_ID_{job_ids}]: [TRANSCRIBE FAILED] Batch transcription task failed: {error!r}")
+
+def read_url_list(url_list_path):
+    """
+    Reads the audio URLs to transcribe from a file with one URL per line.
+
+    :param url_list_path: Path to the URL list file.
+    :return: List of audio URLs.
+    """
+    with open(url_list_path, 'r', encoding='utf-8') as file:
+        return [line.strip() for line in file if line.strip() and not line.startswith('#')]
 
 def parse_args():
     """
@@ -147,25 +443,70 @@ def parse_args():
     :return: Parsed command line arguments.
     """
     parser = argparse.ArgumentParser(description="Process MP4 files and transcribe audio using Azure.")
-    parser.add_argument('--base_dir', help='Base directory containing MP4 files', required=True)
+    parser.add_argument('--base_dir', help='Base directory containing MP4 files (not needed with --batch_url_list)')
     parser.add_argument('--output_wav_dir', help='Directory to save converted WAV files', required=True)
+    parser.add_argument('--conversion_backend', help='Conversion backend: "moviepy" (44.1kHz stereo WAV) or "ffmpeg" (16kHz mono, audio stream only)', choices=['moviepy', 'ffmpeg'], default='moviepy')
+    parser.add_argument('--audio_format', help='Output format of the ffmpeg backend: "wav" (16-bit PCM) or "ogg" (Opus)', choices=['wav', 'ogg'], default='wav')
+    parser.add_argument('--convert_workers', help=f'Number of concurrent conversions (default {MAX_CONVERT_WORKERS})', type=int, default=MAX_CONVERT_WORKERS)
+    parser.add_argument('--disk_budget_gb', help=f'Temporary audio in GB allowed on disk at once; conversions wait for transcriptions to free space beyond it (default {DISK_BUDGET_GB})', type=float, default=DISK_BUDGET_GB)
+    parser.add_argument('--queue_size', help=f'Capacity of the queues between file discovery, conversion and transcription (default {MAX_QUEUED_FILES})', type=int, default=MAX_QUEUED_FILES)
+    parser.add_argument('--stream_audio', help='Stream audio through an ffmpeg pipe into the speech service instead of writing WAV files', action='store_true')
+    parser.add_argument('--vad_trim', help='Cut long silences out of converted WAV files before transcription, saving an offset map next to each transcript', action='store_true')
     parser.add_argument('--output_txt_dir', help='Directory to save transcribed text', required=True)
     parser.add_argument('--logs_dir', help='Directory to save logging', required=True)
     parser.add_argument('--language', help='Language of the audio to transcribe ("english" or "thai")', required=True)
+    parser.add_argument('--segment_seconds', help='Split WAV files longer than this many seconds at silence and transcribe the segments concurrently (default: transcribe files whole)', type=int, default=None)
+    parser.add_argument('--segment_workers', help=f'Number of segments of one file transcribed at once (default {SEGMENT_WORKERS})', type=int, default=SEGMENT_WORKERS)
+    parser.add_argument('--max_sessions', help=f'Recognition sessions open at once across all workers and segments (default {MAX_SPEECH_SESSIONS})', type=int, default=MAX_SPEECH_SESSIONS)
+    parser.add_argument('--requests_per_minute', help='Transcription requests per minute shared by all workers (default: only throttle on rate limit errors)', type=int, default=None)
+    parser.add_argument('--rate_limit_state', help='SQLite file holding the shared rate limiter state (defaults to <output_txt_dir>/transcribe_video_rate_limit.db)', default=None)
+    parser.add_argument('--manifest_path', help='SQLite job manifest used to skip finished files and resume crashed runs (defaults to <output_txt_dir>/transcribe_video_manifest.db)', default=None)
+    parser.add_argument('--discovery_workers', help=f'Number of directories listed at once while discovering files (default {DISCOVERY_WORKERS})', type=int, default=DISCOVERY_WORKERS)
+    parser.add_argument('--discovery_index', help='SQLite index of directory listings, so a rerun only lists directories whose mtime changed (defaults to <output_txt_dir>/transcribe_video_discovery.db)', default=None)
+    parser.add_argument('--disable_discovery_index', help='List every directory on each run instead of reusing unchanged listings', action='store_true')
+    parser.add_argument('--transcription_backend', help='"realtime" continuous recognition per file, or "batch" transcription jobs of many files', choices=['realtime', 'batch'], default='realtime')
+    parser.add_argument('--batch_content_url', help='Base URL under which --output_wav_dir is served to the batch service, e.g. a blob container URL', default=None)
+    parser.add_argument('--batch_url_list', help='File with one audio URL per line to batch transcribe directly, skipping conversion', default=None)
+    parser.add_argument('--batch_endpoint', help='Base URL of the batch transcription service, e.g. a local stand-in server (defaults to the regional Azure endpoint)', default=None)
+    parser.add_argument('--batch_size', help='Maximum number of files per batch transcription job (default 100)', type=int, default=100)
+    parser.add_argument('--batch_poll_interval', help='Delay in seconds between batch job status checks (default 30)', type=int, default=30)
+    parser.add_argument('--events_dir', help='Directory of the structured JSONL event log of every job stage, read by report_events.py (defaults to <logs_dir>/events)', default=None)
+    parser.add_argument('--metrics_dir', help='Directory in which each process rewrites its metrics as a Prometheus textfile (defaults to <logs_dir>/metrics with --metrics_port)', default=None)
+    parser.add_argument('--metrics_port', help='Serve the metrics of all processes in the Prometheus format on this localhost port', type=int, default=None)
+    parser.add_argument('--shard_index', help='Shard of the input files this node processes, from 0 to --shard_count - 1 (default 0)', type=int, default=0)
+    parser.add_argument('--shard_count', help='Number of nodes the input files are split across by a stable hash of their path under --base_dir (default 1)', type=int, default=1)
+    parser.add_argument('--shared_manifest_dir', help='Directory shared by all nodes in which files are claimed before processing, letting a node steal unclaimed files of other shards once its own are done', default=None)
     
-    return parser.parse_args()
-
-def file_generator(base_dir):
+    args = parser.parse_args()
+    if args.batch_url_list:
+        args.transcription_backend = 'batch'
+    elif not args.base_dir:
+        parser.error("--base_dir is required unless --batch_url_list is given")
+    if args.transcription_backend == 'batch' and args.stream_audio:
+        parser.error("--stream_audio cannot be combined with batch transcription")
+    if args.vad_trim and (args.stream_audio or args.audio_format != 'wav' or args.batch_url_list):
+        parser.error("--vad_trim requires converted WAV files, so it cannot be combined with --stream_audio, --audio_format ogg or --batch_url_list")
+    if args.segment_seconds and (args.stream_audio or args.transcription_backend == 'batch'):
+        parser.error("--segment_seconds requires real-time transcription of converted WAV files, so it cannot be combined with --stream_audio or batch transcription")
+    if args.shard_count < 1 or not 0 <= args.shard_index < args.shard_count:
+        parser.error("--shard_index must be between 0 and --shard_count - 1")
+    if args.transcription_backend == 'batch' and not args.batch_url_list and not args.batch_content_url:
+        parser.error("--batch_content_url is required to batch transcribe converted audio files")
+    return args
+
+def file_generator(base_dir, scanner, manifest):
     """
-    Generator to yield MP4 files from the base directory.
+    Generator to yield the MP4 files from the base directory that still need a transcript, in the same order on
+    every node. Deskshare recordings and files transcribed in a previous run are left out before they are queued.
 
     :param base_dir: Base directory containing MP4 or WEBM files.
+    :param scanner: Instance of FileScanner.
+    :param manifest: Instance of JobManifest.
     :yield: Paths to MP4 or WEBM files.
     """
-    for root, _, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith('.mp4') or file.endswith('.webm'):
-                yield os.path.join(root, file)
+    for mp4_path in scanner.walk(base_dir):
+        if not manifest.is_done(mp4_path, "transcribe"):
+            yield mp4_path
 
 def conversion_worker(args):
     """
@@ -173,24 +514,37 @@ def conversion_worker(args):
 
     :param args: Arguments for the conversion worker.
     """
-    file_queue, output_wav_dir, transcription_directory, transcription_queue, logs_dir = args
+    file_queue, output_wav_dir, transcription_directory, transcription_queue, logs_dir, manifest_path, stream_audio, converter_options, disk_budget, telemetry_options = args
+    conversion_backend, audio_format, convert_workers, vad_trim = converter_options
+    metrics_dir, events_dir, run_id = telemetry_options
     global error_logger
     error_logger = setup_logging(logs_dir)
+    metrics.configure(pipeline="transcribe_video", process="conversion")
+    metrics.start_exporting(metrics_dir)
+    events.configure(events_dir, pipeline="transcribe_video", run_id=run_id, process="conversion")
     
-    video_preprocessor = VideoPreprocessor(temp_audio_path=output_wav_dir)
-    logging.info("[CONVERSION INITIALISATION] Initialised MP4 Converter")
+    manifest = JobManifest(manifest_path)
+    video_preprocessor = VideoPreprocessor(temp_audio_path=output_wav_dir, manifest=manifest, conversion_backend=conversion_backend, audio_format=audio_format)
+    audio_trimmer = AudioTrimmer() if vad_trim else None
+    logging.info(f"[CONVERSION INITIALISATION] Initialised MP4 Converter with the {conversion_backend} backend and {convert_workers} workers{' and VAD trimming' if vad_trim else ''}")
+
+    # Only take a file off the queue once a worker is nearly free, so the bounded file queue holds back discovery
+    slots = threading.BoundedSemaphore(convert_workers * 2)
 
-    with ThreadPoolExecutor(max_workers=MAX_CONVERT_WORKERS) as executor:
+    # With the ffmpeg backend each worker thread drives its own ffmpeg subprocess
+    with ThreadPoolExecutor(max_workers=convert_workers) as executor:
         futures = []
 
         while True:
+            slots.acquire()
             mp4_path = file_queue.get()
             if mp4_path is None:
                 logging.info("[CONVERSION END] Received termination signal in conversion worker, exiting.")
                 break
 
             job_id = generate_job_id()
-            future = executor.submit(convert_video_to_wav_task, mp4_path, video_preprocessor, transcription_queue, job_id, transcription_directory)
+            future = executor.submit(convert_video_to_wav_task, mp4_path, video_preprocessor, transcription_queue, job_id, transcription_directory, manifest, stream_audio, audio_trimmer, disk_budget)
+            future.add_done_callback(lambda _: slots.release())
             futures.append(future)
 
         # Wait for all futures to complete
@@ -201,8 +555,10 @@ def conversion_worker(args):
             else:
                 logging.info(f"Successfully converted file to: {result}")
 
+    manifest.close()
+    metrics.stop_exporting()
+    events.close()
     logging.info("[CONVERSION COMPLETE] All conversion tasks are complete.")
-    transcription_queue.put(None)  # Signal to terminate transcription workers
 
 def transcription_worker(args):
     """
@@ -210,23 +566,62 @@ def transcription_worker(args):
 
     :param args: Arguments for the transcription worker.
     """
-    transcription_queue, output_txt_dir, language, logs_dir = args
+    transcription_queue, output_wav_dir, output_txt_dir, language, logs_dir, manifest_path, rate_limit_args, batch_options, segment_options, disk_budget, telemetry_options = args
+    metrics_dir, events_dir, run_id = telemetry_options
     global error_logger
     error_logger = setup_logging(logs_dir)
+    metrics.configure(pipeline="transcribe_video", process="transcription")
+    metrics.start_exporting(metrics_dir)
+    events.configure(events_dir, pipeline="transcribe_video", run_id=run_id, process="transcription")
+    manifest = JobManifest(manifest_path)
+    rate_limiter = RateLimiter(*rate_limit_args, default_retry_delay=RETRY_DELAY)
+    memory_manager = MemoryManager(disk_budget=disk_budget)
+
+    if batch_options is not None:
+        batch_content_url, batch_endpoint, batch_size, batch_poll_interval = batch_options
+        azure_batch_transcriber = AzureBatchTranscriber(
+            language_to_transcribe=LANGUAGE_MAP[language],
+            output_folder=output_txt_dir,
+            content_base_url=batch_content_url,
+            client=AzureBatchTranscriptionClient(endpoint=batch_endpoint),
+            poll_interval=batch_poll_interval
+        )
+        logging.info(f"[TRANSCRIPTION INITIALISATION] Initialised Azure batch transcription of up to {batch_size} files per job in {azure_batch_transcriber.language_to_transcribe} language")
+
+        with ThreadPoolExecutor(max_workers=MAX_BATCH_JOBS) as executor:
+            for batch in collect_batches(transcription_queue, batch_size):
+                future = executor.submit(transcribe_batch_task, batch, azure_batch_transcriber, memory_manager, manifest, rate_limiter)
+                future.add_done_callback(functools.partial(report_batch_failure, batch))
+
+        manifest.close()
+        rate_limiter.close()
+        metrics.stop_exporting()
+        events.close()
+        logging.info("[TRANSCRIPTION COMPLETE] All transcription tasks are complete.")
+        return
     
-    azure_speech_transcriber = AzureSpeechTranscriber(language_to_transcribe=LANGUAGE_MAP[language], output_folder=output_txt_dir)
+    segment_seconds, segment_workers, max_sessions = segment_options
+    # One transcriber is shared by every worker thread, so its session limit bounds workers x segment_workers
+    azure_speech_transcriber = AzureSpeechTranscriber(language_to_transcribe=LANGUAGE_MAP[language], output_folder=output_txt_dir, max_sessions=max_sessions)
     logging.info(f"[TRANSCRIPTION INITIALISATION] Initialised Azure Speech Service to transcribe {azure_speech_transcriber.language_to_transcribe} language")
-    memory_manager = MemoryManager()
+    video_preprocessor = VideoPreprocessor(temp_audio_path=output_wav_dir)
+    audio_trimmer = AudioTrimmer() if segment_seconds else None
+    if segment_seconds:
+        logging.info(f"[TRANSCRIPTION INITIALISATION] Splitting WAV files longer than {segment_seconds}s into segments transcribed {segment_workers} at a time, at most {max_sessions} sessions in all")
         
     transcribe_threads = []
     for _ in range(MAX_TRANSCRIBE_WORKERS):
-        thread = threading.Thread(target=transcribe_wav_task, args=(transcription_queue, azure_speech_transcriber, memory_manager))
+        thread = threading.Thread(target=transcribe_wav_task, args=(transcription_queue, azure_speech_transcriber, memory_manager, manifest, rate_limiter, video_preprocessor, audio_trimmer, segment_seconds, segment_workers))
         thread.start()
         transcribe_threads.append(thread)
         
     for thread in transcribe_threads:
         thread.join()
         
+    manifest.close()
+    rate_limiter.close()
+    metrics.stop_exporting()
+    events.close()
     logging.info("[TRANSCRIPTION COMPLETE] All transcription tasks are complete.")
 
 def main():
@@ -243,37 +638,111 @@ def main():
     if language not in LANGUAGE_MAP:
         raise ValueError(f"Invalid language. Available options are: {', '.join(LANGUAGE_MAP.keys())}")
         
+    manifest_path = args.manifest_path or os.path.join(output_txt_dir, "transcribe_video_manifest.db")
+    rate_limit_state = args.rate_limit_state or os.path.join(output_txt_dir, "transcribe_video_rate_limit.db")
+        
     os.makedirs(output_txt_dir, exist_ok=True)
     
     setup_logging(logs_dir)
-    logging.info("Collecting MP4/WEBM files to process.")
+
+    shard_claims = None
+    if args.shared_manifest_dir:
+        shard_claims = ShardClaims(args.shared_manifest_dir, node_id=f"{socket.gethostname()}_shard_{args.shard_index}")
+    if args.shard_count > 1 or shard_claims is not None:
+        logging.info(f"[SHARDING] Processing shard {args.shard_index} of {args.shard_count}{', stealing unclaimed files from ' + args.shared_manifest_dir if shard_claims else ''}")
     
-    file_queue = multiprocessing.Queue()
-    transcription_queue = multiprocessing.Queue()
+    # Record existing transcripts once so skip checks are indexed lookups
+    manifest = JobManifest(manifest_path)
+    logging.info(f"[MANIFEST] Recorded {manifest.sync_outputs(output_txt_dir)} existing transcripts in {manifest_path}")
     
-    # Start the workers
-    conversion_args = (file_queue, output_wav_dir, output_txt_dir, transcription_queue, logs_dir)
-    transcription_args = (transcription_queue, output_txt_dir, language, logs_dir)
+    # Bounded queues keep file discovery and conversion only a few files ahead of transcription
+    file_queue = multiprocessing.Queue(maxsize=args.queue_size)
+    transcription_queue = multiprocessing.Queue(maxsize=args.queue_size)
+
+    # The main process serves the metrics endpoint, merging in the textfiles of the worker processes
+    metrics_dir = args.metrics_dir or (os.path.join(logs_dir, "metrics") if args.metrics_port else None)
+    metrics.configure(pipeline="transcribe_video", process="main")
+    metrics.set_callback("queue_depth", file_queue.qsize, queue="file")
+    metrics.set_callback("queue_depth", transcription_queue.qsize, queue="transcription")
+    metrics.start_exporting(metrics_dir, args.metrics_port)
+    if args.metrics_port:
+        logging.info(f"[METRICS] Serving metrics on http://127.0.0.1:{args.metrics_port}/metrics")
+
+    # Every process of this run writes its own event file, tagged with the same run ID
+    events_dir = args.events_dir or os.path.join(logs_dir, "events")
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    events.configure(events_dir, pipeline="transcribe_video", run_id=run_id, process="main")
+    telemetry_options = (metrics_dir, events_dir, run_id)
+
+    # Streamed and hosted audio never touches the disk, so only converted audio is budgeted
+    disk_budget = None
+    if not args.stream_audio and not args.batch_url_list:
+        os.makedirs(output_wav_dir, exist_ok=True)
+        disk_budget = DiskBudget(int(args.disk_budget_gb * 1024 ** 3))
+        _, _, free = shutil.disk_usage(output_wav_dir)
+        if disk_budget.max_bytes > free:
+            logging.warning(f"[DISK BUDGET] The disk budget of {args.disk_budget_gb:.1f} GB is larger than the {free / (1024 ** 3):.1f} GB free in {output_wav_dir}")
+        logging.info(f"[DISK BUDGET] Converting while less than {args.disk_budget_gb:.1f} GB of temporary audio is on disk")
     
-    conversion_process = multiprocessing.Process(target=conversion_worker, args=(conversion_args,))
+    # Start the workers
+    batch_options = None
+    if args.transcription_backend == 'batch':
+        batch_options = (args.batch_content_url, args.batch_endpoint, args.batch_size, args.batch_poll_interval)
+    transcription_args = (transcription_queue, output_wav_dir, output_txt_dir, language, logs_dir, manifest_path, (rate_limit_state, args.requests_per_minute), batch_options,
+                          (args.segment_seconds, args.segment_workers, args.max_sessions), disk_budget, telemetry_options)
     transcription_process = multiprocessing.Process(target=transcription_worker, args=(transcription_args,))
-    
     transcription_process.start()
+
+    if args.batch_url_list:
+        # The audio is already hosted, so URLs go straight to the batch transcription worker
+        logging.info(f"Collecting audio URLs to process from {args.batch_url_list}.")
+        for url_job_id, url in enumerate(shard_files(read_url_list(args.batch_url_list), None, args.shard_index, args.shard_count, shard_claims), start=1):
+            events.emit("discovered", "discover", url_job_id, url)
+            if manifest.is_done(url, "transcribe"):
+                events.emit("skipped", "transcribe", url_job_id, url)
+                logging.info(f"[JOB_ID_{url_job_id}]: [TRANSCRIBE SKIPPED] Skipped {url} as it already has a transcript")
+                continue
+            transcription_queue.put((url_job_id, url, url))
+        manifest.close()
+        transcription_queue.put(None)
+        transcription_process.join()
+        metrics.stop_exporting()
+        events.close()
+        logging.info("[PROGRAM COMPLETE] All tasks are complete. Terminating the program.")
+        return
+
+    logging.info("Collecting MP4/WEBM files to process.")
+    discovery_index = None if args.disable_discovery_index else (args.discovery_index or os.path.join(output_txt_dir, "transcribe_video_discovery.db"))
+    scanner = FileScanner(('.mp4', '.webm'), exclude=('deskshare',), index_path=discovery_index, max_workers=args.discovery_workers)
+
+    conversion_args = (file_queue, output_wav_dir, output_txt_dir, transcription_queue, logs_dir, manifest_path, args.stream_audio,
+                       (args.conversion_backend, args.audio_format, args.convert_workers, args.vad_trim), disk_budget, telemetry_options)
+    conversion_process = multiprocessing.Process(target=conversion_worker, args=(conversion_args,))
     conversion_process.start()
     
-    for mp4_file in file_generator(base_dir):
+    queued = 0
+    for mp4_file in shard_files(file_generator(base_dir, scanner, manifest), base_dir, args.shard_index, args.shard_count, shard_claims):
+        events.emit("discovered", "discover", path=mp4_file)
         file_queue.put(mp4_file)
+        queued += 1
+    logging.info(f"[DISCOVERY] Queued {queued} files after listing {scanner.listed} directories and reusing {scanner.reused} unchanged listings ({scanner.filtered} files filtered out)")
+    manifest.close()
+    scanner.close()
     
     file_queue.put(None)  # Send termination signal to the conversion worker
     
     # Wait for all processes to finish
     conversion_process.join()
 
-    # Add termination signals to close the transcription workers
-    for _ in range(MAX_TRANSCRIBE_WORKERS):
+    # Add one termination signal per reader of the transcription queue, as extra signals would fill the bounded queue
+    # with nobody left to read them. The batch collector reads it alone, otherwise every transcription thread does
+    transcription_consumers = 1 if args.transcription_backend == 'batch' else MAX_TRANSCRIBE_WORKERS
+    for _ in range(transcription_consumers):
         transcription_queue.put(None)
         
     transcription_process.join()
+    metrics.stop_exporting()
+    events.close()
     
     logging.info("[PROGRAM COMPLETE] All tasks are complete. Terminating the program.")
 
@@ -0,0 +1,67 @@
+import os
+import json
+import time
+import threading
+
+class EventLog:
+    def __init__(self):
+        """
+        Initializes a structured log of job stage transitions, written as one JSON object per line.
+        Each process writes its own file; nothing is written until configure is called with a directory.
+        """
+        self.configure()
+
+    def configure(self, events_dir=None, **fields):
+        """
+        Opens the event file of this process. Call it at the start of each worker process, as a forked process
+        inherits its parent's file and lock.
+
+        :param events_dir: Directory of the event files, or None to disable the event log.
+        :param fields: Fields added to every event, e.g. pipeline, run_id and process. The file is named after their values.
+        """
+        self._lock = threading.Lock()
+        self._file = None
+        self.fields = fields
+        self.path = None
+        if events_dir:
+            os.makedirs(events_dir, exist_ok=True)
+            file_name = "_".join(str(value) for value in fields.values()) or "events"
+            self.path = os.path.join(events_dir, f"{file_name}.jsonl")
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def emit(self, event, stage, job_id=None, path=None, started_at=None, **fields):
+        """
+        Writes an event for a job.
+
+        :param event: What happened, e.g. 'discovered', 'started', 'converted', 'transcribed', 'deleted', 'failed' or 'retried'.
+        :param stage: The pipeline stage, e.g. 'convert' or 'transcribe'.
+        :param job_id: The job ID, if the job has one yet.
+        :param path: The path of the source file the job is for.
+        :param started_at: Unix time the stage started, to record the duration of a finished stage.
+        :param fields: Extra fields, e.g. error or bytes.
+        """
+        if self._file is None:
+            return
+        now = time.time()
+        record = dict(self.fields, ts=now, event=event, stage=stage, job_id=job_id, path=path)
+        if started_at is not None:
+            record["started_at"] = started_at
+            record["duration"] = now - started_at
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line)
+                self._file.flush()
+
+    def close(self):
+        """
+        Closes the event file of this process.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# Shared by all modules of a process, like the logging module's root logger
+events = EventLog()
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from memory.DirectoryIndex import DirectoryIndex
+
+class FileScanner:
+    RACY_SECONDS = 2  # Directories modified this recently are not indexed, as a change within the same mtime tick would go unnoticed
+
+    def __init__(self, extensions, require=(), exclude=(), index_path=None, max_workers=8):
+        """
+        Initializes a scanner that finds input files with os.scandir, listing subdirectories in parallel and
+        filtering files before they are queued.
+
+        :param extensions: File name suffixes to include, e.g. ('.mp4', '.webm').
+        :param require: Substrings that must all appear in a file's name, e.g. ('slide',). The directories above it are not
+                        searched, so a base directory whose path contains one does not let every file through.
+        :param exclude: Substrings that must not appear in a file's path, e.g. ('deskshare',). Subtrees whose directory path contains one are skipped entirely.
+        :param index_path: Optional path to a DirectoryIndex of the listings of previous scans, so unchanged directories are not read again.
+        :param max_workers: The maximum number of directories listed at once.
+        """
+        self.extensions = tuple(extensions)
+        self.require = tuple(require)
+        self.exclude = tuple(exclude)
+        self.max_workers = max_workers
+        self.directory_index = DirectoryIndex(index_path, self.rules) if index_path else None
+        self._lock = threading.Lock()
+        self.listed = 0
+        self.reused = 0
+        self.filtered = 0
+
+    @property
+    def rules(self):
+        """
+        Description of the filter, which keys the directory index so a changed filter forces a full scan.
+        """
+        return f"extensions={','.join(self.extensions)};require_name={','.join(self.require)};exclude={','.join(self.exclude)}"
+
+    def matches(self, path):
+        """
+        Checks whether a file passes the filter.
+
+        :param path: The path to the file.
+        :return: True if the file should be processed, False otherwise.
+        """
+        name = os.path.basename(path)
+        return (name.endswith(self.extensions)
+                and all(substring in name for substring in self.require)
+                and not any(substring in path for substring in self.exclude))
+
+    def scan_directory(self, directory):
+        """
+        Lists the matching files and the subdirectories of a directory, reusing the indexed listing if the
+        directory's mtime is unchanged. Like os.walk, unreadable directories are treated as empty and symbolic
+        links to directories are not followed.
+
+        :param directory: The path to the directory.
+        :return: Tuple of the sorted matching file names and the sorted subdirectory names.
+        """
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return [], []
+
+        if self.directory_index is not None:
+            listing = self.directory_index.get(directory, mtime_ns)
+            if listing is not None:
+                with self._lock:
+                    self.reused += 1
+                return listing
+
+        files, subdirs = [], []
+        filtered = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if not entry.is_symlink():
+                            subdirs.append(entry.name)
+                    elif self.matches(entry.path):
+                        files.append(entry.name)
+                    else:
+                        filtered += 1
+        except OSError:
+            return [], []
+        files.sort()
+        subdirs.sort()
+
+        with self._lock:
+            self.listed += 1
+            self.filtered += filtered
+        if self.directory_index is not None and time.time() - mtime_ns / 1e9 > self.RACY_SECONDS:
+            self.directory_index.put(directory, mtime_ns, files, subdirs)
+        return files, subdirs
+
+    def walk(self, base_dir):
+        """
+        Generator to yield the matching files under the base directory, in the same order on every node: each
+        directory's files sorted by name, then its subdirectories in name order. The subdirectories of a directory
+        are listed in parallel while its files are consumed.
+
+        :param base_dir: The base directory to scan.
+        :yield: Paths to the matching files.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from self._walk(executor, base_dir, executor.submit(self.scan_directory, base_dir))
+        if self.directory_index is not None:
+            self.directory_index.flush()
+
+    def _walk(self, executor, directory, listing):
+        """
+        Yields the matching files of a directory and, recursively, of its subdirectories.
+
+        :param executor: The ThreadPoolExecutor listing directories.
+        :param directory: The path to the directory.
+        :param listing: Future of the directory's listing.
+        :yield: Paths to the matching files.
+        """
+        files, subdirs = listing.result()
+        children = [os.path.join(directory, name) for name in subdirs]
+        children = [child for child in children if not any(substring in child for substring in self.exclude)]
+        # Start listing the subdirectories before handing out the files, so the walk stays ahead of the consumer
+        listings = [executor.submit(self.scan_directory, child) for child in children]
+        for name in files:
+            yield os.path.join(directory, name)
+        for child, child_listing in zip(children, listings):
+            yield from self._walk(executor, child, child_listing)
+
+    def close(self):
+        """
+        Writes the listings of the last scan to the directory index and closes it.
+        """
+        if self.directory_index is not None:
+            self.directory_index.close()
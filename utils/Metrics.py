@@ -0,0 +1,342 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NAMESPACE = "azure_transcribe"
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200)
+METRICS_INTERVAL = 15  # Delay in seconds between rewrites of the metrics textfile
+
+# Every pipeline shares one set of metric names, told apart by the pipeline and process labels
+METRIC_FAMILIES = {
+    "stage_seconds": ("histogram", "Time spent on one job in a pipeline stage.", ("stage",)),
+    "stage_in_flight": ("gauge", "Jobs currently being processed in a pipeline stage.", ("stage",)),
+    "jobs_total": ("counter", "Jobs finished per pipeline stage and outcome.", ("stage", "status")),
+    "api_request_seconds": ("histogram", "Latency of requests to an Azure API.", ("api",)),
+    "api_requests_in_flight": ("gauge", "Requests to an Azure API currently waiting for a response.", ("api",)),
+    "api_errors_total": ("counter", "Failed requests to an Azure API, rate limit errors excluded.", ("api",)),
+    "rate_limit_errors_total": ("counter", "Requests to an Azure API rejected with HTTP 429.", ("api",)),
+    "queue_depth": ("gauge", "Jobs waiting in a pipeline queue.", ("queue",)),
+    "bytes_processed_total": ("counter", "Bytes of files written or sent by a pipeline stage.", ("stage",)),
+    "audio_seconds_total": ("counter", "Seconds of audio transcribed.", ()),
+    "audio_seconds_per_second": ("gauge", "Seconds of audio transcribed per second of wall time since the process started.", ()),
+    "process_start_time_seconds": ("gauge", "Unix time the process started.", ()),
+}
+
+class Metrics:
+    def __init__(self):
+        """
+        Initializes an in-process registry of pipeline metrics rendered in the Prometheus text format.
+        Each process keeps its own values; export them with start_exporting.
+        """
+        self.configure()
+
+    def configure(self, **constant_labels):
+        """
+        Clears all values and sets the labels added to every sample. Call it at the start of each worker process
+        before exporting, as a forked process inherits a copy of its parent's values, lock and exporter.
+
+        :param constant_labels: Labels identifying the process, e.g. pipeline and process.
+        """
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._writer = None
+        self._server = None
+        self.textfile_path = None
+        self.constant_labels = constant_labels
+        self.start_time = time.time()
+        self._values = {}
+        self._callbacks = {}
+
+    def _key(self, name, labels):
+        """
+        Builds the key of a labelled value, checking the labels against the metric family.
+
+        :param name: The metric name without namespace.
+        :param labels: The label values.
+        :return: The tuple of label values in the family's order.
+        """
+        label_names = METRIC_FAMILIES[name][2]
+        if set(labels) != set(label_names):
+            raise ValueError(f"Metric {name} takes the labels {', '.join(label_names) or 'none'}, got {', '.join(labels) or 'none'}")
+        return tuple(str(labels[label]) for label in label_names)
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increases a counter, or a gauge when value is negative.
+
+        :param name: The metric name without namespace.
+        :param value: The amount to add.
+        :param labels: The label values.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            values = self._values.setdefault(name, {})
+            values[key] = values.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """
+        Sets a gauge.
+
+        :param name: The metric name without namespace.
+        :param value: The new value.
+        :param labels: The label values.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._values.setdefault(name, {})[key] = value
+
+    def set_callback(self, name, callback, **labels):
+        """
+        Sets a gauge to be read from a function each time the metrics are rendered, e.g. the size of a queue.
+
+        :param name: The metric name without namespace.
+        :param callback: Function returning the value, or None to leave the sample out.
+        :param labels: The label values.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            self._callbacks.setdefault(name, {})[key] = callback
+
+    def observe(self, name, value, **labels):
+        """
+        Records a value in a histogram.
+
+        :param name: The metric name without namespace.
+        :param value: The observed value.
+        :param labels: The label values.
+        """
+        key = self._key(name, labels)
+        with self._lock:
+            values = self._values.setdefault(name, {})
+            if key not in values:
+                values[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            histogram = values[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def stage(self, stage):
+        """
+        Times a job in a pipeline stage and counts it as in flight while it runs.
+
+        :param stage: The stage name, e.g. 'convert' or 'transcribe'.
+        """
+        self.inc("stage_in_flight", stage=stage)
+        start_time = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.monotonic() - start_time, stage=stage)
+            self.inc("stage_in_flight", -1, stage=stage)
+
+    @contextmanager
+    def track_request(self, api):
+        """
+        Times a request to an Azure API, counting it as in flight while it runs and counting its errors.
+        Rate limit errors are recognised by the HTTP 429 status of the response attached to the exception.
+
+        :param api: The API name, e.g. 'speech' or 'openai_chat'.
+        """
+        self.inc("api_requests_in_flight", api=api)
+        start_time = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            response = getattr(e, 'response', None)
+            if response is not None and getattr(response, 'status_code', None) == 429:
+                self.inc("rate_limit_errors_total", api=api)
+            else:
+                self.inc("api_errors_total", api=api)
+            raise
+        finally:
+            self.observe("api_request_seconds", time.monotonic() - start_time, api=api)
+            self.inc("api_requests_in_flight", -1, api=api)
+
+    @staticmethod
+    def _format_labels(labels):
+        """
+        Formats labels for a sample line.
+
+        :param labels: List of label name and value pairs.
+        :return: The label set in braces, or an empty string without labels.
+        """
+        if not labels:
+            return ""
+        escaped = []
+        for name, value in labels:
+            value = str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+            escaped.append(f'{name}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self):
+        """
+        Renders the current values in the Prometheus text exposition format.
+
+        :return: The exposition text.
+        """
+        uptime = max(time.time() - self.start_time, 1e-9)
+        with self._lock:
+            # Copy histograms too, so rendering works on a consistent snapshot outside the lock
+            values = {name: {key: ([list(value[0]), value[1], value[2]] if isinstance(value, list) else value) for key, value in samples.items()}
+                      for name, samples in self._values.items()}
+            callbacks = {name: dict(samples) for name, samples in self._callbacks.items()}
+            constant_labels = list(self.constant_labels.items())
+
+        values["process_start_time_seconds"] = {(): self.start_time}
+        if "audio_seconds_total" in values:
+            values["audio_seconds_per_second"] = {(): values["audio_seconds_total"][()] / uptime}
+        for name, samples in callbacks.items():
+            for key, callback in samples.items():
+                try:
+                    value = callback()
+                except (NotImplementedError, OSError, ValueError):
+                    value = None  # e.g. Queue.qsize is not implemented on macOS
+                if value is not None:
+                    values.setdefault(name, {})[key] = value
+
+        lines = []
+        for name, (kind, description, label_names) in METRIC_FAMILIES.items():
+            if name not in values:
+                continue
+            full_name = f"{NAMESPACE}_{name}"
+            lines.append(f"# HELP {full_name} {description}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            for key, value in sorted(values[name].items()):
+                labels = constant_labels + list(zip(label_names, key))
+                if kind != "histogram":
+                    lines.append(f"{full_name}{self._format_labels(labels)} {value}")
+                    continue
+                bucket_counts, total, count = value
+                for bound, bucket_count in zip(LATENCY_BUCKETS, bucket_counts):
+                    lines.append(f"{full_name}_bucket{self._format_labels(labels + [('le', bound)])} {bucket_count}")
+                lines.append(f"{full_name}_bucket{self._format_labels(labels + [('le', '+Inf')])} {count}")
+                lines.append(f"{full_name}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{full_name}_count{self._format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path=None):
+        """
+        Writes the metrics to a textfile atomically, so a collector never reads a half-written file.
+
+        :param path: The path of the .prom file, defaults to the one given to start_exporting.
+        """
+        path = path or self.textfile_path
+        partial_path = f"{path}.{os.getpid()}.part"
+        with open(partial_path, 'w', encoding='utf-8') as file:
+            file.write(self.render())
+        os.replace(partial_path, path)
+
+    @staticmethod
+    def merge_exposition(texts):
+        """
+        Merges the exposition texts of several processes, so each metric family is described once.
+
+        :param texts: Iterable of exposition texts.
+        :return: The merged exposition text.
+        """
+        families = {}
+        family = None
+        for text in texts:
+            for line in text.splitlines():
+                if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                    family = families.setdefault(line.split(" ", 3)[2], {"HELP": None, "TYPE": None, "samples": []})
+                    family[line[2:6]] = line
+                elif line and family is not None:
+                    family["samples"].append(line)
+
+        lines = []
+        for family in families.values():
+            lines.extend(line for line in (family["HELP"], family["TYPE"]) if line)
+            lines.extend(family["samples"])
+        return "\n".join(lines) + "\n"
+
+    def collect(self, textfile_dir=None):
+        """
+        Renders this process's metrics merged with the textfiles other processes write to the directory.
+
+        :param textfile_dir: The directory of the other processes' .prom files, or None for this process only.
+        :return: The exposition text.
+        """
+        texts = [self.render()]
+        if textfile_dir and os.path.isdir(textfile_dir):
+            own_file = os.path.basename(self.textfile_path) if self.textfile_path else None
+            for name in sorted(os.listdir(textfile_dir)):
+                if name.endswith(".prom") and name != own_file:
+                    try:
+                        with open(os.path.join(textfile_dir, name), 'r', encoding='utf-8') as file:
+                            texts.append(file.read())
+                    except OSError:
+                        continue
+        return self.merge_exposition(texts)
+
+    def start_exporting(self, metrics_dir=None, port=None, interval=METRICS_INTERVAL):
+        """
+        Starts exporting the metrics of this process: a textfile in metrics_dir rewritten every interval seconds,
+        named after the pipeline and process labels, and, if a port is given, an HTTP endpoint serving
+        /metrics for this process merged with the other textfiles in metrics_dir.
+
+        :param metrics_dir: The directory of the textfiles, or None for no textfile.
+        :param port: The port of the HTTP endpoint on localhost, or None for no endpoint.
+        :param interval: The delay in seconds between textfile rewrites.
+        """
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+            file_name = "_".join(str(value) for value in self.constant_labels.values()) or "metrics"
+            self.textfile_path = os.path.join(metrics_dir, f"{file_name}.prom")
+            self._writer = threading.Thread(target=self._write_periodically, args=(interval,), daemon=True)
+            self._writer.start()
+
+        if port:
+            registry = self
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?', 1)[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = registry.collect(metrics_dir).encode('utf-8')
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass  # Scrapes would otherwise flood the console
+
+            self._server = ThreadingHTTPServer(("127.0.0.1", port), MetricsHandler)
+            threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def _write_periodically(self, interval):
+        """
+        Rewrites the textfile every interval seconds until stop_exporting is called.
+
+        :param interval: The delay in seconds between rewrites.
+        """
+        while not self._stop.wait(interval):
+            try:
+                self.write_textfile()
+            except OSError:
+                pass  # A full or missing metrics directory must not stop the pipeline
+
+    def stop_exporting(self):
+        """
+        Stops the textfile writer after a final rewrite, and shuts down the HTTP endpoint.
+        """
+        self._stop.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+            self.write_textfile()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Shared by all modules of a process, like the logging module's root logger
+metrics = Metrics()
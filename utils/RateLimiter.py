@@ -0,0 +1,265 @@
+import os
+import re
+import time
+import sqlite3
+import asyncio
+import threading
+
+class RateLimiter:
+    def __init__(self, state_path, requests_per_minute=None, tokens_per_minute=None, name="default", default_retry_delay=60):
+        """
+        Initializes a token-bucket rate limiter whose state is shared through a SQLite file, so every
+        thread and process pointing at the same file draws from the same quota.
+
+        :param state_path: Path to the SQLite file holding the shared bucket state.
+        :param requests_per_minute: Request quota per minute, or None to not limit requests proactively.
+        :param tokens_per_minute: Token quota per minute, or None to not limit tokens proactively.
+        :param name: Name of the bucket, so several deployments can share one state file.
+        :param default_retry_delay: Delay in seconds to back off after a rate limit error without a Retry-After header.
+        """
+        self.state_path = state_path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.name = name
+        self.default_retry_delay = default_retry_delay
+
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.state_path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS buckets (
+                name TEXT PRIMARY KEY,
+                request_level REAL,
+                token_level REAL,
+                updated_at REAL NOT NULL,
+                blocked_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._connection.execute(
+            "INSERT OR IGNORE INTO buckets (name, request_level, token_level, updated_at) VALUES (?, ?, ?, ?)",
+            (self.name, self.requests_per_minute, self.tokens_per_minute, time.time())
+        )
+
+    @staticmethod
+    def _refill(level, per_minute, elapsed):
+        """
+        Refills a bucket level for the elapsed time, capped at one minute of quota.
+
+        :param level: The current bucket level.
+        :param per_minute: The quota per minute, or None if the bucket is unlimited.
+        :param elapsed: The time in seconds since the last update.
+        :return: The refilled level, or None if the bucket is unlimited.
+        """
+        if per_minute is None:
+            return None
+        if level is None:
+            return float(per_minute)
+        return min(float(per_minute), level + elapsed * per_minute / 60.0)
+
+    def _transaction(self, update):
+        """
+        Runs an update of the bucket row inside an exclusive transaction.
+
+        :param update: Function taking (request_level, token_level, blocked_until, now) and returning
+                       ((request_level, token_level, blocked_until), result).
+        :return: The result returned by the update function.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                request_level, token_level, updated_at, blocked_until = self._connection.execute(
+                    "SELECT request_level, token_level, updated_at, blocked_until FROM buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                # Quota does not refill while blocked, so workers resume gradually once the block ends
+                elapsed = max(now - max(updated_at, blocked_until), 0.0)
+                request_level = self._refill(request_level, self.requests_per_minute, elapsed)
+                token_level = self._refill(token_level, self.tokens_per_minute, elapsed)
+
+                (request_level, token_level, blocked_until), result = update(request_level, token_level, blocked_until, now)
+
+                self._connection.execute(
+                    "UPDATE buckets SET request_level = ?, token_level = ?, updated_at = ?, blocked_until = ? WHERE name = ?",
+                    (request_level, token_level, now, blocked_until, self.name)
+                )
+                self._connection.execute("COMMIT")
+                return result
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, tokens=1):
+        """
+        Takes one request and the given number of tokens from the buckets if they are available.
+
+        :param tokens: Estimated number of tokens the request will consume.
+        :return: 0 if the request may be sent now, otherwise the number of seconds to wait before trying again.
+        """
+        if self.tokens_per_minute is not None:
+            tokens = min(tokens, self.tokens_per_minute)
+
+        def update(request_level, token_level, blocked_until, now):
+            if now < blocked_until:
+                return (request_level, token_level, blocked_until), blocked_until - now
+
+            waits = []
+            if request_level is not None and request_level < 1:
+                waits.append((1 - request_level) * 60.0 / self.requests_per_minute)
+            if token_level is not None and token_level < tokens:
+                waits.append((tokens - token_level) * 60.0 / self.tokens_per_minute)
+            if waits:
+                return (request_level, token_level, blocked_until), max(waits)
+
+            if request_level is not None:
+                request_level -= 1
+            if token_level is not None:
+                token_level -= tokens
+            return (request_level, token_level, blocked_until), 0
+
+        return self._transaction(update)
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until one request and the given number of tokens are available, then takes them.
+
+        :param tokens: Estimated number of tokens the request will consume.
+        """
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        """
+        Waits without blocking the event loop until one request and the given number of tokens are available.
+
+        :param tokens: Estimated number of tokens the request will consume.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            # The SQLite transaction can wait on other processes holding the lock, so it runs in a worker thread
+            wait = await loop.run_in_executor(None, self.try_acquire, tokens)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    @staticmethod
+    def parse_duration(value):
+        """
+        Parses a rate limit duration header such as '20', '1s', '250ms' or '6m0s' into seconds.
+
+        :param value: The header value.
+        :return: The duration in seconds, or None if it cannot be parsed.
+        """
+        if value is None:
+            return None
+        value = str(value).strip()
+        try:
+            return float(value)
+        except ValueError:
+            pass
+
+        parts = re.findall(r'(\d+(?:\.\d+)?)(ms|h|m|s)', value)
+        if not parts or ''.join(number + unit for number, unit in parts) != value:
+            return None
+        multipliers = {"h": 3600.0, "m": 60.0, "s": 1.0, "ms": 0.001}
+        return sum(float(number) * multipliers[unit] for number, unit in parts)
+
+    def update_from_headers(self, headers):
+        """
+        Aligns the shared buckets with the quota the service reports in its response headers.
+
+        :param headers: The response headers, e.g. from a raw OpenAI response.
+        """
+        if headers is None:
+            return
+
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        reset_requests = self.parse_duration(headers.get("x-ratelimit-reset-requests"))
+        reset_tokens = self.parse_duration(headers.get("x-ratelimit-reset-tokens"))
+        retry_after = self.retry_after_from_headers(headers)
+
+        def update(request_level, token_level, blocked_until, now):
+            if remaining_requests is not None:
+                remaining = float(remaining_requests)
+                if request_level is not None:
+                    request_level = min(request_level, remaining)
+                if remaining <= 0 and reset_requests:
+                    blocked_until = max(blocked_until, now + reset_requests)
+            if remaining_tokens is not None:
+                remaining = float(remaining_tokens)
+                if token_level is not None:
+                    token_level = min(token_level, remaining)
+                if remaining <= 0 and reset_tokens:
+                    blocked_until = max(blocked_until, now + reset_tokens)
+            if retry_after is not None:
+                blocked_until = max(blocked_until, now + retry_after)
+            return (request_level, token_level, blocked_until), None
+
+        self._transaction(update)
+
+    async def update_from_headers_async(self, headers):
+        """
+        Aligns the shared buckets with the response headers without blocking the event loop.
+
+        :param headers: The response headers, e.g. from a raw OpenAI response.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.update_from_headers, headers)
+
+    def retry_after_from_headers(self, headers):
+        """
+        Reads the delay requested by the service from the Retry-After headers.
+
+        :param headers: The response headers.
+        :return: The delay in seconds, or None if no delay is requested.
+        """
+        if headers is None:
+            return None
+        retry_after_ms = self.parse_duration(headers.get("retry-after-ms"))
+        if retry_after_ms is not None:
+            return retry_after_ms / 1000.0
+        return self.parse_duration(headers.get("retry-after"))
+
+    def penalize(self, error=None):
+        """
+        Blocks every worker sharing the buckets after a rate limit error and empties the buckets, so
+        requests resume gradually at the configured rate instead of all at once.
+
+        :param error: The rate limit exception, used to read the Retry-After headers if it has a response.
+        :return: The number of seconds all workers will wait before sending the next request.
+        """
+        response = getattr(error, 'response', None)
+        retry_after = self.retry_after_from_headers(getattr(response, 'headers', None))
+        if retry_after is None:
+            retry_after = self.default_retry_delay
+
+        def update(request_level, token_level, blocked_until, now):
+            request_level = 0.0 if request_level is not None else None
+            token_level = 0.0 if token_level is not None else None
+            return (request_level, token_level, max(blocked_until, now + retry_after)), retry_after
+
+        return self._transaction(update)
+
+    async def penalize_async(self, error=None):
+        """
+        Blocks every worker sharing the buckets after a rate limit error without blocking the event loop.
+
+        :param error: The rate limit exception, used to read the Retry-After headers if it has a response.
+        :return: The number of seconds all workers will wait before sending the next request.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self.penalize, error)
+
+    def close(self):
+        """
+        Closes the underlying database connection.
+        """
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,229 @@
+import os
+import sys
+import zlib
+import hashlib
+import tempfile
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+import orjson
+
+from memory.DedupIndex import DedupIndex
+from utils.jsonl import find_jsonl_files, validate_record
+
+NUM_PERM = 128  # Number of hash functions in a MinHash signature
+BANDS = 16  # LSH bands the signature is split into; with 8 rows per band, pairs above ~0.7 similarity become candidates
+SHINGLE_SIZE = 5  # Characters per shingle. Characters rather than words, as Thai is written without spaces between words
+THRESHOLD = 0.8  # Estimated Jaccard similarity of the question shingles above which a pair is a near duplicate
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+@lru_cache(maxsize=None)
+def _punctuation_table():
+    """
+    Builds the str.translate table mapping every Unicode punctuation and symbol character to a space, once per process.
+    """
+    return {codepoint: " " for codepoint in range(sys.maxunicode + 1) if unicodedata.category(chr(codepoint))[0] in "PS"}
+
+def normalize_text(text):
+    """
+    Normalizes a text for comparison: NFKC normalization, lowercase, punctuation and symbols replaced by spaces and
+    whitespace collapsed. Combining marks such as Thai vowels and tone marks are kept.
+
+    :param text: The text to normalize.
+    :return: The normalized text.
+    """
+    text = unicodedata.normalize("NFKC", text).lower().translate(_punctuation_table())
+    return " ".join(text.split())
+
+def content_digest(question, answer):
+    """
+    Hashes a normalized question and answer pair for exact duplicate detection.
+
+    :param question: The normalized question.
+    :param answer: The normalized answer.
+    :return: 16-byte digest.
+    """
+    return hashlib.blake2b(f"{question}\0{answer}".encode("utf-8"), digest_size=16).digest()
+
+@lru_cache(maxsize=None)
+def _permutations(num_perm, seed=1):
+    """
+    Draws the coefficients of the universal hash functions of a MinHash signature, the same in every process.
+    """
+    generator = np.random.RandomState(seed)
+    a = generator.randint(1, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    b = generator.randint(0, MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+    return a, b
+
+def minhash(text, num_perm=NUM_PERM, shingle_size=SHINGLE_SIZE):
+    """
+    Computes the MinHash signature of the character shingles of a normalized text.
+
+    :param text: The normalized text.
+    :param num_perm: Number of hash functions.
+    :param shingle_size: Characters per shingle.
+    :return: numpy uint32 array of num_perm minimum hash values.
+    """
+    shingles = {text[i:i + shingle_size] for i in range(max(1, len(text) - shingle_size + 1))}
+    hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _permutations(num_perm)
+    # uint64 arithmetic wraps around, as in datasketch; the result is reduced to 32 bits
+    values = ((hashes[:, None] * a + b) % MERSENNE_PRIME) & MAX_HASH
+    return values.min(axis=0).astype(np.uint32)
+
+def band_keys(signature, bands=BANDS):
+    """
+    Splits a MinHash signature into LSH bands and hashes each band, with its position, into a bucket key.
+
+    :param signature: The MinHash signature.
+    :param bands: Number of bands. Must divide the signature length.
+    :return: List of one signed 63-bit bucket key per band, storable as a SQLite integer.
+    """
+    return [int.from_bytes(hashlib.blake2b(rows.tobytes(), digest_size=8, salt=band.to_bytes(2, "little")).digest(), "little") >> 1
+            for band, rows in enumerate(signature.reshape(bands, -1))]
+
+def similarity(signature, other):
+    """
+    Estimates the Jaccard similarity of two texts from their MinHash signatures.
+
+    :param signature: The first signature.
+    :param other: The second signature.
+    :return: The fraction of equal hash values.
+    """
+    return float(np.mean(signature == other))
+
+def _new_stats(path):
+    """
+    Creates the counts of one input file.
+    """
+    return {"file": path, "lines": 0, "kept": 0, "blank": 0, "invalid": 0, "exact": 0, "near": 0}
+
+def deduplicate_jsonl_files(input_paths, output_path, report_path=None, index_path=None, threshold=THRESHOLD,
+                            num_perm=NUM_PERM, bands=BANDS, shingle_size=SHINGLE_SIZE):
+    """
+    Drops exact and near duplicate question and answer pairs from JSONL training data. Files are streamed in input
+    order and the first occurrence is kept. A pair is an exact duplicate if its normalized question and answer match
+    a kept pair, and a near duplicate if the MinHash signature of its normalized question is at least the threshold
+    similar to that of a kept pair sharing an LSH bucket. Kept pairs are indexed in SQLite, so memory use does not
+    grow with the number of pairs.
+
+    :param input_paths: List of JSONL files, directories of JSONL files or glob patterns.
+    :param output_path: Path to the deduplicated JSONL file.
+    :param report_path: Optional path to a JSONL file listing every dropped line, the reason and the kept pair it duplicates.
+    :param index_path: Optional path to a persistent DedupIndex, to also drop pairs kept in previous runs. Defaults to a temporary index.
+    :param threshold: Similarity above which questions are near duplicates, or None to only drop exact duplicates.
+    :param num_perm: Number of hash functions in a MinHash signature.
+    :param bands: Number of LSH bands. Must divide num_perm.
+    :param shingle_size: Characters per shingle.
+    :return: List of the counts of each input file, in input order.
+    """
+    if num_perm % bands:
+        raise ValueError(f"bands ({bands}) must divide num_perm ({num_perm})")
+
+    input_files = [path for path in find_jsonl_files(input_paths)
+                   if os.path.abspath(path) not in (os.path.abspath(output_path), os.path.abspath(report_path or output_path))]
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+
+    temporary_dir = None
+    if index_path is None:
+        temporary_dir = tempfile.TemporaryDirectory(prefix=".dedup_index_", dir=output_dir)
+        index_path = os.path.join(temporary_dir.name, "index.db")
+    index = DedupIndex(index_path)
+
+    all_stats = []
+    report = open(report_path, 'wb') if report_path is not None else None
+    try:
+        with open(output_path, 'wb') as output:
+            for input_path in input_files:
+                stats = _new_stats(input_path)
+                all_stats.append(stats)
+                with open(input_path, 'rb') as infile:
+                    for line_number, line in enumerate(infile, start=1):
+                        stats["lines"] += 1
+                        line = line.strip()
+                        if line_number == 1 and line.startswith(b'\xef\xbb\xbf'):
+                            line = line[3:]  # Byte order mark of files saved as "UTF-8 with BOM"
+                        if not line:
+                            stats["blank"] += 1
+                            continue
+
+                        # Indexed by absolute path, so reruns recognize the file however its path is spelled
+                        dropped = _check_line(index, os.path.abspath(input_path), line_number, line, threshold, num_perm, bands, shingle_size)
+                        if dropped is None:
+                            stats["kept"] += 1
+                            output.write(line + b'\n')
+                            continue
+
+                        stats[dropped["reason"] if dropped["reason"] in ("exact", "near") else "invalid"] += 1
+                        if report is not None:
+                            report.write(orjson.dumps(dropped) + b'\n')
+    finally:
+        if report is not None:
+            report.close()
+        index.close()
+        if temporary_dir is not None:
+            temporary_dir.cleanup()
+    return all_stats
+
+def _check_line(index, source, line_number, line, threshold, num_perm, bands, shingle_size):
+    """
+    Decides whether a line is kept, indexing it if so.
+
+    :return: None if the line is kept, otherwise the report entry of the dropped line.
+    """
+    dropped = {"file": source, "line": line_number}
+    try:
+        record = orjson.loads(line)
+    except orjson.JSONDecodeError:
+        return {**dropped, "reason": "invalid_json"}
+    reason = validate_record(record)
+    if reason is not None:
+        return {**dropped, "reason": reason}
+
+    question = normalize_text(record["messages"][1]["content"])
+    answer = normalize_text(record["messages"][2]["content"])
+    dropped["question"] = record["messages"][1]["content"]
+
+    digest = content_digest(question, answer)
+    match = index.find_exact(digest)
+    if match is not None:
+        record_id, match_source, match_line = match
+        if index.reclaim(record_id, source):
+            return None  # Indexed by a previous run over the same file
+        return {**dropped, "reason": "exact", "similarity": 1.0, "duplicate_of": {"file": match_source, "line": match_line}}
+
+    if threshold is None or not question:
+        index.add(source, line_number, digest)
+        return None
+
+    signature = minhash(question, num_perm, shingle_size)
+    keys = band_keys(signature, bands)
+    best = None
+    for candidate_source, candidate_line, candidate_signature in index.find_candidates(keys):
+        score = similarity(signature, np.frombuffer(candidate_signature, dtype=np.uint32))
+        if score >= threshold and (best is None or score > best[0]):
+            best = (score, candidate_source, candidate_line)
+    if best is not None:
+        return {**dropped, "reason": "near", "similarity": round(best[0], 3), "duplicate_of": {"file": best[1], "line": best[2]}}
+
+    index.add(source, line_number, digest, keys, signature.tobytes())
+    return None
+
+def summarize(all_stats):
+    """
+    Adds up the counts of several files.
+
+    :param all_stats: List of the counts of each file.
+    :return: Dictionary of the total counts and the number of files.
+    """
+    totals = _new_stats(None)
+    del totals["file"]
+    totals["files"] = len(all_stats)
+    for stats in all_stats:
+        for key in totals:
+            if key != "files":
+                totals[key] += stats[key]
+    return totals
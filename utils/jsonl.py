@@ -0,0 +1,167 @@
+import os
+import glob
+import shutil
+import tempfile
+from multiprocessing import Pool
+
+import orjson
+
+ROLES = ("system", "user", "assistant")  # Roles of the messages of a training example, in order
+REJECT_REASONS = ("invalid_json", "not_an_object", "missing_messages", "wrong_message_count", "wrong_roles", "invalid_content")
+
+def validate_record(record):
+    """
+    Checks that a record is a chat fine-tuning example: a 'messages' list of exactly one system, one user and one
+    assistant message, in that order, each with string content.
+
+    :param record: The parsed JSON record.
+    :return: None if the record is valid, otherwise the reason it is rejected, one of REJECT_REASONS.
+    """
+    if not isinstance(record, dict):
+        return "not_an_object"
+    messages = record.get("messages")
+    if not isinstance(messages, list):
+        return "missing_messages"
+    if len(messages) != len(ROLES):
+        return "wrong_message_count"
+    for message, role in zip(messages, ROLES):
+        if not isinstance(message, dict) or message.get("role") != role:
+            return "wrong_roles"
+        if not isinstance(message.get("content"), str):
+            return "invalid_content"
+    return None
+
+def is_valid_format(record):
+    """
+    Checks whether a record is a valid chat fine-tuning example.
+
+    :param record: The parsed JSON record.
+    :return: True if the record is valid, False otherwise.
+    """
+    return validate_record(record) is None
+
+def find_jsonl_files(paths):
+    """
+    Expands files, directories and glob patterns into the JSONL files they contain.
+
+    :param paths: List of files, directories or glob patterns.
+    :return: Sorted list of JSONL file paths.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(glob.glob(os.path.join(path, "*.jsonl")))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            files.update(glob.glob(path))
+    return sorted(files)
+
+def filter_jsonl_file(input_path, output_path=None, validate=True):
+    """
+    Streams a JSONL file line by line, writing the valid lines to the output file as they are. Memory use does not
+    grow with the size of the file.
+
+    :param input_path: Path to the JSONL file to read.
+    :param output_path: Path to write the valid lines to, or None to only count them.
+    :param validate: Whether to check the chat structure of each record, or only that it is valid JSON.
+    :return: Dictionary with the file's counts of lines, valid lines, blank lines and rejected lines per reason.
+    """
+    stats = {"file": input_path, "lines": 0, "valid": 0, "blank": 0, "rejected": 0}
+    stats.update((reason, 0) for reason in REJECT_REASONS)
+
+    output = open(output_path, 'wb') if output_path is not None else None
+    try:
+        with open(input_path, 'rb') as infile:
+            for line in infile:
+                stats["lines"] += 1
+                line = line.strip()
+                if stats["lines"] == 1 and line.startswith(b'\xef\xbb\xbf'):
+                    line = line[3:]  # Byte order mark of files saved as "UTF-8 with BOM"
+                if not line:
+                    stats["blank"] += 1
+                    continue
+
+                try:
+                    record = orjson.loads(line)
+                    reason = validate_record(record) if validate else None
+                except orjson.JSONDecodeError:
+                    reason = "invalid_json"
+                if reason is not None:
+                    stats[reason] += 1
+                    stats["rejected"] += 1
+                    continue
+
+                stats["valid"] += 1
+                if output is not None:
+                    output.write(line + b'\n')
+    finally:
+        if output is not None:
+            output.close()
+    return stats
+
+def _filter_part(args):
+    """
+    Pool task filtering one input file of a merge into its own part file.
+
+    :param args: Tuple of the input path, part path (or None) and whether to validate the records.
+    :return: Tuple of the part path and the file's counts.
+    """
+    input_path, part_path, validate = args
+    return part_path, filter_jsonl_file(input_path, part_path, validate)
+
+def merge_jsonl_files(input_paths, output_path=None, workers=None, validate=True):
+    """
+    Merges JSONL files into one, keeping only valid lines. The files are filtered in parallel processes into part
+    files next to the output, which are appended to the output in input order as they finish, so memory use does
+    not grow with the size of the corpus.
+
+    :param input_paths: List of JSONL files, directories of JSONL files or glob patterns.
+    :param output_path: Path to the merged JSONL file, or None to only count the valid and rejected lines.
+    :param workers: Number of worker processes, defaults to the number of CPU cores.
+    :param validate: Whether to check the chat structure of each record, or only that it is valid JSON.
+    :return: List of the counts of each input file, in input order.
+    """
+    input_files = find_jsonl_files(input_paths)
+    if output_path is not None:
+        # Rerunning over the output directory must not merge the previous output back in
+        input_files = [path for path in input_files if os.path.abspath(path) != os.path.abspath(output_path)]
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        parts_dir = tempfile.mkdtemp(prefix=".merge_parts_", dir=output_dir)
+        tasks = [(path, os.path.join(parts_dir, f"{index}.jsonl"), validate) for index, path in enumerate(input_files)]
+    else:
+        parts_dir = None
+        tasks = [(path, None, validate) for path in input_files]
+
+    all_stats = []
+    output = open(output_path, 'wb') if output_path is not None else None
+    try:
+        with Pool(processes=workers or os.cpu_count()) as pool:
+            for part_path, stats in pool.imap(_filter_part, tasks):
+                all_stats.append(stats)
+                if part_path is not None:
+                    with open(part_path, 'rb') as part:
+                        shutil.copyfileobj(part, output, 1024 * 1024)
+                    os.remove(part_path)
+    finally:
+        if output is not None:
+            output.close()
+        if parts_dir is not None:
+            shutil.rmtree(parts_dir, ignore_errors=True)
+    return all_stats
+
+def summarize(all_stats):
+    """
+    Adds up the counts of several files.
+
+    :param all_stats: List of the counts of each file.
+    :return: Dictionary of the total counts and the number of files.
+    """
+    totals = {"files": len(all_stats), "lines": 0, "valid": 0, "blank": 0, "rejected": 0}
+    totals.update((reason, 0) for reason in REJECT_REASONS)
+    for stats in all_stats:
+        for key in totals:
+            if key != "files":
+                totals[key] += stats[key]
+    return totals
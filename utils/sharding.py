@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+def shard_key(path, base_dir=None):
+    """
+    Computes the key a file is sharded by: its path relative to the base directory with forward slashes, so
+    every node maps a file to the same shard wherever the corpus is mounted.
+
+    :param path: The path to the file, or a URL.
+    :param base_dir: The base directory the corpus is walked from, or None to use the path as it is.
+    :return: The shard key.
+    """
+    if base_dir is None or "://" in path:
+        return path
+    return os.path.relpath(path, base_dir).replace('\\', '/')
+
+def shard_of(path, base_dir, shard_count):
+    """
+    Assigns a file to a shard by a stable hash of its shard key. Python's built-in hash is salted per process,
+    so a SHA-1 digest is used instead.
+
+    :param path: The path to the file, or a URL.
+    :param base_dir: The base directory the corpus is walked from, or None to use the path as it is.
+    :param shard_count: The total number of shards.
+    :return: The shard index, from 0 to shard_count - 1.
+    """
+    digest = hashlib.sha1(shard_key(path, base_dir).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+def shard_files(files, base_dir, shard_index, shard_count, claims=None):
+    """
+    Filters files down to one shard of the corpus. With claims, each file is claimed before it is yielded, and once
+    the node's own shard is exhausted it steals unclaimed files of the other shards, starting from the end of their
+    walk order so it rarely collides with the owning node working from the start.
+
+    Claims are taken as the generator is consumed, so put the files on a bounded queue to only claim what the node
+    is about to process.
+
+    :param files: Iterable of file paths or URLs.
+    :param base_dir: The base directory the corpus is walked from, or None to use the paths as they are.
+    :param shard_index: The shard of this node, from 0 to shard_count - 1.
+    :param shard_count: The total number of shards.
+    :param claims: Instance of ShardClaims over a directory shared by all nodes, or None for static sharding.
+    :yield: The file paths or URLs this node should process.
+    """
+    stealable = []
+    for path in files:
+        if shard_of(path, base_dir, shard_count) == shard_index:
+            if claims is None or claims.claim(shard_key(path, base_dir)):
+                yield path
+        elif claims is not None:
+            stealable.append(path)
+
+    for path in sorted(stealable, key=lambda path: shard_key(path, base_dir), reverse=True):
+        if claims.claim(shard_key(path, base_dir)):
+            yield path
@@ -0,0 +1,219 @@
+import os
+import hashlib
+from multiprocessing import Pool
+
+import numpy as np
+import orjson
+
+from memory.TokenCountCache import TokenCountCache
+from utils.tokenizer import DEFAULT_ENCODING, count_tokens
+
+TOKENS_PER_MESSAGE = 3  # Tokens the chat format adds around every message
+TOKENS_PER_NAME = 1  # Tokens added by a message's optional 'name' field
+TOKENS_PER_REPLY = 3  # Tokens priming the assistant's reply
+MAX_TOKENS_PER_EXAMPLE = 65536  # Training examples longer than this are truncated by the fine-tuning service
+BATCH_SIZE = 1000  # Examples tokenized per worker task
+
+# Default number of epochs chosen by the fine-tuning service for the size of the dataset
+TARGET_EPOCHS = 3
+MIN_TARGET_EXAMPLES = 100
+MAX_TARGET_EXAMPLES = 25000
+MIN_DEFAULT_EPOCHS = 1
+MAX_DEFAULT_EPOCHS = 25
+
+def count_message_tokens(messages, encoding_name=None):
+    """
+    Counts the tokens of a chat fine-tuning example the way num_tokens_from_messages in finetune.ipynb does: every
+    value of every message, plus the chat format overheads.
+
+    :param messages: The example's list of messages.
+    :param encoding_name: The name of the encoding, defaults to TOKENIZER_ENCODING or o200k_base.
+    :return: Tuple of the example's total tokens and the tokens of its assistant messages.
+    """
+    total = TOKENS_PER_REPLY
+    assistant = 0
+    for message in messages:
+        total += TOKENS_PER_MESSAGE
+        for key, value in message.items():
+            if not isinstance(value, str):
+                continue
+            tokens = count_tokens(value, encoding_name)
+            total += tokens
+            if key == "name":
+                total += TOKENS_PER_NAME
+            if key == "content" and message.get("role") == "assistant":
+                assistant += tokens
+    return total, assistant
+
+def _count_batch(args):
+    """
+    Pool task counting the tokens of a batch of JSONL lines.
+
+    :param args: Tuple of the list of (digest, line) pairs and the encoding name.
+    :return: List of tuples of each parseable line's digest, total and assistant token counts.
+    """
+    lines, encoding_name = args
+    counts = []
+    for digest, line in lines:
+        try:
+            messages = orjson.loads(line).get("messages")
+        except (orjson.JSONDecodeError, AttributeError):
+            messages = None
+        if not isinstance(messages, list) or not all(isinstance(message, dict) for message in messages):
+            continue
+        counts.append((digest, *count_message_tokens(messages, encoding_name)))
+    return counts
+
+def read_examples(path):
+    """
+    Streams the non-blank lines of a JSONL file with their content digests.
+
+    :param path: Path to the JSONL file.
+    :yield: Tuples of the line's 16-byte digest and its bytes.
+    """
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if line_number == 1 and line.startswith(b'\xef\xbb\xbf'):
+                line = line[3:]  # Byte order mark of files saved as "UTF-8 with BOM"
+            if line:
+                yield hashlib.blake2b(line, digest_size=16).digest(), line
+
+def estimate_epochs(n_examples):
+    """
+    Estimates the number of epochs the fine-tuning service trains for by default.
+
+    :param n_examples: The number of training examples.
+    :return: The number of epochs.
+    """
+    if n_examples and n_examples * TARGET_EPOCHS < MIN_TARGET_EXAMPLES:
+        return min(MAX_DEFAULT_EPOCHS, MIN_TARGET_EXAMPLES // n_examples)
+    if n_examples * TARGET_EPOCHS > MAX_TARGET_EXAMPLES:
+        return max(MIN_DEFAULT_EPOCHS, MAX_TARGET_EXAMPLES // n_examples)
+    return TARGET_EPOCHS
+
+def distribution(values):
+    """
+    Summarizes a distribution of token counts.
+
+    :param values: numpy array of token counts.
+    :return: Dictionary of the min, max, mean, median, p10 and p90, or None for an empty array.
+    """
+    if not len(values):
+        return None
+    return {
+        "min": int(values.min()),
+        "max": int(values.max()),
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "p10": float(np.quantile(values, 0.1)),
+        "p90": float(np.quantile(values, 0.9))
+    }
+
+def compute_token_stats(path, cache_path=None, workers=None, batch_size=BATCH_SIZE, max_tokens=MAX_TOKENS_PER_EXAMPLE, encoding_name=None):
+    """
+    Computes the token distributions of a JSONL fine-tuning dataset. Examples missing from the cache are tokenized
+    in batches across a process pool, or in this process with a single worker, and their counts are cached by a hash of the example, so rerunning after
+    editing a few examples only tokenizes those.
+
+    :param path: Path to the JSONL file.
+    :param cache_path: Optional path to a TokenCountCache database. Without it every example is tokenized.
+    :param workers: Number of worker processes, defaults to the number of CPU cores.
+    :param batch_size: Examples tokenized per worker task.
+    :param max_tokens: Token limit per training example, beyond which examples are truncated and billed up to the limit.
+    :param encoding_name: The name of the encoding, defaults to TOKENIZER_ENCODING or o200k_base.
+    :return: Dictionary of the example counts, the total and assistant token distributions, the examples over the limit, and the estimated epochs and billing tokens.
+    """
+    encoding_name = encoding_name or os.getenv("TOKENIZER_ENCODING", DEFAULT_ENCODING)
+    scheme = f"{encoding_name}:{TOKENS_PER_MESSAGE}:{TOKENS_PER_NAME}:{TOKENS_PER_REPLY}"
+    cache = TokenCountCache(cache_path) if cache_path else None
+
+    digests = []
+    counts = {}
+    missing = []
+    try:
+        batch = []
+        for digest, line in read_examples(path):
+            digests.append(digest)
+            batch.append((digest, line))
+            if len(batch) >= batch_size:
+                missing.extend(_uncached(cache, scheme, batch, counts))
+                batch = []
+        missing.extend(_uncached(cache, scheme, batch, counts))
+
+        if missing:
+            tasks = [(missing[start:start + batch_size], encoding_name) for start in range(0, len(missing), batch_size)]
+            processes = min(workers or os.cpu_count(), len(tasks))
+            # A single batch or worker is counted in this process, which skips the cost of starting a pool
+            pool = Pool(processes=processes) if processes > 1 else None
+            try:
+                for batch_counts in (pool.imap_unordered(_count_batch, tasks) if pool is not None else map(_count_batch, tasks)):
+                    counts.update((digest, (total, assistant)) for digest, total, assistant in batch_counts)
+                    if cache is not None:
+                        cache.put_many(scheme, batch_counts)
+            finally:
+                if pool is not None:
+                    pool.terminate()
+        cache_stats = cache.stats() if cache is not None else None
+    finally:
+        if cache is not None:
+            cache.close()
+
+    examples = np.array([counts[digest] for digest in digests if digest in counts], dtype=np.int64).reshape(-1, 2)
+    total_tokens, assistant_tokens = examples[:, 0], examples[:, 1]
+    epochs = estimate_epochs(len(examples))
+    billing_tokens = int(np.minimum(total_tokens, max_tokens).sum())
+    return {
+        "file": path,
+        "examples": len(examples),
+        "skipped": len(digests) - len(examples),
+        "total_tokens": distribution(total_tokens),
+        "assistant_tokens": distribution(assistant_tokens),
+        "over_limit": int((total_tokens > max_tokens).sum()),
+        "no_assistant_tokens": int((assistant_tokens == 0).sum()),
+        "max_tokens": max_tokens,
+        "billing_tokens_per_epoch": billing_tokens,
+        "epochs": epochs,
+        "billing_tokens": billing_tokens * epochs,
+        "cache": cache_stats
+    }
+
+def _uncached(cache, scheme, batch, counts):
+    """
+    Looks up a batch of examples in the cache, adding the cached counts to counts.
+
+    :return: The (digest, line) pairs of the examples that must be tokenized.
+    """
+    if cache is not None:
+        counts.update(cache.get_many(scheme, [digest for digest, _ in batch]))
+    pending = {}
+    for digest, line in batch:
+        if digest not in counts:
+            pending.setdefault(digest, line)  # Duplicate examples are tokenized once
+    return list(pending.items())
+
+def print_token_stats(stats):
+    """
+    Prints the token statistics of a dataset in the format of finetune.ipynb.
+
+    :param stats: The dictionary returned by compute_token_stats.
+    """
+    print(f"Processing file: {stats['file']}")
+    if stats["skipped"]:
+        print(f"Skipped {stats['skipped']} lines that are not JSON objects with a 'messages' list")
+    for key, name in (("total_tokens", "total tokens"), ("assistant_tokens", "assistant tokens")):
+        values = stats[key]
+        if values is None:
+            continue
+        print(f"\n#### Distribution of {name}:")
+        print(f"min / max: {values['min']}, {values['max']}")
+        print(f"mean / median: {values['mean']}, {values['median']}")
+        print(f"p10 / p90: {values['p10']}, {values['p90']}")
+    print(f"\n{stats['over_limit']} examples may be over the {stats['max_tokens']} token limit, they will be truncated during fine-tuning")
+    print(f"{stats['no_assistant_tokens']} examples have no assistant tokens")
+    print(f"Dataset has ~{stats['billing_tokens_per_epoch']} tokens that will be charged for during training")
+    print(f"By default, you'll train for {stats['epochs']} epochs on this dataset")
+    print(f"By default, you'll be charged for ~{stats['billing_tokens']} tokens")
+    if stats["cache"] is not None:
+        print(f"Token count cache: {stats['cache']['hits']} hits, {stats['cache']['misses']} misses")
+    print('*' * 50)
@@ -0,0 +1,25 @@
+import os
+from functools import lru_cache
+import tiktoken
+
+DEFAULT_ENCODING = "o200k_base"  # Encoding of the gpt-4o models
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name=None):
+    """
+    Loads a tiktoken encoding once per process, so tokenizing many chunks does not rebuild it.
+
+    :param encoding_name: The name of the encoding, defaults to TOKENIZER_ENCODING or o200k_base.
+    :return: The tiktoken Encoding.
+    """
+    return tiktoken.get_encoding(encoding_name or os.getenv("TOKENIZER_ENCODING", DEFAULT_ENCODING))
+
+def count_tokens(text, encoding_name=None):
+    """
+    Counts the tokens of a text. Special token strings in the text are counted as plain text.
+
+    :param text: The text to count.
+    :param encoding_name: The name of the encoding, defaults to TOKENIZER_ENCODING or o200k_base.
+    :return: The number of tokens.
+    """
+    return len(get_encoding(encoding_name).encode(text, disallowed_special=()))